@@ -3,5 +3,6 @@ from .reflection.reflection_component import ReflectionComponent
 from .memory.memory_component import MemoryComponent
 from .monologue.monologue_component import MonologueRunner
 from .hypothesis.hypothesis_component import HypothesisComponent
+from .introspection.introspection_queue import IntrospectionQueue
 
-__all__ = ["SelfModelComponent", "ReflectionComponent", "MemoryComponent", "MonologueRunner", "HypothesisComponent"]
+__all__ = ["SelfModelComponent", "ReflectionComponent", "MemoryComponent", "MonologueRunner", "HypothesisComponent", "IntrospectionQueue"]
@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import threading
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, cast
+
+import numpy as np
+from llama_index.core.embeddings import BaseEmbedding
+from pydantic import PrivateAttr
+
+if TYPE_CHECKING:
+    from collections.abc import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+# Rough per-entry overhead (key string + OrderedDict node)
+_ENTRY_OVERHEAD = 160
+
+
+def cache_key(model_name: str, kind: str, text: str) -> str:
+    """Cache key: model, embedding kind (query/text) and hash of the normalized text."""
+    norm = " ".join(unicodedata.normalize("NFC", text).split())
+    digest = hashlib.sha256(norm.encode("utf-8")).hexdigest()
+    return f"{model_name}|{kind}|{digest}"
+
+
+class EmbeddingLRUCache:
+    """Byte-bounded LRU cache of embedding vectors with hit/miss counters."""
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._data: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> list[float] | None:
+        with self._lock:
+            vec = self._data.get(key)
+            if vec is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return cast(list[float], vec.tolist())
+
+    def put(self, key: str, embedding: list[float]) -> None:
+        vec = np.asarray(embedding, dtype=np.float32)
+        size = vec.nbytes + _ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old.nbytes + _ENTRY_OVERHEAD
+            self._data[key] = vec
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._data.popitem(last=False)
+                self._bytes -= evicted.nbytes + _ENTRY_OVERHEAD
+                self.evictions += 1
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+    # ---- persistence ----
+    def save(self, path: Path) -> None:
+        with self._lock:
+            items = list(self._data.items())
+        if not items:
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # One file holds vectors of a single dimension (a single model)
+        dim = items[-1][1].shape[0]
+        items = [(k, v) for k, v in items if v.shape[0] == dim]
+        tmp = path.with_name(path.name + ".tmp")
+        with tmp.open("wb") as f:
+            np.savez(f, keys=np.array([k for k, _ in items]), vectors=np.stack([v for _, v in items]))
+        os.replace(tmp, path)
+
+    def load(self, path: Path) -> None:
+        if not path.exists():
+            return
+        try:
+            with np.load(path) as data:
+                keys, vectors = data["keys"], data["vectors"]
+        except Exception as e:  # noqa: BLE001
+            logger.warning("Ignoring unreadable embedding cache %s: %s", path, e)
+            return
+        for key, vec in zip(keys.tolist(), vectors, strict=True):
+            self.put(str(key), vec)
+        logger.info("Embedding cache: loaded %d entries from %s", len(keys), path)
+
+
+class CachedEmbedding(BaseEmbedding):
+    """Embedding model wrapper backed by a shared LRU cache.
+
+    There is one per process (see `EmbeddingComponent`), used by memory search,
+    chunk retrieval and the chat retriever, so identical strings are embedded once.
+    """
+
+    _inner: BaseEmbedding = PrivateAttr()
+    _cache: EmbeddingLRUCache = PrivateAttr()
+
+    def __init__(self, inner: BaseEmbedding, cache: EmbeddingLRUCache) -> None:
+        super().__init__(
+            model_name=inner.model_name,
+            embed_batch_size=inner.embed_batch_size,
+            callback_manager=inner.callback_manager,
+            num_workers=inner.num_workers,
+        )
+        self._inner = inner
+        self._cache = cache
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedEmbedding"
+
+    @property
+    def inner(self) -> BaseEmbedding:
+        return self._inner
+
+    @property
+    def cache(self) -> EmbeddingLRUCache:
+        return self._cache
+
+    # ---- sync ----
+    def _get_query_embedding(self, query: str) -> list[float]:
+        return self._one("query", query, self._inner._get_query_embedding)
+
+    def _get_text_embedding(self, text: str) -> list[float]:
+        return self._one("text", text, self._inner._get_text_embedding)
+
+    def _get_text_embeddings(self, texts: list[str]) -> list[list[float]]:
+        keys = [cache_key(self.model_name, "text", t) for t in texts]
+        out: list[list[float] | None] = [self._cache.get(k) for k in keys]
+        missing = self._missing(keys, out)
+        if missing:
+            embs = self._inner._get_text_embeddings([texts[i[0]] for i in missing])
+            self._fill(keys, out, missing, embs)
+        return out  # type: ignore[return-value]
+
+    # ---- async ----
+    async def _aget_query_embedding(self, query: str) -> list[float]:
+        return await self._aone("query", query, self._inner._aget_query_embedding)
+
+    async def _aget_text_embedding(self, text: str) -> list[float]:
+        return await self._aone("text", text, self._inner._aget_text_embedding)
+
+    async def _aget_text_embeddings(self, texts: list[str]) -> list[list[float]]:
+        keys = [cache_key(self.model_name, "text", t) for t in texts]
+        out: list[list[float] | None] = [self._cache.get(k) for k in keys]
+        missing = self._missing(keys, out)
+        if missing:
+            embs = await self._inner._aget_text_embeddings([texts[i[0]] for i in missing])
+            self._fill(keys, out, missing, embs)
+        return out  # type: ignore[return-value]
+
+    # ---- helpers ----
+    @staticmethod
+    def _missing(keys: list[str], out: list[list[float] | None]) -> list[list[int]]:
+        """Positions of cache misses, grouped by key so duplicates are embedded once."""
+        groups: dict[str, list[int]] = {}
+        for i, v in enumerate(out):
+            if v is None:
+                groups.setdefault(keys[i], []).append(i)
+        return list(groups.values())
+
+    def _fill(
+        self,
+        keys: list[str],
+        out: list[list[float] | None],
+        missing: list[list[int]],
+        embs: list[list[float]],
+    ) -> None:
+        for positions, emb in zip(missing, embs, strict=True):
+            self._cache.put(keys[positions[0]], emb)
+            for i in positions:
+                out[i] = emb
+
+    def _one(self, kind: str, text: str, compute: Callable[[str], list[float]]) -> list[float]:
+        key = cache_key(self.model_name, kind, text)
+        emb = self._cache.get(key)
+        if emb is None:
+            emb = compute(text)
+            self._cache.put(key, emb)
+        return emb
+
+    async def _aone(
+        self, kind: str, text: str, compute: Callable[[str], Awaitable[list[float]]]
+    ) -> list[float]:
+        key = cache_key(self.model_name, kind, text)
+        emb = self._cache.get(key)
+        if emb is None:
+            emb = await compute(text)
+            self._cache.put(key, emb)
+        return emb
@@ -1,9 +1,15 @@
+import atexit
 import logging
+from typing import Any
 
 from injector import inject, singleton
 from llama_index.core.embeddings import BaseEmbedding, MockEmbedding
 
-from private_gpt.paths import models_cache_path
+from private_gpt.components.embedding.embedding_cache import (
+    CachedEmbedding,
+    EmbeddingLRUCache,
+)
+from private_gpt.paths import local_data_path, models_cache_path
 from private_gpt.settings.settings import Settings
 
 logger = logging.getLogger(__name__)
@@ -165,3 +171,17 @@ class EmbeddingComponent:
                 # Not a random number, is the dimensionality used by
                 # the default embedding model
                 self.embedding_model = MockEmbedding(384)
+
+        if settings.embedding.cache_max_mb > 0:
+            cache = EmbeddingLRUCache(settings.embedding.cache_max_mb * 1024 * 1024)
+            if settings.embedding.cache_persist:
+                cache_file = local_data_path / "embedding_cache" / "embeddings.npz"
+                cache.load(cache_file)
+                atexit.register(cache.save, cache_file)
+            self.embedding_model = CachedEmbedding(self.embedding_model, cache)
+
+    def cache_stats(self) -> dict[str, Any]:
+        """Counters of the shared embedding cache (hits, misses, size)."""
+        if isinstance(self.embedding_model, CachedEmbedding):
+            return {"enabled": True, **self.embedding_model.cache.stats()}
+        return {"enabled": False}
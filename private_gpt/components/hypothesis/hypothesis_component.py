@@ -1,8 +1,13 @@
 from __future__ import annotations
 
+import builtins
+import itertools
 import json
 import logging
+import threading
 import uuid
+from collections import Counter
+from collections.abc import Callable, Iterator
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from pathlib import Path
@@ -13,14 +18,31 @@ from pydantic import BaseModel, Field
 from llama_index.core.llms import ChatMessage, MessageRole
 
 from private_gpt.paths import local_data_path
+from private_gpt.components.embedding.embedding_component import EmbeddingComponent
+from private_gpt.components.hypothesis.hypothesis_index import HypothesisIndex
 from private_gpt.components.llm.llm_component import LLMComponent
+from private_gpt.components.llm.structured_output import chat_json, llm_schema
 from private_gpt.components.memory.memory_component import MemoryComponent
 from private_gpt.components.reflection.reflection_component import ReflectionRecord
+from private_gpt.settings.settings import Settings
+from private_gpt.utils.append_log import AppendLog
+from private_gpt.utils.pagination import in_window, take_page
+from private_gpt.utils.result_cache import ResultCache, fingerprint
 
 logger = logging.getLogger(__name__)
 
 _H_DIR = local_data_path / "hypothesis"
 _H_FILE = _H_DIR / "hypotheses.jsonl"
+_CACHE_FILE = _H_DIR / "cache.jsonl"
+_INDEX_FILE = _H_DIR / "index.npz"
+# открытые гипотезы — кандидаты на повторное использование
+_OPEN = ("pending", "in_progress")
+# сколько последних гипотез досчитывается в индекс при старте
+_INDEX_BACKFILL = 1000
+# HypothesisIndex.nearest_by_*: (вектор, порог) -> [(id, косинус)]
+_Nearest = Callable[[list[float], float], list[tuple[str, float]]]
+# сколько символов ответа идёт в запрос к памяти вместе с репликой пользователя
+_QUERY_ANSWER_CHARS = 500
 
 
 class Hypothesis(BaseModel):
@@ -39,34 +61,173 @@ class Hypothesis(BaseModel):
     derived_from: dict[str, Any] = Field(default_factory=dict)  # {last_user_message, reflection_id?, memory_refs?}
 
 
+# поля, которые заполняет LLM; схема уходит бэкенду как ограничение вывода
+_HYPOTHESIS_SCHEMA = llm_schema(
+    Hypothesis,
+    ("title", "rationale", "steps", "expected_signal", "risks", "confidence", "priority", "tags"),
+)
+
+
 @dataclass
 class _HStorage:
+    """Журнал событий гипотез.
+
+    Каждая строка — событие: `create` (полная запись гипотезы) или `update`
+    (id + изменённые поля). Строки без `op` (старый формат) читаются как
+    `create`. В памяти держится индекс id → позиция create-события и
+    накопленные обновления, поэтому смена статуса — один append, без
+    перезаписи файла. Когда устаревших событий становится больше, чем живых
+    гипотез, журнал сжимается в фоновом потоке.
+    """
+
     file_path: Path = _H_FILE
+    compact_min_events: int = 256
+
+    def __post_init__(self) -> None:
+        self.log = AppendLog(self.file_path)
+        self._lock = threading.RLock()
+        self._compacting = False
+        self._reset_index(0)
+
+    def _reset_index(self, generation: int) -> None:
+        self._generation = generation
+        self._pos: dict[str, int] = {}
+        self._updates: dict[str, dict[str, Any]] = {}
+        self._applied = 0
 
     def ensure(self) -> None:
-        self.file_path.parent.mkdir(parents=True, exist_ok=True)
-        if not self.file_path.exists():
-            self.file_path.touch()
+        self.log.ensure()
+        with self._lock:
+            self._catch_up()
+
+    # ---------- write ----------
+    def create(self, rec: dict[str, Any]) -> None:
+        with self._lock:
+            self.log.append({"op": "create", **rec})
+            self._catch_up()
+
+    def update(self, hyp_id: str, fields: dict[str, Any]) -> dict[str, Any] | None:
+        """Дописать update-событие; None — если такой гипотезы нет."""
+        with self._lock:
+            self._catch_up()
+            if hyp_id not in self._pos:
+                return None
+            event = {
+                "op": "update",
+                "id": hyp_id,
+                "fields": fields,
+                "ts": datetime.now(timezone.utc).isoformat(),
+            }
+            self.log.append(event)
+            self._catch_up()
+            self._maybe_compact()
+            return self.get(hyp_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.log.clear()
+            self._reset_index(self.log.generation)
+
+    def compact(self) -> None:
+        """Переписать журнал одними create-событиями с текущим состоянием."""
+        with self._lock:
+            rows = self.iter_all()
+            self.log.rewrite({"op": "create", **r} for r in rows)
+            self._reset_index(self.log.generation)
+            self._catch_up()
+            logger.info("Hypothesis log compacted to %d records", len(rows))
+
+    # ---------- read ----------
+    def __len__(self) -> int:
+        with self._lock:
+            self._catch_up()
+            return len(self._pos)
 
-    def append(self, rec: dict[str, Any]) -> None:
-        with self.file_path.open("a", encoding="utf-8") as f:
-            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+    def get(self, hyp_id: str) -> dict[str, Any] | None:
+        with self._lock:
+            self._catch_up()
+            pos = self._pos.get(hyp_id)
+            if pos is None:
+                return None
+            recs = self._materialize([hyp_id])
+            return recs[0] if recs else None
+
+    def last(self, n: int) -> list[dict[str, Any]]:
+        with self._lock:
+            self._catch_up()
+            ids = list(itertools.islice(reversed(self._pos), max(0, n)))
+            return self._materialize(ids[::-1])
 
     def iter_all(self) -> list[dict[str, Any]]:
-        if not self.file_path.exists() or self.file_path.stat().st_size == 0:
-            return []
+        with self._lock:
+            self._catch_up()
+            return self._materialize(list(self._pos))
+
+    def page(
+        self,
+        limit: int,
+        before: int | None = None,
+        match: Callable[[dict[str, Any]], bool] | None = None,
+    ) -> tuple[list[dict[str, Any]], int | None]:
+        """Последние `limit` подходящих гипотез с create-событием до позиции `before`."""
+        with self._lock:
+            self._catch_up()
+            ids = [h for h, pos in self._pos.items() if before is None or pos < before]
+            return take_page(self._back(ids), limit, match)
+
+    def version(self) -> tuple[int, int]:
+        return self.log.generation, len(self.log)
+
+    # ---------- internals ----------
+    def _catch_up(self) -> None:
+        """Применить события, дописанные с прошлого раза (в т.ч. другими писателями)."""
+        generation = self.log.generation
+        if generation != self._generation:
+            self._reset_index(generation)
+        total = len(self.log)
+        if total <= self._applied:
+            return
+        for i, ev in self.log.scan(self._applied, total):
+            op = ev.get("op", "create")
+            hyp_id = ev.get("id")
+            if not isinstance(hyp_id, str):
+                continue
+            if op == "create":
+                self._pos.pop(hyp_id, None)
+                self._pos[hyp_id] = i
+                self._updates.pop(hyp_id, None)
+            elif op == "update" and hyp_id in self._pos:
+                self._updates.setdefault(hyp_id, {}).update(ev.get("fields") or {})
+        self._applied = total
+
+    def _back(self, ids: list[str], chunk: int = 64) -> Iterator[tuple[int, dict[str, Any]]]:
+        """Гипотезы `ids` с конца, читая журнал кусками по `chunk`."""
+        for end in range(len(ids), 0, -chunk):
+            recs = self._materialize(ids[max(0, end - chunk) : end])
+            yield from ((self._pos[r["id"]], r) for r in reversed(recs))
+
+    def _materialize(self, ids: list[str]) -> list[dict[str, Any]]:
         out: list[dict[str, Any]] = []
-        with self.file_path.open("r", encoding="utf-8") as f:
-            for line in f:
-                t = line.strip()
-                if t:
-                    out.append(json.loads(t))
+        for rec in self.log.read_many(self._pos[i] for i in ids):
+            rec.pop("op", None)
+            rec.update(self._updates.get(rec["id"], {}))
+            out.append(rec)
         return out
 
-    def rewrite(self, rows: list[dict[str, Any]]) -> None:
-        with self.file_path.open("w", encoding="utf-8") as f:
-            for r in rows:
-                f.write(json.dumps(r, ensure_ascii=False) + "\n")
+    def _maybe_compact(self) -> None:
+        garbage = len(self.log) - len(self._pos)
+        if self._compacting or garbage < self.compact_min_events or garbage <= len(self._pos):
+            return
+        self._compacting = True
+        threading.Thread(target=self._compact_bg, name="hypothesis-compact", daemon=True).start()
+
+    def _compact_bg(self) -> None:
+        try:
+            self.compact()
+        except Exception as e:  # noqa: BLE001
+            logger.error("Hypothesis log compaction failed: %s", e)
+        finally:
+            self._compacting = False
 
 
 @singleton
@@ -74,11 +235,27 @@ class HypothesisComponent:
     """Генерация гипотез/целей на основе диалога, рефлексии и памяти."""
 
     @inject
-    def __init__(self, llm_component: LLMComponent, memory: MemoryComponent) -> None:
+    def __init__(
+        self,
+        llm_component: LLMComponent,
+        memory: MemoryComponent,
+        settings: Settings,
+        embedding_component: EmbeddingComponent,
+    ) -> None:
         self._llm = llm_component.llm
         self._memory = memory
         self._store = _HStorage()
         self._store.ensure()
+        cfg = settings.hypothesis
+        self._context_tokens = cfg.context_tokens
+        self._cache = ResultCache(_CACHE_FILE, ttl_s=cfg.cache_ttl_s, max_items=cfg.cache_max_items)
+        self._dedupe_threshold = cfg.dedupe_threshold
+        self._embed_model = embedding_component.embedding_model
+        self._index = HypothesisIndex(_INDEX_FILE)
+        self._index_lock = threading.Lock()
+        self._stats: Counter[str] = Counter()
+        if self._dedupe_threshold > 0:
+            self._load_index()
         logger.info("Hypothesis storage at %s", self._store.file_path)
 
     def generate(
@@ -90,8 +267,21 @@ class HypothesisComponent:
         top_memory_limit: int = 5,
         tags: list[str] | None = None,
     ) -> Hypothesis:
-        # соберём контекст из памяти
-        memories = self._memory.list(limit=200)[-top_memory_limit:]
+        """Сгенерировать и сохранить гипотезу.
+
+        Тот же ход, рефлексия (без времени) и контекст памяти в пределах
+        `hypothesis.cache_ttl_s` возвращают ранее созданную гипотезу без вызова LLM.
+        Открытая гипотеза, выведенная из похожей реплики пользователя (косинус
+        не ниже `hypothesis.dedupe_threshold`), тоже переиспользуется без LLM:
+        у неё растёт счётчик повторов. Если LLM всё же выдала почти ту же
+        гипотезу (по заголовку и обоснованию), новая не создаётся.
+        """
+        # контекст из памяти: самое близкое к ходу в пределах бюджета токенов
+        memories = self._memory.context(
+            f"{last_user_message}\n{assistant_response[:_QUERY_ANSWER_CHARS]}",
+            max_tokens=self._context_tokens,
+            max_items=top_memory_limit,
+        )
         payload = {
             "last_user_message": last_user_message,
             "assistant_response": assistant_response,
@@ -102,6 +292,23 @@ class HypothesisComponent:
             ],
         }
 
+        key = fingerprint(
+            "hypothesis",
+            {**payload, "reflection": reflection.model_dump(exclude={"timestamp"}) if reflection else None},
+            sorted(tags or []),
+        )
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._stats["cache_hits"] += 1
+            return Hypothesis(**(self._store.get(cached["id"]) or cached))
+
+        msg_vec = self._embed_one(last_user_message)
+        if msg_vec is not None:
+            similar = self._find_open(self._index.nearest_by_message, msg_vec)
+            if similar is not None:
+                self._stats["deduplicated"] += 1
+                return self._repeat(similar, tags)
+
         system = (
             "You are a goal & hypothesis generator. "
             "Given conversation turn, reflection and few memories, produce STRICT JSON with keys:\n"
@@ -122,10 +329,12 @@ class HypothesisComponent:
         ]
 
         try:
-            resp = self._llm.chat(messages)  # type: ignore
+            resp = chat_json(self._llm, messages, _HYPOTHESIS_SCHEMA, name="hypothesis")
             text = getattr(resp, "message", None).content if hasattr(resp, "message") and resp.message else getattr(resp, "text", str(resp))
+            cacheable = True
         except Exception as e:  # noqa: BLE001
             logger.error("Hypothesis LLM call failed: %s", e)
+            cacheable = False
             text = '{"title":"Fallback hypothesis","rationale":"llm_error","steps":[],"expected_signal":[],"risks":["llm_failed"],"confidence":0.0,"priority":5,"tags":["error"]}'
 
         data = self._safe_parse(text)
@@ -182,29 +391,148 @@ class HypothesisComponent:
                 "reflection_confidence": reflection.confidence if reflection else None,
             },
         )
-        self._store.append(hyp.model_dump())
+        self._stats["llm_calls"] += 1
+        content_vec = self._embed_one(f"{hyp.title}\n{hyp.rationale}") if msg_vec is not None else None
+        if content_vec is not None:
+            same = self._find_open(self._index.nearest_by_content, content_vec)
+            if same is not None:
+                self._stats["merged"] += 1
+                return self._repeat(same, hyp.tags)
+
+        self._store.create(hyp.model_dump())
+        self._stats["generated"] += 1
+        if msg_vec is not None and content_vec is not None:
+            with self._index_lock:
+                self._index.add(hyp.id, msg_vec, content_vec)
+                self._index.save()
+        if cacheable:
+            self._cache.put(key, hyp.model_dump())
         return hyp
 
     def list(self, limit: int = 100) -> list[Hypothesis]:
-        rows = self._store.iter_all()
-        items = [Hypothesis(**r) for r in rows]
-        return items[-limit:]
+        return [Hypothesis(**r) for r in self._store.last(limit)]
+
+    def page(
+        self,
+        limit: int = 100,
+        *,
+        before: int | None = None,
+        status: builtins.list[str] | None = None,
+        tags: builtins.list[str] | None = None,
+        since: datetime | None = None,
+        until: datetime | None = None,
+    ) -> tuple[builtins.list[Hypothesis], int | None]:
+        """Страница списка: последние `limit` гипотез до позиции `before` (старые первыми).
+
+        `status` — любой из статусов, `tags` — все ярлыки, `since`/`until` —
+        время создания. Второе значение — позиция следующей (более старой)
+        страницы или None.
+        """
+        statuses: set[str] = set(status or ())
+        wanted: set[str] = set(tags or ())
+
+        def match(rec: dict[str, Any]) -> bool:
+            if statuses and rec.get("status", "pending") not in statuses:
+                return False
+            return wanted <= set(rec.get("tags", [])) and in_window(rec.get("timestamp"), since, until)
+
+        recs, next_before = self._store.page(limit, before, match)
+        return [Hypothesis(**r) for r in recs], next_before
+
+    def version(self) -> tuple[int, int]:
+        """(поколение журнала, число событий) — меняется при создании, смене статуса и очистке."""
+        return self._store.version()
 
     def update_status(self, hyp_id: str, status: str) -> Hypothesis | None:
-        rows = self._store.iter_all()
-        out = []
-        updated: Hypothesis | None = None
-        for r in rows:
-            if r.get("id") == hyp_id:
-                r["status"] = status
-                updated = Hypothesis(**r)
-            out.append(r)
-        if updated:
-            self._store.rewrite(out)
-        return updated
+        rec = self._store.update(hyp_id, {"status": status})
+        if rec and status not in _OPEN:
+            with self._index_lock:
+                if hyp_id in self._index:
+                    self._index.remove(hyp_id)
+                    self._index.save()
+        return Hypothesis(**rec) if rec else None
 
     def clear(self) -> None:
-        self._store.rewrite([])
+        self._store.clear()
+        self._cache.clear()
+        with self._index_lock:
+            self._index.clear()
+            self._index.path.unlink(missing_ok=True)
+
+    def cache_stats(self) -> dict[str, int]:
+        return {"size": len(self._cache), "hits": self._cache.hits, "misses": self._cache.misses}
+
+    def stats(self) -> dict[str, int]:
+        """Счётчики генерации; `saved_llm_calls` — запросы, обслуженные без LLM."""
+        return {
+            "generated": self._stats["generated"],
+            "llm_calls": self._stats["llm_calls"],
+            "cache_hits": self._stats["cache_hits"],
+            "deduplicated": self._stats["deduplicated"],
+            "merged": self._stats["merged"],
+            "saved_llm_calls": self._stats["cache_hits"] + self._stats["deduplicated"],
+            "indexed": len(self._index),
+        }
+
+    # ---------- индекс похожих гипотез ----------
+    def _load_index(self) -> None:
+        """Поднять индекс с диска и досчитать открытые гипотезы, которых в нём нет."""
+        self._index.load()
+        recs = [r for r in self._store.last(_INDEX_BACKFILL) if r.get("status", "pending") in _OPEN]
+        self._index.retain({r["id"] for r in recs})
+        missing = [r for r in recs if r["id"] not in self._index and r.get("derived_from", {}).get("last_user_message")]
+        if missing:
+            texts = [r["derived_from"]["last_user_message"] for r in missing]
+            texts += [f"{r.get('title', '')}\n{r.get('rationale', '')}" for r in missing]
+            try:
+                vectors = self._embed_model.get_text_embedding_batch(texts)
+            except Exception as e:  # noqa: BLE001
+                logger.warning("Hypothesis index backfill failed: %s", e)
+                vectors = []
+            if vectors:
+                n = len(missing)
+                for rec, msg_vec, content_vec in zip(missing, vectors[:n], vectors[n:], strict=True):
+                    self._index.add(rec["id"], msg_vec, content_vec)
+        self._index.save()
+        logger.info("Hypothesis index: %d open hypotheses", len(self._index))
+
+    def _embed_one(self, text: str) -> builtins.list[float] | None:
+        if self._dedupe_threshold <= 0 or not text.strip():
+            return None
+        try:
+            return self._embed_model.get_text_embedding(text)
+        except Exception as e:  # noqa: BLE001
+            logger.warning("Hypothesis embedding failed, dedupe skipped: %s", e)
+            return None
+
+    def _find_open(self, nearest: _Nearest, vec: builtins.list[float]) -> dict[str, Any] | None:
+        """Самая похожая открытая гипотеза; закрытые по пути выбрасываются из индекса."""
+        with self._index_lock:
+            stale = []
+            found = None
+            for hyp_id, _ in nearest(vec, self._dedupe_threshold):
+                rec = self._store.get(hyp_id)
+                if rec is not None and rec.get("status", "pending") in _OPEN:
+                    found = rec
+                    break
+                stale.append(hyp_id)
+            for hyp_id in stale:
+                self._index.remove(hyp_id)
+            if stale:
+                self._index.save()
+            return found
+
+    def _repeat(self, rec: dict[str, Any], tags: builtins.list[str] | None) -> Hypothesis:
+        """Учесть повтор гипотезы: счётчик в derived_from и объединение тегов."""
+        derived = dict(rec.get("derived_from") or {})
+        derived["repeats"] = int(derived.get("repeats", 0)) + 1
+        derived["last_repeat_at"] = datetime.now(timezone.utc).isoformat()
+        fields: dict[str, Any] = {"derived_from": derived}
+        merged_tags = sorted({*rec.get("tags", []), *(tags or [])})
+        if merged_tags != sorted(rec.get("tags", [])):
+            fields["tags"] = merged_tags
+        updated = self._store.update(rec["id"], fields)
+        return Hypothesis(**(updated or rec))
 
     @staticmethod
     def _safe_parse(text: str) -> dict[str, Any]:
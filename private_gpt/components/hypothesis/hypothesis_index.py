@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import logging
+import os
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def _unit(vec: list[float] | np.ndarray) -> np.ndarray:
+    v = np.asarray(vec, dtype=np.float32).reshape(-1)
+    return v / (np.linalg.norm(v) + 1e-12)
+
+
+class HypothesisIndex:
+    """Векторный индекс гипотез для поиска дублей.
+
+    На гипотезу два вектора: реплика пользователя, из которой она выведена
+    (`msg`, «кластер» вопроса), и заголовок с обоснованием (`content`).
+    Хранится в `index.npz` рядом с журналом гипотез.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._ids: list[str] = []
+        self._pos: dict[str, int] = {}
+        self._msg = np.zeros((0, 0), dtype=np.float32)
+        self._content = np.zeros((0, 0), dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, hyp_id: object) -> bool:
+        return hyp_id in self._pos
+
+    def load(self) -> None:
+        if not self.path.exists():
+            return
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                ids = [str(i) for i in data["ids"]]
+                msg, content = data["msg"], data["content"]
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("Hypothesis index %s unreadable, rebuilding: %s", self.path, e)
+            return
+        self._ids, self._msg, self._content = ids, msg.astype(np.float32), content.astype(np.float32)
+        self._pos = {h: i for i, h in enumerate(ids)}
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp.npz")
+        np.savez(tmp, ids=np.array(self._ids, dtype=str), msg=self._msg, content=self._content)
+        os.replace(tmp, self.path)
+
+    def add(self, hyp_id: str, msg: list[float] | np.ndarray, content: list[float] | np.ndarray) -> None:
+        m, c = _unit(msg), _unit(content)
+        if self._ids and (m.shape[0] != self._msg.shape[1] or c.shape[0] != self._content.shape[1]):
+            # сменилась модель эмбеддингов — старые векторы несравнимы
+            logger.warning("Hypothesis index: embedding size changed, dropping %d entries", len(self._ids))
+            self.clear()
+        if hyp_id in self._pos:
+            self.remove(hyp_id)
+        self._pos[hyp_id] = len(self._ids)
+        self._ids.append(hyp_id)
+        self._msg = np.vstack([self._msg, m]) if self._msg.size else m[None, :]
+        self._content = np.vstack([self._content, c]) if self._content.size else c[None, :]
+
+    def remove(self, hyp_id: str) -> None:
+        pos = self._pos.pop(hyp_id, None)
+        if pos is None:
+            return
+        del self._ids[pos]
+        self._msg = np.delete(self._msg, pos, axis=0)
+        self._content = np.delete(self._content, pos, axis=0)
+        self._pos = {h: i for i, h in enumerate(self._ids)}
+
+    def retain(self, ids: set[str]) -> None:
+        for hyp_id in [h for h in self._ids if h not in ids]:
+            self.remove(hyp_id)
+
+    def nearest_by_message(self, vec: list[float] | np.ndarray, threshold: float) -> list[tuple[str, float]]:
+        """Гипотезы с похожей исходной репликой (косинус не ниже порога), лучшие первыми."""
+        return self._nearest(self._msg, vec, threshold)
+
+    def nearest_by_content(self, vec: list[float] | np.ndarray, threshold: float) -> list[tuple[str, float]]:
+        """Гипотезы с похожими заголовком и обоснованием, лучшие первыми."""
+        return self._nearest(self._content, vec, threshold)
+
+    def clear(self) -> None:
+        self._ids, self._pos = [], {}
+        self._msg = np.zeros((0, 0), dtype=np.float32)
+        self._content = np.zeros((0, 0), dtype=np.float32)
+
+    def _nearest(self, matrix: np.ndarray, vec: list[float] | np.ndarray, threshold: float) -> list[tuple[str, float]]:
+        q = _unit(vec)
+        if not self._ids or matrix.shape[1] != q.shape[0]:
+            return []
+        sims = matrix @ q
+        order = np.argsort(-sims)
+        return [(self._ids[i], float(sims[i])) for i in order if sims[i] >= threshold]
@@ -0,0 +1,4 @@
+from .introspection_queue import IntrospectionQueue, Turn
+from .reflection_scheduler import ReflectionScheduler
+
+__all__ = ["IntrospectionQueue", "ReflectionScheduler", "Turn"]
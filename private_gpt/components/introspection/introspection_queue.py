@@ -0,0 +1,273 @@
+from __future__ import annotations
+
+import atexit
+import hashlib
+import logging
+import random
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from typing import Any, Optional
+
+from injector import inject, singleton
+from pydantic import BaseModel, Field
+
+from private_gpt.paths import local_data_path
+from private_gpt.components.hypothesis.hypothesis_component import HypothesisComponent
+from private_gpt.components.introspection.reflection_scheduler import ReflectionScheduler
+from private_gpt.components.reflection.reflection_component import ReflectionComponent, ReflectionRecord
+from private_gpt.settings.settings import Settings
+from private_gpt.utils.append_log import AppendLog
+
+logger = logging.getLogger(__name__)
+
+_QUEUE_DIR = local_data_path / "introspection"
+_QUEUE_FILE = _QUEUE_DIR / "queue.jsonl"
+
+# журнал очереди обнуляется, когда она пуста и событий накопилось столько
+_RESET_EVENTS = 1024
+# поля хода, которые принимает ReflectionComponent.reflect / reflect_batch
+_REFLECT_FIELDS = {"system_prompt", "last_user_message", "chat_history", "assistant_response", "sources"}
+
+
+class Turn(BaseModel):
+    """Ход чата, ожидающий рефлексии."""
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    ts: float = Field(default_factory=time.time)
+    system_prompt: Optional[str] = None
+    last_user_message: str = ""
+    chat_history: list[dict[str, str]] = Field(default_factory=list)
+    assistant_response: str = ""
+    sources: list[dict[str, Any]] | None = None
+    use_context: bool = False
+
+    def conversation_key(self) -> str:
+        """Ключ диалога: системный промпт + первое сообщение пользователя."""
+        first = next(
+            (m.get("content", "") for m in self.chat_history if m.get("role") == "user"),
+            self.last_user_message,
+        )
+        raw = f"{self.system_prompt or ''}\x00{first}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+@singleton
+class IntrospectionQueue:
+    """Фоновая очередь интроспекции ходов чата: рефлексия и авто-гипотеза.
+
+    `submit()` только ставит ход в очередь — ответ пользователю не ждёт
+    LLM-вызовов рефлексии. Воркеры (`introspection.workers`) разбирают
+    очередь по порядку. При переполнении работает политика
+    `introspection.overflow` (см. `IntrospectionSettings`). Какие ходы
+    рефлексировать и укладывается ли вызов в минутный бюджет, решает
+    `ReflectionScheduler`. Воркер забирает до `introspection.batch_size`
+    ожидающих ходов и рефлексирует их одним вызовом LLM
+    (`ReflectionComponent.reflect_batch`).
+
+    Очередь переживает перезапуск: события `put`/`done` пишутся в
+    `introspection/queue.jsonl`, при старте незавершённые ходы
+    восстанавливаются. Ход, взятый воркером, но не завершённый до падения,
+    будет обработан ещё раз.
+    """
+
+    @inject
+    def __init__(
+        self,
+        settings: Settings,
+        reflection: ReflectionComponent,
+        hypothesis: HypothesisComponent,
+        scheduler: ReflectionScheduler,
+    ) -> None:
+        self._cfg = settings.introspection
+        self._hyp_cfg = settings.hypothesis
+        self._reflection = reflection
+        self._hypothesis = hypothesis
+        self._scheduler = scheduler
+        self._log = AppendLog(_QUEUE_FILE, ring_size=0)
+        self._log.ensure()
+        self._cond = threading.Condition()
+        self._pending: OrderedDict[str, Turn] = OrderedDict()
+        self._by_key: dict[str, str] = {}
+        self._running = 0
+        self._stats: Counter[str] = Counter()
+        self._rng = random.Random()
+        self._stopping = False
+        self._restore()
+        self._workers: list[threading.Thread] = []
+        if self._cfg.background:
+            for i in range(max(1, self._cfg.workers)):
+                t = threading.Thread(target=self._run, name=f"introspection-{i}", daemon=True)
+                t.start()
+                self._workers.append(t)
+            atexit.register(self.stop)
+        logger.info("Introspection queue at %s (%d pending)", _QUEUE_FILE, len(self._pending))
+
+    # ---------- API ----------
+    def submit(self, turn: Turn) -> bool:
+        """Поставить ход в очередь; False — если он не выбран для рефлексии или отброшен."""
+        if self._scheduler.select(turn) is None:
+            return False
+        if not self._cfg.background:
+            self._stats[self._process(turn)] += 1
+            return True
+        with self._cond:
+            self._stats["submitted"] += 1
+            if not self._admit(turn):
+                self._stats["dropped"] += 1
+                return False
+            self._log.append({"op": "put", **turn.model_dump()})
+            self._pending[turn.id] = turn
+            self._by_key[turn.conversation_key()] = turn.id
+            self._cond.notify()
+            return True
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._pending)
+
+    def stats(self) -> dict[str, int]:
+        """Счётчики исходов и текущая длина очереди."""
+        with self._cond:
+            keys = ("submitted", "processed", "coalesced", "dropped", "over_budget", "failed", "batches")
+            out = {k: self._stats[k] for k in keys}
+            out["pending"] = len(self._pending)
+            out["running"] = self._running
+            return out
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Дождаться, пока очередь опустеет и воркеры закончат; True — если успели."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._pending or self._running:
+                left = None if deadline is None else deadline - time.monotonic()
+                if left is not None and left <= 0:
+                    return False
+                self._cond.wait(left)
+        return True
+
+    def stop(self) -> None:
+        """Остановить воркеры; необработанные ходы остаются в журнале до следующего старта."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+
+    # ---------- internals ----------
+    def _admit(self, turn: Turn) -> bool:
+        """Применить политику переполнения (под блокировкой)."""
+        limit = max(1, self._cfg.max_pending)
+        policy = self._cfg.overflow
+        if policy == "coalesce":
+            if len(self._pending) < limit:
+                # давления нет — рефлексируется каждый ход
+                return True
+            old = self._by_key.get(turn.conversation_key())
+            if old is not None and old in self._pending:
+                # свежий ход того же диалога заменяет ожидающий
+                self._finish(self._pending.pop(old), "coalesced")
+                self._stats["coalesced"] += 1
+            else:
+                _, oldest = self._pending.popitem(last=False)
+                self._finish(oldest, "dropped")
+                self._stats["dropped"] += 1
+            return True
+        if policy == "sample":
+            half = limit / 2.0
+            if len(self._pending) < half:
+                return True
+            return self._rng.random() < (limit - len(self._pending)) / (limit - half)
+        return len(self._pending) < limit
+
+    def _finish(self, turn: Turn, reason: str) -> None:
+        if self._by_key.get(turn.conversation_key()) == turn.id:
+            del self._by_key[turn.conversation_key()]
+        self._log.append({"op": "done", "id": turn.id, "reason": reason})
+        if not self._pending and not self._running and len(self._log) >= _RESET_EVENTS:
+            self._log.clear()
+
+    def _restore(self) -> None:
+        pending: OrderedDict[str, Turn] = OrderedDict()
+        for ev in self._log.iter_all():
+            op = ev.pop("op", None)
+            if op == "put":
+                try:
+                    turn = Turn(**ev)
+                except ValueError as e:
+                    logger.warning("Skipping malformed introspection job: %s", e)
+                    continue
+                pending[turn.id] = turn
+            elif op == "done":
+                pending.pop(str(ev.get("id")), None)
+        self._log.rewrite({"op": "put", **t.model_dump()} for t in pending.values())
+        self._pending = pending
+        self._by_key = {t.conversation_key(): t.id for t in pending.values()}
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending and not self._stopping:
+                    self._cond.wait()
+                if self._stopping:
+                    return
+                # уже ожидающие ходы забираются пачкой — один вызов LLM на пачку
+                size = min(max(1, self._cfg.batch_size), len(self._pending))
+                batch = [self._pending.popitem(last=False)[1] for _ in range(size)]
+                self._running += len(batch)
+            statuses = self._process_batch(batch)
+            with self._cond:
+                self._running -= len(batch)
+                for turn, status in zip(batch, statuses, strict=True):
+                    self._stats[status] += 1
+                    self._finish(turn, status)
+                if len(batch) > 1:
+                    self._stats["batches"] += 1
+                self._cond.notify_all()
+
+    def _process(self, turn: Turn) -> str:
+        """Рефлексия хода и, при низкой уверенности, авто-гипотеза; вернуть исход."""
+        return self._process_batch([turn])[0]
+
+    def _process_batch(self, turns: list[Turn]) -> list[str]:
+        """Рефлексия пачки ходов одним вызовом LLM; исходы — по порядку ходов."""
+        statuses = ["over_budget"] * len(turns)
+        allowed = [i for i, t in enumerate(turns) if self._scheduler.acquire(t)]
+        if not allowed:
+            return statuses
+        try:
+            if len(allowed) == 1:
+                turn = turns[allowed[0]]
+                records = [
+                    self._reflection.reflect(
+                        system_prompt=turn.system_prompt,
+                        last_user_message=turn.last_user_message,
+                        chat_history=turn.chat_history,
+                        assistant_response=turn.assistant_response,
+                        sources=turn.sources,
+                    )
+                ]
+            else:
+                batch: list[dict[str, Any]] = [turns[i].model_dump(include=_REFLECT_FIELDS) for i in allowed]
+                records = self._reflection.reflect_batch(batch)
+        except Exception as e:  # noqa: BLE001
+            logger.error("Reflection failed: %s", e)
+            for i in allowed:
+                statuses[i] = "failed"
+            return statuses
+        for i, record in zip(allowed, records, strict=True):
+            statuses[i] = self._after_reflection(turns[i], record)
+        return statuses
+
+    def _after_reflection(self, turn: Turn, record: ReflectionRecord) -> str:
+        if self._hyp_cfg.auto_generate and record.confidence < self._hyp_cfg.auto_threshold:
+            try:
+                self._hypothesis.generate(
+                    last_user_message=turn.last_user_message,
+                    assistant_response=turn.assistant_response,
+                    reflection=record,
+                    top_memory_limit=5,
+                    tags=["auto"],
+                )
+            except Exception as e:  # noqa: BLE001
+                logger.error("Auto-hypothesis failed: %s", e)
+                return "failed"
+        return "processed"
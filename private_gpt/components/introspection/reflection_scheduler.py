@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import logging
+import random
+import re
+import threading
+import time
+from collections import Counter, deque
+from typing import TYPE_CHECKING
+
+from injector import inject, singleton
+
+from private_gpt.settings.settings import Settings
+
+if TYPE_CHECKING:
+    from private_gpt.components.introspection.introspection_queue import Turn
+
+logger = logging.getLogger(__name__)
+
+_WINDOW_S = 60.0
+# ~4 символа на токен; системный промпт рефлексии и ответ модели — константы
+_CHARS_PER_TOKEN = 4
+_PROMPT_OVERHEAD_TOKENS = 120
+_ANSWER_TOKENS = 200
+
+# реплика пользователя, похожая на исправление предыдущего ответа
+_CORRECTION_RE = re.compile(
+    r"^\W*(?:no|nope|нет)\b|"
+    r"\b(?:wrong|incorrect|not (?:right|correct|true|what i)|that'?s not|"
+    r"you(?:'re| are) wrong|you misunderstood|i meant|"
+    r"неправильно|неверно|ошиб\w*|не так|не то|я имел в виду)\b",
+    re.IGNORECASE | re.UNICODE,
+)
+
+
+@singleton
+class ReflectionScheduler:
+    """Решает, на какие ходы чата тратить LLM-вызов рефлексии.
+
+    Ход выбирается, если сработал хоть один триггер из
+    `reflection.triggers` (длинный ответ, RAG без источников, исправление от
+    пользователя), иначе — с вероятностью `reflection.sample_rate`. Выбранный
+    ход перед вызовом LLM проверяется по бюджетам за скользящую минуту
+    (`calls_per_minute`, `tokens_per_minute`); сверх бюджета он пропускается.
+
+    Счётчики по триггерам и исходам — в `stats()`.
+    """
+
+    @inject
+    def __init__(self, settings: Settings) -> None:
+        self._cfg = settings.reflection
+        self._lock = threading.Lock()
+        self._window: deque[tuple[float, int]] = deque()
+        self._window_tokens = 0
+        self._counters: Counter[str] = Counter()
+        self._rng = random.Random()
+
+    def select(self, turn: Turn) -> str | None:
+        """Причина рефлексии хода (триггер или `sampled`); None — ход пропускается."""
+        fired = self.triggers(turn)
+        with self._lock:
+            self._counters["turns"] += 1
+            for name in fired:
+                self._counters[f"trigger.{name}"] += 1
+            if fired:
+                reason = fired[0]
+            elif self._rng.random() < self._cfg.sample_rate:
+                reason = "sampled"
+            else:
+                self._counters["skipped.not_sampled"] += 1
+                return None
+            self._counters[f"selected.{reason}"] += 1
+            return reason
+
+    def triggers(self, turn: Turn) -> list[str]:
+        enabled = self._cfg.triggers
+        fired = []
+        if "correction" in enabled and _is_correction(turn):
+            fired.append("correction")
+        if "no_sources" in enabled and turn.use_context and not turn.sources:
+            fired.append("no_sources")
+        if "long_answer" in enabled and len(turn.assistant_response) >= self._cfg.long_answer_chars:
+            fired.append("long_answer")
+        return fired
+
+    def acquire(self, turn: Turn, now: float | None = None) -> bool:
+        """Списать вызов и оценку токенов из минутного бюджета; False — бюджет исчерпан."""
+        now = time.monotonic() if now is None else now
+        tokens = estimate_tokens(turn)
+        with self._lock:
+            while self._window and now - self._window[0][0] >= _WINDOW_S:
+                self._window_tokens -= self._window.popleft()[1]
+            calls, max_tokens = self._cfg.calls_per_minute, self._cfg.tokens_per_minute
+            if (calls > 0 and len(self._window) >= calls) or (
+                max_tokens > 0 and self._window and self._window_tokens + tokens > max_tokens
+            ):
+                self._counters["skipped.budget"] += 1
+                return False
+            self._window.append((now, tokens))
+            self._window_tokens += tokens
+            self._counters["reflected"] += 1
+            self._counters["tokens"] += tokens
+            return True
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            out = dict(self._counters)
+            out["window_calls"] = len(self._window)
+            out["window_tokens"] = self._window_tokens
+            return out
+
+
+def estimate_tokens(turn: Turn) -> int:
+    """Грубая оценка токенов вызова рефлексии для хода (промпт + ответ)."""
+    chars = len(turn.system_prompt or "") + len(turn.last_user_message) + len(turn.assistant_response)
+    chars += sum(len(m.get("content", "")) for m in turn.chat_history[-6:])
+    return chars // _CHARS_PER_TOKEN + _PROMPT_OVERHEAD_TOKENS + _ANSWER_TOKENS
+
+
+def _is_correction(turn: Turn) -> bool:
+    """Есть предыдущий ответ ассистента, а реплика похожа на возражение."""
+    if not any(str(m.get("role", "")).endswith("assistant") for m in turn.chat_history):
+        return False
+    return _CORRECTION_RE.search(turn.last_user_message[:200]) is not None
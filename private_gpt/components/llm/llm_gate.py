@@ -0,0 +1,107 @@
+"""Priority gate in front of the shared LLM: user chats first, background work when idle."""
+
+from __future__ import annotations
+
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+
+from injector import singleton
+
+logger = logging.getLogger(__name__)
+
+# a user request that never released the gate (e.g. an abandoned stream) stops counting after this
+_STALE_USER_S = 600.0
+_SHARE_WINDOW_S = 3600.0
+
+
+@singleton
+class LLMGate:
+    """Tracks user LLM traffic and admits background LLM work around it.
+
+    User requests register with `enter_user()` (or `user()`) and are never
+    delayed. Background work (the internal monologue) asks `try_background()`
+    and is admitted only when no user request is in flight, none finished in
+    the last `quiet_s` seconds and no other background job runs. The time
+    spent in background jobs is recorded so callers can cap their share of
+    LLM time with `background_share()`.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._users: dict[int, float] = {}
+        self._last_user = float("-inf")
+        self._background = False
+        self._spans: deque[tuple[float, float]] = deque()
+
+    # ---------- user traffic ----------
+    def enter_user(self) -> Callable[[], None]:
+        """Register an in-flight user request; call the returned function when it ends."""
+        now = time.monotonic()
+        with self._lock:
+            key = next(self._ids)
+            self._users[key] = now
+            self._last_user = now
+
+        def release() -> None:
+            with self._lock:
+                if self._users.pop(key, None) is not None:
+                    self._last_user = time.monotonic()
+
+        return release
+
+    @contextmanager
+    def user(self) -> Iterator[None]:
+        release = self.enter_user()
+        try:
+            yield
+        finally:
+            release()
+
+    def users_in_flight(self, now: float | None = None) -> int:
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            return self._live_users(now)
+
+    # ---------- background work ----------
+    def try_background(self, quiet_s: float = 0.0, now: float | None = None) -> bool:
+        """Take the background slot if the LLM is idle; False means retry later."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if self._background or self._live_users(now) or now - self._last_user < quiet_s:
+                return False
+            self._background = True
+            return True
+
+    def release_background(self, started: float, now: float | None = None) -> None:
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._background = False
+            self._spans.append((started, now))
+            self._trim(now)
+
+    def background_share(self, now: float | None = None) -> float:
+        """Fraction of the last hour spent in background jobs."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._trim(now)
+            start = now - _SHARE_WINDOW_S
+            busy = sum(end - max(begin, start) for begin, end in self._spans)
+            return busy / _SHARE_WINDOW_S
+
+    def _live_users(self, now: float) -> int:
+        stale = [k for k, t in self._users.items() if now - t > _STALE_USER_S]
+        for k in stale:
+            del self._users[k]
+        if stale:
+            logger.warning("LLM gate: %d user requests never released, dropped", len(stale))
+        return len(self._users)
+
+    def _trim(self, now: float) -> None:
+        while self._spans and self._spans[0][1] <= now - _SHARE_WINDOW_S:
+            self._spans.popleft()
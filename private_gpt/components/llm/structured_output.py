@@ -0,0 +1,146 @@
+"""Schema-constrained chat calls for components that expect JSON from the LLM.
+
+The backend decides how the JSON schema is enforced:
+
+- Ollama: the schema is sent as `format`.
+- OpenAI / OpenAI-like / Azure OpenAI: `response_format` of type `json_schema`.
+- llama.cpp: the schema is compiled to a GBNF grammar.
+
+Other backends (and the mock LLM) get a plain chat call, so callers must still
+parse defensively. A failed structured request falls back to a plain call;
+a backend that rejected the schema itself (see `_rejects_schema`) is not
+asked again, while other errors (timeouts, server hiccups) only affect the
+current call.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import threading
+from collections.abc import Sequence
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any
+
+from llama_index.core.llms import ChatMessage, ChatResponse, MessageRole
+from pydantic import BaseModel, ConfigDict, create_model
+
+if TYPE_CHECKING:
+    from llama_index.core.llms import LLM
+
+logger = logging.getLogger(__name__)
+
+_unsupported: set[int] = set()
+_lock = threading.Lock()
+
+# error text of backends that do not accept a schema/format parameter
+_REJECTION_HINTS = (
+    "unsupported",
+    "not supported",
+    "unexpected keyword",
+    "response_format",
+    "json_schema",
+    "schema",
+    "grammar",
+)
+
+
+def llm_schema(model: type[BaseModel], fields: Sequence[str]) -> dict[str, Any]:
+    """JSON schema of an object with the given fields of `model`, all required."""
+    definitions: dict[str, Any] = {
+        name: (model.model_fields[name].annotation, ...) for name in fields
+    }
+    output: type[BaseModel] = create_model(  # type: ignore[call-overload]
+        f"{model.__name__}Output",
+        __config__=ConfigDict(extra="forbid"),
+        **definitions,
+    )
+    return output.model_json_schema()
+
+
+def array_schema(item: dict[str, Any], n: int, key: str = "items") -> dict[str, Any]:
+    """Object holding exactly `n` items under `key` (top-level arrays are not portable)."""
+    return {
+        "type": "object",
+        "properties": {key: {"type": "array", "items": item, "minItems": n, "maxItems": n}},
+        "required": [key],
+        "additionalProperties": False,
+    }
+
+
+def chat_json(
+    llm: LLM, messages: Sequence[ChatMessage], schema: dict[str, Any], *, name: str
+) -> ChatResponse:
+    """`llm.chat` with the answer constrained to `schema` where the backend allows it."""
+    kind = _backend(llm)
+    if kind is None or id(llm) in _unsupported:
+        return llm.chat(messages)
+    try:
+        if kind == "ollama":
+            return llm.chat(messages, format=schema)
+        if kind == "openai":
+            return llm.chat(
+                messages,
+                response_format={
+                    "type": "json_schema",
+                    "json_schema": {"name": name, "schema": schema, "strict": False},
+                },
+            )
+        return _llamacpp_chat(llm, messages, schema)
+    except Exception as e:  # noqa: BLE001
+        logger.debug("Structured output failed on %s (%s), retrying without schema", kind, e)
+        response = llm.chat(messages)
+        if _rejects_schema(e):
+            # the plain call worked, so the backend (not the server) rejected the schema
+            with _lock:
+                _unsupported.add(id(llm))
+        return response
+
+
+def _rejects_schema(error: Exception) -> bool:
+    """Whether `error` means the backend refused the schema parameter rather than failed transiently."""
+    if isinstance(error, TypeError):
+        # client without the keyword argument
+        return True
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    if status in (400, 422):
+        return True
+    text = str(error).lower()
+    return any(hint in text for hint in _REJECTION_HINTS)
+
+
+def _backend(llm: LLM) -> str | None:
+    names = {cls.__name__ for cls in type(llm).__mro__}
+    if "Ollama" in names:
+        return "ollama"
+    if "OpenAI" in names or "OpenAILike" in names:
+        return "openai"
+    if "LlamaCPP" in names:
+        return "llamacpp"
+    return None
+
+
+def _llamacpp_chat(llm: Any, messages: Sequence[ChatMessage], schema: dict[str, Any]) -> ChatResponse:
+    # LlamaCPP.chat drops per-call kwargs, so call the underlying model with a grammar
+    model = getattr(llm, "_model", None)
+    if not callable(model) or not callable(getattr(llm, "messages_to_prompt", None)):
+        # llama-index internals changed: no schema, but not a rejection either
+        logger.debug("LlamaCPP model handle not found, structured output disabled for this call")
+        return llm.chat(messages)  # type: ignore[no-any-return]
+    prompt = llm.messages_to_prompt(messages)
+    kwargs = {
+        **getattr(llm, "generate_kwargs", {}),
+        "stream": False,
+        "grammar": _grammar(json.dumps(schema, sort_keys=True)),
+    }
+    response = model(prompt=prompt, **kwargs)
+    text = response["choices"][0]["text"]
+    return ChatResponse(message=ChatMessage(role=MessageRole.ASSISTANT, content=text), raw=response)
+
+
+@lru_cache(maxsize=32)
+def _grammar(schema_json: str) -> Any:
+    from llama_cpp import LlamaGrammar  # type: ignore
+
+    return LlamaGrammar.from_json_schema(schema_json, verbose=False)
@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Callable
+
+if TYPE_CHECKING:
+    from private_gpt.components.memory.memory_component import MemoryItem
+
+logger = logging.getLogger(__name__)
+
+EmbedBatchFn = Callable[[list[str]], list[list[float]]]
+EmbedOneFn = Callable[[str], list[float]]
+CommitFn = Callable[[list[tuple["MemoryItem", list[float] | None]]], None]
+
+
+class EmbeddingQueue:
+    """Фоновая очередь эмбеддингов памяти.
+
+    Элементы копятся и уходят в `get_text_embedding_batch` пачкой, как только
+    набралось `max_batch` штук или самый старый ждёт дольше `max_latency_ms`.
+    Готовые элементы передаются в `commit` (запись в хранилище и индекс);
+    до этого они видны через `pending()`. Элементы, сброшенные `clear()`
+    во время эмбеддинга, `commit` должен пропустить (см. `is_pending`).
+    Записанные элементы `commit` снимает с ожидания сам (`done()`) под той
+    же блокировкой, что и запись, — иначе читатель увидит их дважды.
+    """
+
+    def __init__(
+        self,
+        *,
+        embed_batch: EmbedBatchFn,
+        embed_one: EmbedOneFn,
+        commit: CommitFn,
+        max_batch: int = 32,
+        max_latency_ms: int = 50,
+    ) -> None:
+        self._embed_batch = embed_batch
+        self._embed_one = embed_one
+        self._commit = commit
+        self._max_batch = max(1, max_batch)
+        self._max_latency = max(0, max_latency_ms) / 1000.0
+        self._cond = threading.Condition()
+        self._queue: deque[tuple[float, MemoryItem]] = deque()
+        self._pending: dict[str, MemoryItem] = {}
+        self._thread: threading.Thread | None = None
+        self._stopping = False
+        self._flushers = 0
+
+    # ---------- API ----------
+    def submit(self, items: list[MemoryItem]) -> None:
+        with self._cond:
+            now = time.monotonic()
+            for it in items:
+                self._queue.append((now, it))
+                self._pending[it.id] = it
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run, name="memory-embedding", daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def pending(self) -> list[MemoryItem]:
+        """Элементы, чей эмбеддинг ещё не получен (в порядке добавления)."""
+        with self._cond:
+            return list(self._pending.values())
+
+    def is_pending(self, item_id: str) -> bool:
+        with self._cond:
+            return item_id in self._pending
+
+    def done(self, item_ids: list[str]) -> None:
+        """Снять элементы с ожидания (они уже в индексе)."""
+        with self._cond:
+            for item_id in item_ids:
+                self._pending.pop(item_id, None)
+            self._cond.notify_all()
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Дождаться, пока очередь опустеет; True — если успели."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._flushers += 1
+            self._cond.notify_all()
+            try:
+                while self._pending:
+                    left = None if deadline is None else deadline - time.monotonic()
+                    if left is not None and left <= 0:
+                        return False
+                    self._cond.wait(left)
+            finally:
+                self._flushers -= 1
+        return True
+
+    def clear(self) -> None:
+        """Отбросить всё, что ещё не записано."""
+        with self._cond:
+            self._queue.clear()
+            self._pending.clear()
+            self._cond.notify_all()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Дописать очередь и остановить поток (вызывается при выходе)."""
+        self.flush(timeout)
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+
+    # ---------- worker ----------
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            results = self._embed(batch)
+            try:
+                self._commit(results)
+            except Exception as e:  # noqa: BLE001
+                logger.error("Memory commit failed: %s", e)
+            finally:
+                # обычно уже снято в commit; здесь — на случай ошибки записи
+                self.done([it.id for it, _ in results])
+
+    def _next_batch(self) -> list[MemoryItem] | None:
+        with self._cond:
+            while True:
+                if self._stopping and not self._queue:
+                    return None
+                if not self._queue:
+                    self._cond.wait()
+                    continue
+                waited = time.monotonic() - self._queue[0][0]
+                # кто-то ждёт в flush() — не держим пачку до дедлайна
+                draining = self._stopping or self._flushers > 0
+                if len(self._queue) >= self._max_batch or waited >= self._max_latency or draining:
+                    n = min(self._max_batch, len(self._queue))
+                    return [self._queue.popleft()[1] for _ in range(n)]
+                self._cond.wait(self._max_latency - waited)
+
+    def _embed(self, batch: list[MemoryItem]) -> list[tuple[MemoryItem, list[float] | None]]:
+        texts = [it.text for it in batch]
+        try:
+            embs = self._embed_batch(texts)
+            if len(embs) == len(batch):
+                return list(zip(batch, embs, strict=True))
+            logger.error("Embedding batch returned %d vectors for %d texts", len(embs), len(batch))
+        except Exception as e:  # noqa: BLE001
+            logger.error("Embedding batch failed, falling back to single texts: %s", e)
+        out: list[tuple[MemoryItem, list[float] | None]] = []
+        for it in batch:
+            try:
+                out.append((it, self._embed_one(it.text)))
+            except Exception as e:  # noqa: BLE001
+                logger.error("Embedding failed: %s", e)
+                out.append((it, None))
+        return out
@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import logging
+import math
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class IVFIndex:
+    """IVF-flat индекс поверх NumPy — генератор кандидатов для поиска по памяти.
+
+    Векторы (нормированные) раскладываются по `nlist` кластерам сферического
+    k-means; запрос смотрит только `nprobe` ближайших кластеров. Итоговый скор
+    (importance * decay) считается точно уже по кандидатам в `MemoryIndex`.
+
+    На диске (`memory.ivf.npz`) лежат центроиды и номера кластеров строк;
+    строки, добавленные после последнего сохранения, доназначаются при загрузке.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        *,
+        nlist: int = 0,
+        min_items: int = 5000,
+        save_every: int = 1024,
+    ) -> None:
+        self.path = path
+        self._nlist_cfg = nlist
+        self._min_items = min_items
+        self._save_every = save_every
+        self._lock = threading.RLock()
+        self._centroids: np.ndarray | None = None
+        self._assign = np.zeros(0, dtype=np.int32)
+        self._lists: list[list[int]] = []
+        self._trained_on = 0
+        self._dirty = 0
+
+    @property
+    def ready(self) -> bool:
+        return self._centroids is not None
+
+    # ---------- build / update ----------
+    def sync(self, vectors: np.ndarray, has_vec: np.ndarray) -> None:
+        """Привести индекс к текущим строкам: загрузить с диска, (до)обучить, доназначить."""
+        with self._lock:
+            n = vectors.shape[0]
+            if vectors.ndim != 2 or vectors.shape[1] == 0:
+                return
+            if self._centroids is None and self._trained_on == 0:
+                self._load(vectors.shape[1])
+            if self._assign.shape[0] > n:
+                logger.warning("IVF index is ahead of memory storage, rebuilding")
+                self._centroids = None
+            if self._centroids is None or n >= 4 * self._trained_on:
+                if int(has_vec[:n].sum()) >= self._min_items:
+                    self._train(vectors, has_vec)
+                    self.save()
+                return
+            if self._assign.shape[0] < n:
+                start = self._assign.shape[0]
+                self._assign_rows(np.arange(start, n), vectors[start:n], has_vec[start:n])
+
+    def add(self, row: int, vectors: np.ndarray, has_vec: np.ndarray) -> None:
+        """Учесть новую строку `row`; при заметном росте памяти — переобучить кластеры."""
+        with self._lock:
+            if self._centroids is None or row + 1 >= 4 * self._trained_on:
+                if self._centroids is None and row + 1 < self._min_items:
+                    return
+                self.sync(vectors[: row + 1], has_vec[: row + 1])
+                return
+            self._assign_rows(np.array([row]), vectors[row : row + 1], has_vec[row : row + 1])
+            self._dirty += 1
+            if self._dirty >= self._save_every:
+                self.save()
+
+    def candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        """Строки из `nprobe` кластеров, ближайших к нормированному запросу."""
+        with self._lock:
+            assert self._centroids is not None
+            sims = self._centroids @ query
+            nprobe = min(max(1, nprobe), sims.shape[0])
+            probe = np.argpartition(-sims, nprobe - 1)[:nprobe]
+            rows = [r for c in probe for r in self._lists[c]]
+            return np.sort(np.asarray(rows, dtype=np.int64))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._centroids = None
+            self._assign = np.zeros(0, dtype=np.int32)
+            self._lists = []
+            self._trained_on = 0
+            self._dirty = 0
+            self.path.unlink(missing_ok=True)
+
+    # ---------- persistence ----------
+    def save(self) -> None:
+        with self._lock:
+            if self._centroids is None:
+                return
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            with tmp.open("wb") as f:
+                np.savez(
+                    f,
+                    centroids=self._centroids,
+                    assign=self._assign,
+                    trained_on=np.array(self._trained_on),
+                )
+            os.replace(tmp, self.path)
+            self._dirty = 0
+
+    def _load(self, dim: int) -> None:
+        if not self.path.exists():
+            return
+        try:
+            with np.load(self.path) as data:
+                centroids = data["centroids"].astype(np.float32)
+                assign = data["assign"].astype(np.int32)
+                trained_on = int(data["trained_on"])
+        except Exception as e:  # noqa: BLE001
+            logger.warning("Ignoring unreadable IVF index %s: %s", self.path, e)
+            return
+        if centroids.shape[1] != dim:
+            logger.warning("IVF index dim %s != memory dim %s, rebuilding", centroids.shape[1], dim)
+            return
+        self._centroids = centroids
+        self._assign = assign
+        self._trained_on = trained_on
+        self._rebuild_lists()
+
+    # ---------- internals ----------
+    def _train(self, vectors: np.ndarray, has_vec: np.ndarray, iters: int = 10) -> None:
+        n = vectors.shape[0]
+        rows = np.flatnonzero(has_vec[:n])
+        nlist = self._nlist_cfg or max(1, int(math.sqrt(rows.shape[0])))
+        nlist = min(nlist, rows.shape[0])
+        rng = np.random.default_rng(0)
+        sample = rows if rows.shape[0] <= 64 * nlist else rng.choice(rows, 64 * nlist, replace=False)
+        data = vectors[sample]
+        centroids = data[rng.choice(data.shape[0], nlist, replace=False)].copy()
+        for _ in range(iters):
+            labels = np.argmax(data @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, data)
+            norms = np.linalg.norm(sums, axis=1)
+            alive = norms > 0.0
+            centroids[alive] = sums[alive] / norms[alive, None]
+        self._centroids = centroids.astype(np.float32)
+        self._assign = np.zeros(0, dtype=np.int32)
+        self._lists = []
+        self._trained_on = int(rows.shape[0])
+        self._assign_rows(np.arange(n), vectors[:n], has_vec[:n])
+        logger.info("Memory IVF index trained: %d vectors, %d lists", rows.shape[0], nlist)
+
+    def _assign_rows(
+        self, rows: np.ndarray, vectors: np.ndarray | None, has_vec: np.ndarray
+    ) -> None:
+        assert self._centroids is not None
+        labels = np.full(rows.shape[0], -1, dtype=np.int32)
+        if vectors is not None and has_vec.any():
+            labels[has_vec] = np.argmax(vectors[has_vec] @ self._centroids.T, axis=1)
+        end = int(rows.max()) + 1 if rows.shape[0] else 0
+        if self._assign.shape[0] < end:
+            grown = np.full(end, -1, dtype=np.int32)
+            grown[: self._assign.shape[0]] = self._assign
+            self._assign = grown
+        self._assign[rows] = labels
+        if len(self._lists) != self._centroids.shape[0]:
+            self._rebuild_lists()
+            return
+        for r, c in zip(rows.tolist(), labels.tolist(), strict=True):
+            if c >= 0:
+                self._lists[c].append(r)
+
+    def _rebuild_lists(self) -> None:
+        assert self._centroids is not None
+        self._lists = [[] for _ in range(self._centroids.shape[0])]
+        for r, c in enumerate(self._assign.tolist()):
+            if c >= 0:
+                self._lists[c].append(r)
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import math
+import re
+from array import array
+from collections import Counter
+
+import numpy as np
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> list[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+class BM25Index:
+    """Инкрементальный BM25 по текстам памяти.
+
+    Постинги `терм → (строки, tf)` только дописываются, поэтому строки в них
+    идут по возрастанию. Длины документов лежат в NumPy-колонке; запрос
+    трогает лишь постинги своих термов, а не все записи.
+    """
+
+    def __init__(self, *, k1: float = 1.2, b: float = 0.75) -> None:
+        self.k1 = k1
+        self.b = b
+        self._postings: dict[str, tuple[array[int], array[float]]] = {}
+        self._dl = np.zeros(1024, dtype=np.float32)
+        self._n = 0
+        self._total_len = 0
+
+    def __len__(self) -> int:
+        return self._n
+
+    def add(self, row: int, text: str) -> None:
+        """Проиндексировать строку `row`; строки добавляются подряд, без пропусков."""
+        if row != self._n:
+            raise ValueError(f"BM25 rows must be added in order: expected {self._n}, got {row}")
+        tokens = tokenize(text or "")
+        for term, tf in Counter(tokens).items():
+            rows, tfs = self._postings.setdefault(term, (array("q"), array("f")))
+            rows.append(row)
+            tfs.append(tf)
+        if self._n == self._dl.shape[0]:
+            self._dl = np.concatenate([self._dl, np.zeros_like(self._dl)])
+        self._dl[row] = len(tokens)
+        self._total_len += len(tokens)
+        self._n += 1
+
+    def scores(self, terms: list[str]) -> tuple[np.ndarray, np.ndarray]:
+        """Строки, где встретился хоть один терм (по возрастанию), и их BM25."""
+        n = self._n
+        found = [self._postings[t] for t in set(terms) if t in self._postings]
+        if n == 0 or not found:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+        avgdl = max(self._total_len / n, 1e-9)
+        all_rows, all_scores = [], []
+        for rows_buf, tfs_buf in found:
+            rows = np.frombuffer(rows_buf, dtype=np.int64).copy()
+            tf = np.frombuffer(tfs_buf, dtype=np.float32).astype(np.float64)
+            df = rows.shape[0]
+            idf = math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1.0 - self.b + self.b * self._dl[rows] / avgdl)
+            all_rows.append(rows)
+            all_scores.append(idf * tf * (self.k1 + 1.0) / (tf + norm))
+        if len(all_rows) == 1:
+            return all_rows[0], all_scores[0]
+        uniq, inv = np.unique(np.concatenate(all_rows), return_inverse=True)
+        return uniq, np.bincount(inv, weights=np.concatenate(all_scores))
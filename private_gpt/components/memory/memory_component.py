@@ -1,24 +1,63 @@
 from __future__ import annotations
 
+import atexit
+import builtins
 import json
 import logging
 import math
+import os
+import threading
+import time
 import uuid
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Iterable, Optional
+from typing import Any, Iterable, Iterator
 
+import numpy as np
 from injector import inject, singleton
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 
 from private_gpt.paths import local_data_path
 from private_gpt.components.embedding.embedding_component import EmbeddingComponent
+from private_gpt.components.memory.embedding_queue import EmbeddingQueue
+from private_gpt.components.memory.memory_ann import IVFIndex
+from private_gpt.components.memory.memory_bm25 import tokenize as _tokenize
+from private_gpt.components.memory.memory_consolidation import (
+    merge_records,
+    near_duplicate_clusters,
+)
+from private_gpt.components.memory.memory_index import MemoryIndex, record_epoch
+from private_gpt.components.memory.memory_pq import ProductQuantizer
+from private_gpt.components.memory.memory_tiers import ColdStore
+from private_gpt.components.memory.vector_file import VectorFile
+from private_gpt.settings.settings import Settings
+from private_gpt.utils.append_log import AppendLog
+from private_gpt.utils.pagination import take_page
 
 logger = logging.getLogger(__name__)
 
 _MEM_DIR = local_data_path / "memory"
 _MEM_FILE = _MEM_DIR / "memory.jsonl"
+_MEM_VEC_FILE = _MEM_DIR / "memory.f32"
+_MEM_IVF_FILE = _MEM_DIR / "memory.ivf.npz"
+_MEM_TOMB_FILE = _MEM_DIR / "memory.tombstones.jsonl"
+_MEM_ARCHIVE_FILE = _MEM_DIR / "memory.archive.jsonl"
+_MEM_STATE_FILE = _MEM_DIR / "memory.consolidate.json"
+_MEM_COLD_DIR = _MEM_DIR / "memory.cold"
+
+# перезаписать хранилище, когда удалённых строк стало столько (и >= доли от всех)
+_COMPACT_MIN_DEAD = 256
+_COMPACT_DEAD_RATIO = 0.25
+# понижение в холодный ярус — до этой доли `tier_hot_max_items`, с запасом на рост
+_TIER_LOW_WATER = 0.9
+_TIER_HIGH_WATER = 1.1
+# PQ-книга обучается, когда векторов набралось хотя бы столько (по 256 центроидов)
+_PQ_MIN_TRAIN = 256
+_PQ_MAX_TRAIN = 16384
+# оценка размера воспоминания в промпте: ~4 символа на токен + id/kind/importance/tags
+_CHARS_PER_TOKEN = 4
+_ITEM_OVERHEAD_TOKENS = 16
 
 
 class MemoryItem(BaseModel):
@@ -30,6 +69,8 @@ class MemoryItem(BaseModel):
         Уникальный идентификатор.
     timestamp : str
         Время создания (UTC, ISO8601).
+    ts : float | None
+        То же время в секундах epoch (для старых записей выводится из `timestamp`).
     kind : str
         Тип записи (e.g., "observation", "insight", "todo", "monologue").
     text : str
@@ -40,6 +81,8 @@ class MemoryItem(BaseModel):
         Векторное представление текста.
     tags : list[str]
         Ярлыки.
+    merged_from : list[str]
+        Id записей, слитых в эту при консолидации.
     """
 
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -49,32 +92,150 @@ class MemoryItem(BaseModel):
     importance: float = 0.5
     embedding: list[float] | None = None
     tags: list[str] = Field(default_factory=list)
+    merged_from: list[str] = Field(default_factory=list)
+    ts: float | None = None
+
+    @model_validator(mode="after")
+    def _fill_ts(self) -> MemoryItem:
+        if self.ts is None:
+            self.ts = record_epoch({"timestamp": self.timestamp})
+        return self
 
 
 @dataclass
 class _MemStorage:
+    """Метаданные — в JSONL, эмбеддинги — в бинарном sidecar `memory.f32`.
+
+    Запись JSONL хранит номер строки вектора в поле `emb_row`;
+    старый формат (вектор в поле `embedding`) переводится `migrate()`.
+
+    Консолидация не трогает `memory.jsonl` сразу: id удалённых записей
+    дописываются в `memory.tombstones.jsonl`, сами записи — в
+    `memory.archive.jsonl`; `compact()` потом перезаписывает хранилище без них.
+
+    Перезапись (`migrate()`/`compact()`) меняет оба файла, но фиксируется
+    одной заменой JSONL: новый sidecar до неё лежит рядом как
+    `memory.f32.migrating`, а `ensure()` после сбоя либо доводит замену
+    sidecar до конца, либо отбрасывает недописанные файлы — номера
+    `emb_row` всегда указывают в «свой» файл векторов.
+    """
+
     file_path: Path = _MEM_FILE
+    vec_path: Path = _MEM_VEC_FILE
+    tomb_path: Path = _MEM_TOMB_FILE
+    archive_path: Path = _MEM_ARCHIVE_FILE
+    state_path: Path = _MEM_STATE_FILE
+
+    def __post_init__(self) -> None:
+        # записи памяти целиком живут в MemoryIndex — кольцо последних записей не нужно
+        self.log = AppendLog(self.file_path, ring_size=0)
+        self.vectors = VectorFile(self.vec_path)
+        self.tombstones = AppendLog(self.tomb_path, ring_size=0)
+        self.archive = AppendLog(self.archive_path, ring_size=0)
 
     def ensure(self) -> None:
-        self.file_path.parent.mkdir(parents=True, exist_ok=True)
-        if not self.file_path.exists():
-            self.file_path.touch()
+        self._recover()
+        self.log.ensure()
+        self.vectors.ensure()
+        self.tombstones.ensure()
 
-    def append(self, rec: dict[str, Any]) -> None:
-        with self.file_path.open("a", encoding="utf-8") as f:
-            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+    def append(self, rec: dict[str, Any], embedding: list[float] | None = None) -> dict[str, Any]:
+        """Записать вектор в sidecar, а метаданные (с `emb_row`) — в JSONL."""
+        rec = {k: v for k, v in rec.items() if k != "embedding"}
+        if embedding:
+            rec["emb_row"] = self.vectors.append(embedding)
+        self.log.append(rec)
+        return rec
 
     def iter_all(self) -> Iterable[dict[str, Any]]:
-        if not self.file_path.exists() or self.file_path.stat().st_size == 0:
-            return []
+        return self.log.iter_all()
+
+    def needs_migration(self) -> bool:
+        """Есть ли записи старого формата (вектор внутри JSONL)."""
+        if not self.file_path.exists():
+            return False
         with self.file_path.open("r", encoding="utf-8") as f:
-            for line in f:
-                t = line.strip()
-                if t:
-                    yield json.loads(t)
+            return any('"embedding":' in line for line in f)
+
+    def migrate(self) -> int:
+        """Однократно вынести эмбеддинги из JSONL в sidecar; вернуть число векторов."""
+        return self._rewrite(frozenset())
+
+    def compact(self, dead_rows: Iterable[int]) -> None:
+        """Перезаписать JSONL и sidecar без строк `dead_rows`, сбросить надгробия."""
+        self._rewrite(frozenset(dead_rows))
+        self.tombstones.clear()
+
+    def read_state(self) -> dict[str, Any]:
+        try:
+            return json.loads(self.state_path.read_text(encoding="utf-8"))  # type: ignore[no-any-return]
+        except (OSError, ValueError):
+            return {}
+
+    def write_state(self, state: dict[str, Any]) -> None:
+        tmp = self.state_path.with_name(self.state_path.name + ".tmp")
+        tmp.write_text(json.dumps(state), encoding="utf-8")
+        os.replace(tmp, self.state_path)
+
+    @property
+    def _tmp_jsonl(self) -> Path:
+        return self.file_path.with_suffix(".jsonl.migrating")
+
+    @property
+    def _tmp_vec(self) -> Path:
+        return self.vec_path.with_suffix(".f32.migrating")
+
+    def _recover(self) -> None:
+        """Завершить перезапись, прерванную сбоем (см. `_rewrite`)."""
+        if self._tmp_jsonl.exists():
+            # JSONL не заменён — старая пара файлов цела, новая недописана
+            self._tmp_jsonl.unlink()
+            self._tmp_vec.unlink(missing_ok=True)
+            logger.warning("Memory: discarded an interrupted rewrite of %s", self.file_path)
+        elif self._tmp_vec.exists():
+            # JSONL уже новый — ставим на место и его векторы
+            os.replace(self._tmp_vec, self.vec_path)
+            _fsync(self.vec_path.parent)
+            logger.warning("Memory: finished an interrupted rewrite of %s", self.vec_path)
+
+    def _rewrite(self, drop: frozenset[int]) -> int:
+        tmp_jsonl = self._tmp_jsonl
+        tmp_vec = VectorFile(self._tmp_vec)
+        old = self.vectors.open()
+        moved = 0
+        # порядок важен для _recover: временный JSONL появляется раньше sidecar
+        with tmp_jsonl.open("w", encoding="utf-8") as out:
+            tmp_vec.clear()
+            # пустой файл — пустой sidecar (VectorFile читает его как «нет векторов»)
+            tmp_vec.path.touch()
+            for i, rec in enumerate(self.iter_all()):
+                if i in drop:
+                    continue
+                emb = rec.pop("embedding", None)
+                row = rec.pop("emb_row", None)
+                if emb:
+                    rec["emb_row"] = tmp_vec.append(emb)
+                    moved += 1
+                elif row is not None and old is not None and row < old.shape[0]:
+                    rec["emb_row"] = tmp_vec.append(old[row])
+                out.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            out.flush()
+            os.fsync(out.fileno())
+        del old
+        _fsync(tmp_vec.path)
+        # точка фиксации: до неё действует старая пара файлов, после — новая
+        os.replace(tmp_jsonl, self.file_path)
+        _fsync(self.file_path.parent)
+        os.replace(tmp_vec.path, self.vec_path)
+        _fsync(self.vec_path.parent)
+        return moved
 
     def clear(self) -> None:
-        self.file_path.unlink(missing_ok=True)
+        self.log.clear()
+        self.vectors.clear()
+        self.tombstones.clear()
+        self.archive.clear()
+        self.state_path.unlink(missing_ok=True)
         self.ensure()
 
 
@@ -83,11 +244,55 @@ class MemoryComponent:
     """Память с поддержкой забывания (decay) и поиска по эмбеддингам."""
 
     @inject
-    def __init__(self, embedding_component: EmbeddingComponent) -> None:
+    def __init__(self, settings: Settings, embedding_component: EmbeddingComponent) -> None:
+        self._cfg = settings.memory
         self._emb = embedding_component.embedding_model
+        self._lock = threading.RLock()
         self._store = _MemStorage()
         self._store.ensure()
-        logger.info("Memory storage at %s", self._store.file_path)
+        if self._store.needs_migration():
+            moved = self._store.migrate()
+            logger.info("Memory: moved %d embeddings from JSONL to %s", moved, self._store.vec_path)
+        self._index = MemoryIndex()
+        # ярусы и IVF несовместимы: IVF держит в RAM все векторы
+        self._cold: ColdStore | None = None
+        if self._cfg.tier_hot_max_items > 0 and self._cfg.search_mode != "ann":
+            self._cold = ColdStore(_MEM_COLD_DIR)
+            self._cold.load()
+            self._index.attach_cold(
+                self._cold,
+                score_floor=self._cfg.tier_cold_score_floor,
+                exact=self._exact_vectors,
+                rerank=self._cfg.tier_rerank,
+            )
+        self._index.load(list(self._store.iter_all()), self._store.vectors.open())
+        self._index.delete(self._tombstoned_rows())
+        self._rebalance()
+        self._state = self._store.read_state()
+        # меняется при clear(): консолидация не применяет устаревшие результаты
+        self._epoch = 0
+        self._consolidate_lock = threading.Lock()
+        self._ann: IVFIndex | None = None
+        if self._cfg.search_mode == "ann":
+            self._ann = IVFIndex(_MEM_IVF_FILE, nlist=self._cfg.ann_nlist, min_items=self._cfg.ann_min_items)
+            self._ann.sync(*self._index.vectors())
+        self._queue: EmbeddingQueue | None = None
+        if self._cfg.embed_async:
+            self._queue = EmbeddingQueue(
+                embed_batch=self._emb.get_text_embedding_batch,
+                embed_one=self._emb.get_text_embedding,
+                commit=self._commit_embedded,
+                max_batch=self._cfg.embed_batch_size,
+                max_latency_ms=self._cfg.embed_max_latency_ms,
+            )
+            atexit.register(self._queue.stop)
+        self._stop = threading.Event()
+        if self._cfg.consolidate_interval_s > 0:
+            threading.Thread(
+                target=self._consolidate_loop, name="memory-consolidate", daemon=True
+            ).start()
+            atexit.register(self._stop.set)
+        logger.info("Memory storage at %s (%d items)", self._store.file_path, len(self._index))
 
     # ---------- API ----------
     def add(
@@ -99,24 +304,202 @@ class MemoryComponent:
         tags: list[str] | None = None,
         embed: bool = True,
     ) -> MemoryItem:
-        emb: Optional[list[float]] = None
-        if embed:
-            try:
-                emb = self._emb.get_text_embedding(text)  # type: ignore
-            except Exception as e: # noqa: BLE001
-                logger.error("Embedding failed: %s", e)
-                emb = None
+        """Добавить воспоминание.
+
+        При `memory.embed_async` эмбеддинг считается в фоне: элемент
+        возвращается сразу (без `embedding`) и попадает в векторный поиск,
+        когда вектор готов; до этого он находится лексически.
+        """
+        item = MemoryItem(text=text, kind=kind, importance=float(importance), tags=tags or [])
+        return self.add_many([item], embed=embed)[0]
 
-        item = MemoryItem(text=text, kind=kind, importance=float(importance), tags=tags or [], embedding=emb)
-        self._store.append(item.model_dump())
-        return item
+    def add_many(self, items: list[MemoryItem], *, embed: bool = True) -> list[MemoryItem]:
+        """Добавить несколько воспоминаний; эмбеддинги — одним batch-вызовом."""
+        if not items:
+            return []
+        if not embed:
+            self._commit([(it, None) for it in items])
+            return items
+        if self._queue is not None:
+            self._queue.submit(items)
+            return items
+
+        embs: list[list[float] | None]
+        try:
+            embs = list(self._emb.get_text_embedding_batch([it.text for it in items]))  # type: ignore
+        except Exception as e:  # noqa: BLE001
+            logger.error("Embedding failed: %s", e)
+            embs = [None] * len(items)
+        for it, emb in zip(items, embs, strict=True):
+            it.embedding = emb
+        self._commit(list(zip(items, embs, strict=True)))
+        return items
 
-    def list(self, limit: int = 100) -> list[MemoryItem]:
-        items: list[MemoryItem] = [MemoryItem(**r) for r in self._store.iter_all()]
+    def flush(self, timeout: float | None = None) -> bool:
+        """Дождаться записи всех элементов из фоновой очереди эмбеддингов."""
+        return self._queue.flush(timeout) if self._queue is not None else True
+
+    def list(
+        self,
+        limit: int = 100,
+        *,
+        kinds: list[str] | None = None,
+        tags: list[str] | None = None,
+    ) -> list[MemoryItem]:
+        """Последние `limit` воспоминаний; `kinds` — любой из типов, `tags` — все ярлыки."""
+        # индекс и очередь читаются под одной блокировкой с _commit_embedded
+        with self._lock:
+            rows = self._index.rows(kinds=kinds, tags=tags)[-limit:].tolist()
+            items = [MemoryItem(**self._index.record(row)) for row in rows]
+            if self._queue is not None:
+                items.extend(it for it in self._queue.pending() if _matches(it, kinds, tags))
         return items[-limit:]
 
+    def page(
+        self,
+        limit: int = 100,
+        *,
+        before: int | None = None,
+        kinds: builtins.list[str] | None = None,
+        tags: builtins.list[str] | None = None,
+        since: datetime | float | None = None,
+        until: datetime | float | None = None,
+    ) -> tuple[builtins.list[MemoryItem], int | None]:
+        """Страница списка: последние `limit` воспоминаний до строки `before` (старые первыми).
+
+        Фильтры — как у `search()`, отбор идёт по индексу, записи собираются
+        только для попавших на страницу строк. Ожидающие эмбеддинга элементы
+        попадают лишь на первую страницу. Второе значение — позиция следующей
+        (более старой) страницы или None.
+        """
+        lo, hi = _as_epoch(since), _as_epoch(until)
+        with self._lock:
+            n = len(self._index)
+            rows = self._index.rows(kinds=kinds, tags=tags, since=lo, until=hi)
+            if before is not None:
+                rows = rows[rows < before]
+            pending: list[MemoryItem] = []
+            if before is None and self._queue is not None:
+                pending = [
+                    it for it in self._queue.pending()
+                    if _matches(it, kinds, tags) and (lo is None or it.ts >= lo) and (hi is None or it.ts <= hi)  # type: ignore[operator]
+                ]
+
+            def candidates() -> Iterator[tuple[int, MemoryItem]]:
+                # ожидающие ещё не в индексе: следующая страница — все строки индекса
+                yield from ((n, it) for it in reversed(pending))
+                yield from ((int(row), MemoryItem(**self._index.record(int(row)))) for row in rows[::-1])
+
+            return take_page(candidates(), limit)
+
+    def version(self) -> tuple[tuple[int, int], tuple[int, int, int, int]]:
+        """(поколение, ревизия) для курсоров и ETag списка, без чтения записей.
+
+        Поколение меняется при очистке и сжатии (номера строк другие),
+        ревизия — при добавлении, удалении и переносе между ярусами.
+        """
+        with self._lock:
+            pending = len(self._queue.pending()) if self._queue is not None else 0
+            generation = (self._epoch, self._store.log.generation)
+            return generation, (len(self._index), self._index.n_dead, self._index.hot_count(), pending)
+
+    def count(self, *, since: float | None = None, kinds: builtins.list[str] | None = None) -> int:
+        """Число воспоминаний (с `ts >= since`, любого из `kinds`) — по индексу, без чтения записей."""
+        with self._lock:
+            n = int(self._index.rows(kinds=kinds, since=since).shape[0])
+            if self._queue is not None:
+                n += len([
+                    it for it in self._queue.pending()
+                    if (since is None or it.ts >= since) and _matches(it, kinds, None)  # type: ignore[operator]
+                ])
+        return n
+
+    def context(
+        self,
+        query: str,
+        *,
+        max_tokens: int,
+        max_items: int = 20,
+        kinds: builtins.list[str] | None = None,
+    ) -> builtins.list[MemoryItem]:
+        """Воспоминания для промпта LLM: лучшие по `search()` в пределах бюджета токенов.
+
+        Ранжирование — то же, что у `search()` (близость к `query` ×
+        важность × затухание). Пустой запрос — самые свежие записи. Записи
+        берутся по убыванию оценки, пока их текст укладывается в
+        `max_tokens` (~4 символа на токен); не влезающие пропускаются.
+        """
+        if query.strip():
+            ranked = [it for it, _ in self.search(query, top_k=max_items, kinds=kinds)]
+        else:
+            ranked = self.list(limit=max_items, kinds=kinds)[::-1]
+        out: list[MemoryItem] = []
+        left = max_tokens
+        for it in ranked:
+            cost = len(it.text) // _CHARS_PER_TOKEN + _ITEM_OVERHEAD_TOKENS
+            if cost <= left:
+                out.append(it)
+                left -= cost
+            if left < _ITEM_OVERHEAD_TOKENS:
+                break
+        return out
+
     def clear(self) -> None:
-        self._store.clear()
+        with self._lock:
+            if self._queue is not None:
+                self._queue.clear()
+            self._store.clear()
+            self._index.clear()
+            if self._cold is not None:
+                self._cold.clear()
+            self._state = {}
+            self._epoch += 1
+            if self._ann is not None:
+                self._ann.clear()
+
+    def consolidate(self) -> dict[str, int]:
+        """Один проход консолидации памяти.
+
+        Новые записи (после сохранённой отметки `watermark`) сравниваются со
+        всеми живыми; почти-дубликаты одного `kind` сливаются в одну запись
+        (см. `merge_records`), исходные уходят в архив. Записи, чей
+        `(0.2 + 0.8 * importance) * decay` упал ниже `memory.evict_below`,
+        тоже архивируются. Когда удалённых строк набирается много, хранилище
+        и индексы перестраиваются без них. В конце прохода ярусы
+        перебалансируются (см. `_rebalance`); строки холодного яруса в
+        слиянии не участвуют.
+        """
+        with self._consolidate_lock:
+            with self._lock:
+                epoch = self._epoch
+                n = len(self._index)
+                watermark = min(int(self._state.get("watermark", 0)), n)
+                eligible = self._index.alive() & self._index.hot_mask() & self._index.vector_mask()
+                codes, names = self._index.kind_codes()
+                if self._cfg.consolidate_kinds:
+                    allowed = [c for c, k in enumerate(names) if k in self._cfg.consolidate_kinds]
+                    eligible &= np.isin(codes, allowed)
+            # самая дорогая часть — без блокировки, add() не ждёт
+            clusters = near_duplicate_clusters(
+                self._index.row_vectors, eligible, codes, np.arange(watermark, n), self._cfg.consolidate_threshold
+            )
+            with self._lock:
+                if epoch != self._epoch:
+                    return {"clusters": 0, "merged": 0, "evicted": 0, "compacted": 0}
+                merged = sum(self._merge(c) for c in clusters)
+                evicted = self._evict()
+                self._state["watermark"] = len(self._index)
+                compacted = self._maybe_compact()
+                self._rebalance()
+                self._store.write_state(self._state)
+        if merged or evicted:
+            logger.info("Memory consolidation: merged %d items, evicted %d", merged, evicted)
+        return {
+            "clusters": len(clusters),
+            "merged": merged,
+            "evicted": evicted,
+            "compacted": int(compacted),
+        }
 
     def search(
         self,
@@ -124,31 +507,262 @@ class MemoryComponent:
         *,
         top_k: int = 5,
         decay_half_life_days: float = 30.0,
-    ) -> list[tuple[MemoryItem, float]]:
-        """Поиск по косинусной близости с учётом затухания (importance * decay)."""
+        since: datetime | float | None = None,
+        until: datetime | float | None = None,
+        kinds: builtins.list[str] | None = None,
+        tags: builtins.list[str] | None = None,
+    ) -> builtins.list[tuple[MemoryItem, float]]:
+        """Гибридный поиск (косинус + BM25) с учётом затухания (importance * decay).
+
+        Вес BM25 — `memory.lexical_weight`; записи без эмбеддинга находятся по
+        словам. Запросы не длиннее `memory.lexical_only_max_terms` слов сначала
+        ищутся только по BM25 — если набралось `top_k` результатов, эмбеддинг
+        запроса не считается.
+
+        `since`/`until` (datetime или epoch, включительно) ограничивают окно
+        времени, `kinds` — типы записей (любой из), `tags` — ярлыки (все сразу).
+        Фильтры сужают набор кандидатов до вычисления близости.
+        Элементы, ещё ждущие эмбеддинга, оцениваются по доле совпавших слов запроса.
+        """
+        lo, hi = _as_epoch(since), _as_epoch(until)
+        pending = self._queue.pending() if self._queue is not None else []
+        pending = [
+            it for it in pending
+            if (lo is None or it.ts >= lo)  # type: ignore[operator]
+            and (hi is None or it.ts <= hi)  # type: ignore[operator]
+            and _matches(it, kinds, tags)
+        ]
+        params: dict[str, Any] = {
+            "top_k": top_k,
+            "decay_half_life_days": decay_half_life_days,
+            "since": lo,
+            "until": hi,
+            "kinds": kinds,
+            "tags": tags,
+            "query_text": query,
+        }
+        hits: list[tuple[int, float]] = []
+        # короткий запрос из ключевых слов: хватает BM25, эмбеддинг не считаем
+        n_terms = len(_tokenize(query))
+        if 0 < n_terms <= self._cfg.lexical_only_max_terms:
+            hits = self._index.search(None, **params)
+        if len(hits) < top_k:
+            hits = self._vector_search(query, params)
+        results = [(MemoryItem(**self._index.record(row)), score) for row, score in hits]
+        # снимок очереди взят до поиска: записанные за это время уже нашлись в индексе
+        pending = [it for it in pending if self._index.row_of(it.id) is None]
+        if pending:
+            results.extend(self._search_pending(query, pending, top_k, decay_half_life_days))
+            results.sort(key=lambda x: x[1], reverse=True)
+        return results[:top_k]
+
+    # ---------- internals ----------
+    def _consolidate_loop(self) -> None:
+        while not self._stop.wait(self._cfg.consolidate_interval_s):
+            try:
+                self.consolidate()
+            except Exception as e:  # noqa: BLE001
+                logger.error("Memory consolidation failed: %s", e)
+
+    def _tombstoned_rows(self) -> builtins.list[int]:
+        rows = (self._index.row_of(str(t.get("id"))) for t in self._store.tombstones.iter_all())
+        return [r for r in rows if r is not None]
+
+    def _merge(self, rows: builtins.list[int]) -> int:
+        """Слить строки кластера в новую запись; вернуть число слитых строк."""
+        alive = self._index.alive()
+        if any(r >= alive.shape[0] or not alive[r] for r in rows):
+            return 0
+        records = [self._index.meta(r) for r in rows]
+        merged, emb = merge_records(records, self._index.row_vectors(np.array(rows)))
+        item = MemoryItem(**merged)
+        self._commit([(item, emb.tolist())])
+        self._drop(rows, records, "merged", into=item.id)
+        return len(rows)
+
+    def _evict(self) -> int:
+        if self._cfg.evict_below <= 0.0:
+            return 0
+        score = self._index.decayed_weight(self._cfg.evict_half_life_days)
+        rows = np.flatnonzero(self._index.alive() & (score < self._cfg.evict_below)).tolist()
+        if rows:
+            self._drop(rows, [self._index.meta(r) for r in rows], "evicted")
+        return len(rows)
+
+    def _drop(
+        self,
+        rows: builtins.list[int],
+        records: builtins.list[dict[str, Any]],
+        reason: str,
+        into: str | None = None,
+    ) -> None:
+        """Архивировать записи, записать надгробия и убрать строки из поиска."""
+        now = datetime.now(timezone.utc).isoformat()
+        extra: dict[str, Any] = {"archived_reason": reason, "archived_at": now}
+        if into is not None:
+            extra["merged_into"] = into
+        self._store.archive.append_many(
+            {**{k: v for k, v in rec.items() if k != "emb_row"}, **extra} for rec in records
+        )
+        self._store.tombstones.append_many({"id": rec["id"], "reason": reason} for rec in records)
+        self._index.delete(rows)
+
+    def _maybe_compact(self) -> bool:
+        """Перезаписать хранилище без удалённых строк, если их накопилось много."""
+        dead = self._index.n_dead
+        if dead < _COMPACT_MIN_DEAD or dead < _COMPACT_DEAD_RATIO * len(self._index):
+            return False
+        alive = self._index.alive()
+        self._store.compact(np.flatnonzero(~alive).tolist())
+        self._state["watermark"] = int(alive[: self._state.get("watermark", 0)].sum())
+        if self._cold is not None:
+            self._cold.remap(np.where(alive, np.cumsum(alive) - 1, -1))
+        self._index.load(list(self._store.iter_all()), self._store.vectors.open())
+        if self._ann is not None:
+            self._ann.clear()
+            self._ann.sync(*self._index.vectors())
+        logger.info("Memory storage compacted: dropped %d rows", dead)
+        return True
+
+    def _rebalance(self) -> None:
+        """Перераспределить строки между горячим (RAM) и холодным ярусами.
+
+        Холодные строки, попавшие в выдачу `memory.tier_promote_hits` раз,
+        возвращаются в RAM с исходными float32-векторами из sidecar. Если в RAM
+        больше `memory.tier_hot_max_items` строк, туда опускаются строки с
+        наименьшим `weight * decay * (1 + log1p(hits))` (удалённые — первыми),
+        пока не останется 90% лимита.
+        """
+        if self._cold is None:
+            return
+        with self._lock:
+            rows, hits = self._index.cold_hits()
+            promote = rows[hits >= self._cfg.tier_promote_hits]
+            if promote.shape[0]:
+                vecs = self._exact_vectors(promote)
+                ok = np.linalg.norm(vecs, axis=1) > 0.0
+                self._index.promote(promote[ok], vecs[ok])
+            budget = self._cfg.tier_hot_max_items
+            if self._index.hot_count() <= budget:
+                return
+            if self._cfg.tier_codec == "pq" and self._cold.codec is None:
+                self._train_pq()
+            hot = np.flatnonzero(self._index.hot_mask())
+            prio = self._index.tier_priority(self._cfg.evict_half_life_days)[hot]
+            excess = hot.shape[0] - int(budget * _TIER_LOW_WATER)
+            demoted = self._index.demote(hot[np.argsort(prio, kind="stable")[:excess]])
+            self._cold.compact()
+            logger.info("Memory: moved %d rows to cold tier (%d cold)", demoted, len(self._cold))
+
+    def _train_pq(self) -> None:
+        """Обучить PQ-книгу холодного яруса по выборке живых векторов памяти."""
+        rows = np.flatnonzero(self._index.alive() & self._index.vector_mask())
+        if rows.shape[0] < _PQ_MIN_TRAIN:
+            return
+        if rows.shape[0] > _PQ_MAX_TRAIN:
+            rows = np.sort(np.random.default_rng(0).choice(rows, _PQ_MAX_TRAIN, replace=False))
+        self._cold.set_codec(  # type: ignore[union-attr]
+            ProductQuantizer.train(self._index.row_vectors(rows), self._cfg.pq_bytes)
+        )
+
+    def _exact_vectors(self, rows: np.ndarray) -> np.ndarray:
+        """Исходные float32-векторы строк из sidecar (для точного пересчёта скора)."""
+        src = self._store.vectors.open()
+        emb = np.array([self._index.meta(int(r)).get("emb_row", -1) for r in rows], dtype=np.int64)
+        out = np.zeros((rows.shape[0], src.shape[1] if src is not None else 0), dtype=np.float32)
+        if src is not None:
+            ok = (emb >= 0) & (emb < src.shape[0])
+            out[ok] = src[emb[ok]]
+        return out
+
+    def _vector_search(self, query: str, params: dict[str, Any]) -> builtins.list[tuple[int, float]]:
+        """Гибридный поиск: косинус + BM25; без эмбеддинга запроса — только BM25."""
         try:
-            q_emb = self._emb.get_text_embedding(query)  # type: ignore
+            q_emb = self._emb.get_query_embedding(query)  # type: ignore
         except Exception as e: # noqa: BLE001
-            logger.error("Query embedding failed: %s", e)
-            return []
+            logger.error("Query embedding failed, using lexical search: %s", e)
+            return self._index.search(None, **params)
 
-        now = datetime.now(timezone.utc)
-        results: list[tuple[MemoryItem, float]] = []
-        for rec in self._store.iter_all():
-            it = MemoryItem(**rec)
-            sim = cosine(q_emb, it.embedding) if it.embedding else 0.0
-            age_days = max(
-                0.0,
-                (now - datetime.fromisoformat(it.timestamp)).total_seconds() / 86400.0,
-            )
+        candidates = None
+        if self._ann is not None and self._ann.ready:
+            q = self._index.query_vector(q_emb)
+            if q is not None:
+                candidates = self._ann.candidates(q, self._cfg.ann_nprobe)
+
+        # score = relevance * (0.2 + 0.8 * importance) * decay — легкий вес важности
+        return self._index.search(
+            q_emb, candidates=candidates, lexical_weight=self._cfg.lexical_weight, **params
+        )
+
+    def _commit(self, batch: builtins.list[tuple[MemoryItem, builtins.list[float] | None]]) -> None:
+        rows: list[int] = []
+        with self._lock:
+            for it, emb in batch:
+                rec = self._store.append(it.model_dump(), emb)
+                rows.append(self._index.add(rec, emb))
+        if self._ann is not None:
+            for row in rows:
+                self._ann.add(row, *self._index.vectors())
+        if self._cold is not None and self._index.hot_count() > _TIER_HIGH_WATER * self._cfg.tier_hot_max_items:
+            self._rebalance()
+
+    def _commit_embedded(self, batch: builtins.list[tuple[MemoryItem, builtins.list[float] | None]]) -> None:
+        # элементы, сброшенные clear() во время эмбеддинга, не записываем
+        with self._lock:
+            assert self._queue is not None
+            batch = [(it, emb) for it, emb in batch if self._queue.is_pending(it.id)]
+            self._commit(batch)
+            # под той же блокировкой: list()/count() не видят элемент и в индексе, и в очереди
+            self._queue.done([it.id for it, _ in batch])
+
+    @staticmethod
+    def _search_pending(
+        query: str, pending: builtins.list[MemoryItem], top_k: int, decay_half_life_days: float
+    ) -> builtins.list[tuple[MemoryItem, float]]:
+        q_tokens = set(_tokenize(query))
+        if not q_tokens or not pending:
+            return []
+        now = time.time()
+        out: list[tuple[MemoryItem, float]] = []
+        for it in pending:
+            overlap = len(q_tokens & set(_tokenize(it.text))) / len(q_tokens)
+            if overlap <= 0.0:
+                continue
+            age_days = max(0.0, (now - it.ts) / 86400.0)  # type: ignore[operator]
             decay = 0.5 ** (age_days / max(decay_half_life_days, 0.1))
-            score = sim * (0.2 + 0.8 * it.importance) * decay  # легкий вес важности
-            results.append((it, score))
-        results.sort(key=lambda x: x[1], reverse=True)
-        return results[:top_k]
+            out.append((it, overlap * (0.2 + 0.8 * it.importance) * decay))
+        out.sort(key=lambda x: x[1], reverse=True)
+        return out[:top_k]
 
 
 # ---------- helpers ----------
+def _matches(item: MemoryItem, kinds: list[str] | None, tags: list[str] | None) -> bool:
+    if kinds and item.kind not in kinds:
+        return False
+    return not tags or set(tags) <= set(item.tags)
+
+
+def _fsync(path: Path) -> None:
+    """Сбросить файл или каталог на диск (переименование должно пережить сбой)."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        # Windows не открывает каталоги — там os.replace и так пишется в журнал ФС
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _as_epoch(value: datetime | float | None) -> float | None:
+    if value is None or isinstance(value, (int, float)):
+        return value
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
 def cosine(a: list[float] | None, b: list[float] | None) -> float:
     if not a or not b:
         return 0.0
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+from typing import Any, Callable
+
+import numpy as np
+
+# строк новой порции на одно умножение: (block x живые строки) float32 в RAM
+_BLOCK = 32
+
+
+def near_duplicate_clusters(
+    vectors: np.ndarray | Callable[[np.ndarray], np.ndarray],
+    eligible: np.ndarray,
+    kind_codes: np.ndarray,
+    new_rows: np.ndarray,
+    threshold: float,
+) -> list[list[int]]:
+    """Кластеры почти-дубликатов среди живых строк, затрагивающие новые строки.
+
+    `vectors` — нормированные строки (матрица по номерам строк или функция
+    `rows -> векторы`, чтобы не собирать всю матрицу), `eligible` — маска строк, которые можно
+    сливать (живые, с вектором, подходящего типа). Для каждой новой строки
+    (по порядку) берутся все ещё не занятые строки того же `kind` с
+    косинусом >= `threshold`; кластер — новая строка и её соседи. Старые строки
+    сравниваются только с новыми, поэтому проход инкрементальный:
+    O(новые * все), а не O(все^2).
+    """
+    pool = np.flatnonzero(eligible)
+    new_rows = new_rows[eligible[new_rows]]
+    if pool.shape[0] < 2 or new_rows.shape[0] == 0:
+        return []
+    vectors_of = vectors if callable(vectors) else vectors.__getitem__
+    used = np.zeros(eligible.shape[0], dtype=bool)
+    pool_vecs = vectors_of(pool)
+    pool_kinds = kind_codes[pool]
+    clusters: list[list[int]] = []
+    for start in range(0, new_rows.shape[0], _BLOCK):
+        block = new_rows[start : start + _BLOCK]
+        sims = vectors_of(block) @ pool_vecs.T
+        for i, row in enumerate(block.tolist()):
+            if used[row]:
+                continue
+            hit = (sims[i] >= threshold) & (pool_kinds == kind_codes[row]) & ~used[pool]
+            members = pool[hit]
+            members = members[members != row]
+            if members.shape[0] == 0:
+                continue
+            cluster = sorted([row, *members.tolist()])
+            used[cluster] = True
+            clusters.append(cluster)
+    return clusters
+
+
+def merge_records(
+    records: list[dict[str, Any]], vectors: np.ndarray
+) -> tuple[dict[str, Any], np.ndarray]:
+    """Слить кластер в одну запись и её эмбеддинг.
+
+    Текст — от медоида (строки, ближе всех к остальным), важность —
+    `1 - prod(1 - importance)`, время — самое позднее, ярлыки — объединение.
+    Эмбеддинг — нормированное среднее векторов кластера.
+    """
+    sims = vectors @ vectors.T
+    medoid = records[int(np.argmax(sims.sum(axis=1)))]
+    importance = [min(max(float(r.get("importance", 0.5)), 0.0), 1.0) for r in records]
+    latest = max(records, key=lambda r: float(r.get("ts") or 0.0))
+    tags = sorted({t for r in records for t in r.get("tags") or ()})
+    merged = {
+        "timestamp": latest.get("timestamp"),
+        "ts": latest.get("ts"),
+        "kind": medoid.get("kind", "observation"),
+        "text": medoid.get("text", ""),
+        "importance": round(1.0 - float(np.prod([1.0 - i for i in importance])), 6),
+        "tags": tags,
+        "merged_from": [r["id"] for r in records],
+    }
+    mean = vectors.mean(axis=0)
+    norm = float(np.linalg.norm(mean))
+    return merged, (mean / norm if norm > 0.0 else mean)
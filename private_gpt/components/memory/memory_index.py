@@ -0,0 +1,662 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Callable, Iterable
+
+import numpy as np
+
+from private_gpt.components.memory.memory_bm25 import BM25Index, tokenize
+
+if TYPE_CHECKING:
+    from private_gpt.components.memory.memory_tiers import ColdStore
+
+logger = logging.getLogger(__name__)
+
+_SECONDS_PER_DAY = 86400.0
+# decay пересчитывается не чаще раза в минуту на каждый half-life
+_DECAY_BUCKET_SECONDS = 60.0
+_DECAY_CACHE_SIZE = 8
+
+
+def _to_epoch(timestamp: str) -> float:
+    try:
+        return datetime.fromisoformat(timestamp).timestamp()
+    except (TypeError, ValueError):
+        return time.time()
+
+
+def record_epoch(record: dict[str, Any]) -> float:
+    """Epoch записи: колонка `ts`, для старых записей — разбор `timestamp`."""
+    ts = record.get("ts")
+    if isinstance(ts, (int, float)):
+        return float(ts)
+    return _to_epoch(record.get("timestamp", ""))
+
+
+class MemoryIndex:
+    """Векторный индекс памяти в RAM.
+
+    Все эмбеддинги лежат в одной непрерывной float32-матрице с заранее
+    нормированными строками; рядом — колонки времени (epoch) и веса важности.
+    Поиск — одно умножение матрицы на вектор и `argpartition` для top-k.
+
+    Строка = порядковый номер записи в `memory.jsonl`.
+
+    Параллельно ведётся BM25 по тексту записей (см. `BM25Index`) — для
+    гибридного и чисто лексического поиска.
+
+    Для фильтров — инвертированные списки `kind` → строки и `tag` → строки
+    (строки в них идут по возрастанию, т.к. только дописываются).
+
+    Удалённые (слитые при консолидации, вытесненные) строки помечаются в маске
+    `alive` и больше не участвуют в поиске; физически они исчезают только при
+    перезаписи хранилища.
+
+    Ярусы (опционально, см. `attach_cold`): матрица в RAM — горячий ярус,
+    строка матрицы (слот) связана с номером записи через `_slot`/`_hrow`.
+    Пока ничего не понижено, слот = номер записи. Пониженные строки живут в
+    `ColdStore` (int8- или PQ-коды, memmap) и сканируются, только если горячие строки не
+    набрали top-k выше порога и холодная строка в принципе может пройти
+    (её скор не больше `(0.2 + 0.8 * importance) * decay`).
+
+    Множитель затухания для всех строк кэшируется на ключ
+    (half-life, минутный бакет): в пределах минуты запросы его не пересчитывают,
+    новые строки дописываются в кэш по мере добавления.
+    """
+
+    def __init__(self, capacity: int = 1024) -> None:
+        self._lock = threading.RLock()
+        self._cold: ColdStore | None = None
+        self._cold_floor = 0.0
+        self._exact: Callable[[np.ndarray], np.ndarray] | None = None
+        self._rerank = 0
+        self._reset(capacity)
+
+    def _reset(self, capacity: int) -> None:
+        self._dim: int | None = None
+        self._n = 0
+        self._cap = max(16, capacity)
+        # горячий ярус: строки матрицы — слоты
+        self._hcap = self._cap
+        self._nh = 0
+        self._vecs = np.zeros((self._hcap, 0), dtype=np.float32)
+        self._hrow = np.zeros(self._hcap, dtype=np.int64)
+        self._slot = np.full(self._cap, -1, dtype=np.int64)
+        # слот = номер строки, пока ничего не понижалось
+        self._identity = True
+        self._hits = np.zeros(self._cap, dtype=np.float32)
+        self._norms = np.zeros(self._cap, dtype=np.float32)
+        self._has_vec = np.zeros(self._cap, dtype=bool)
+        self._ts = np.zeros(self._cap, dtype=np.float64)
+        self._weight = np.zeros(self._cap, dtype=np.float64)
+        self._alive = np.zeros(self._cap, dtype=bool)
+        self._n_dead = 0
+        self._records: list[dict[str, Any]] = []
+        self._row_of: dict[str, int] = {}
+        self._by_kind: dict[str, array[int]] = {}
+        self._by_tag: dict[str, array[int]] = {}
+        self._bm25 = BM25Index()
+        # пока ts не убывают, окно since/until — это срез через searchsorted
+        self._ts_sorted = True
+        self._decay_cache: OrderedDict[tuple[float, int], np.ndarray] = OrderedDict()
+
+    def __len__(self) -> int:
+        return self._n
+
+    @property
+    def dim(self) -> int | None:
+        return self._dim
+
+    def attach_cold(
+        self,
+        cold: ColdStore,
+        *,
+        score_floor: float,
+        exact: Callable[[np.ndarray], np.ndarray] | None = None,
+        rerank: int = 0,
+    ) -> None:
+        """Подключить холодный ярус; `score_floor` — см. `search`.
+
+        `exact(rows)` возвращает точные (float32, с диска) векторы строк: им
+        пересчитываются лучшие `max(top_k, rerank)` строк, чья близость была
+        оценена по квантованным кодам. `rerank=0` — без пересчёта.
+        """
+        with self._lock:
+            self._cold = cold
+            self._cold_floor = score_floor
+            self._exact = exact
+            self._rerank = rerank
+
+    # ---------- mutation ----------
+    def add(self, record: dict[str, Any], embedding: list[float] | np.ndarray | None) -> int:
+        """Добавить запись (без поля `embedding`) и её вектор; вернуть номер строки."""
+        with self._lock:
+            vec = self._prepare(embedding)
+            if self._n == self._cap:
+                self._grow(self._cap * 2)
+            row = self._n
+            slot = self._take_slot(row)
+            if vec is not None:
+                norm = float(np.linalg.norm(vec))
+                if norm > 0.0:
+                    self._vecs[slot] = vec / norm
+                    self._norms[row] = norm
+                    self._has_vec[row] = True
+            self._ts[row] = record_epoch(record)
+            if row and self._ts[row] < self._ts[row - 1]:
+                self._ts_sorted = False
+            self._weight[row] = 0.2 + 0.8 * float(record.get("importance", 0.5))
+            self._alive[row] = True
+            self._records.append(record)
+            self._post(row, record)
+            self._n += 1
+            return row
+
+    def load(self, records: list[dict[str, Any]], vectors: np.ndarray | None) -> None:
+        """Массовая загрузка: записи ссылаются на строки `vectors` через `emb_row`.
+
+        Строки, лежащие в подключённом холодном ярусе, в RAM не читаются.
+        """
+        with self._lock:
+            self._reset(max(1024, len(records)))
+            n = len(records)
+            if n == 0:
+                return
+            cold = self._cold.mask(n) if self._cold is not None else np.zeros(n, dtype=bool)
+            hot_rows = np.flatnonzero(~cold)
+            self._hcap = max(1024, hot_rows.shape[0])
+            self._hrow = np.zeros(self._hcap, dtype=np.int64)
+            self._hrow[: hot_rows.shape[0]] = hot_rows
+            self._slot[hot_rows] = np.arange(hot_rows.shape[0])
+            self._nh = int(hot_rows.shape[0])
+            self._identity = self._nh == n
+            src = np.full(n, -1, dtype=np.int64)
+            if vectors is not None:
+                for i, rec in enumerate(records):
+                    row = rec.get("emb_row")
+                    if row is not None and 0 <= row < vectors.shape[0]:
+                        src[i] = row
+            has = src >= 0
+            if has.any():
+                self._dim = int(vectors.shape[1])  # type: ignore[union-attr]
+                self._vecs = np.zeros((self._hcap, self._dim), dtype=np.float32)
+                load_rows = np.flatnonzero(has & ~cold)
+                mat = np.asarray(vectors[src[load_rows]], dtype=np.float32)  # type: ignore[index]
+                norms = np.linalg.norm(mat, axis=1)
+                ok = norms > 0.0
+                rows = load_rows[ok]
+                self._vecs[self._slot[rows]] = mat[ok] / norms[ok, None]
+                self._norms[rows] = norms[ok]
+                self._has_vec[rows] = True
+            if cold.any():
+                cold_rows = np.flatnonzero(cold)
+                self._norms[cold_rows] = self._cold.norms(cold_rows)  # type: ignore[union-attr]
+                self._has_vec[cold_rows] = True
+            self._ts[:n] = [record_epoch(r) for r in records]
+            self._ts_sorted = bool(np.all(np.diff(self._ts[:n]) >= 0.0))
+            self._weight[:n] = [0.2 + 0.8 * float(r.get("importance", 0.5)) for r in records]
+            self._alive[:n] = True
+            self._records = records
+            for row, rec in enumerate(records):
+                self._post(row, rec)
+            self._n = n
+
+    def clear(self) -> None:
+        with self._lock:
+            self._reset(1024)
+
+    def delete(self, rows: Iterable[int]) -> int:
+        """Пометить строки удалёнными; вернуть, сколько было живых."""
+        with self._lock:
+            idx = np.fromiter(rows, dtype=np.int64)
+            idx = idx[(idx >= 0) & (idx < self._n)]
+            idx = np.unique(idx[self._alive[idx]])
+            self._alive[idx] = False
+            self._n_dead += idx.shape[0]
+            return int(idx.shape[0])
+
+    # ---------- read ----------
+    @property
+    def n_dead(self) -> int:
+        return self._n_dead
+
+    def alive(self) -> np.ndarray:
+        """Маска живых строк (копия)."""
+        with self._lock:
+            return self._alive[: self._n].copy()
+
+    def row_of(self, item_id: str) -> int | None:
+        return self._row_of.get(item_id)
+
+    def kind_codes(self) -> tuple[np.ndarray, list[str]]:
+        """Код типа (`kind`) каждой строки и список типов по кодам."""
+        with self._lock:
+            codes = np.zeros(self._n, dtype=np.int32)
+            names = list(self._by_kind)
+            for code, name in enumerate(names):
+                codes[self._postings(self._by_kind, name)] = code
+            return codes, names
+
+    def decayed_weight(self, half_life_days: float, now: float | None = None) -> np.ndarray:
+        """`(0.2 + 0.8 * importance) * decay` для всех строк — скор без учёта близости."""
+        with self._lock:
+            now = time.time() if now is None else now
+            return self._weight[: self._n] * self._decay(half_life_days, now)[: self._n]
+
+    def vectors(self) -> tuple[np.ndarray, np.ndarray]:
+        """Нормированная матрица по номерам строк и маска наличия вектора.
+
+        Без понижений — представления без копии; при ярусах матрица
+        собирается заново (с деквантованными холодными строками).
+        """
+        with self._lock:
+            if self._identity:
+                return self._vecs[: self._n], self._has_vec[: self._n]
+            return self.row_vectors(np.arange(self._n)), self._has_vec[: self._n].copy()
+
+    def row_vectors(self, rows: np.ndarray) -> np.ndarray:
+        """Нормированные векторы строк `rows` из любого яруса (нет вектора — нули)."""
+        with self._lock:
+            rows = np.asarray(rows, dtype=np.int64)
+            out = np.zeros((rows.shape[0], self._vecs.shape[1]), dtype=np.float32)
+            slots = self._slot[rows]
+            hot = slots >= 0
+            out[hot] = self._vecs[slots[hot]]
+            cold = ~hot & self._has_vec[rows]
+            if cold.any() and self._cold is not None:
+                out[cold] = self._cold.vectors(rows[cold])
+            return out
+
+    def vector_mask(self) -> np.ndarray:
+        """Маска строк с эмбеддингом (копия)."""
+        with self._lock:
+            return self._has_vec[: self._n].copy()
+
+    def hot_mask(self) -> np.ndarray:
+        """Маска строк, чьи векторы лежат в RAM."""
+        with self._lock:
+            return self._slot[: self._n] >= 0
+
+    def hot_count(self) -> int:
+        return self._nh
+
+    def tier_priority(self, half_life_days: float, now: float | None = None) -> np.ndarray:
+        """Приоритет строки для горячего яруса: `weight * decay * (1 + log1p(hits))`."""
+        with self._lock:
+            hits = np.log1p(self._hits[: self._n].astype(np.float64))
+            prio = self.decayed_weight(half_life_days, now) * (1.0 + hits)
+            prio[~self._alive[: self._n]] = -1.0
+            return prio
+
+    def cold_hits(self) -> tuple[np.ndarray, np.ndarray]:
+        """Холодные строки и число их попаданий в выдачу с момента понижения."""
+        with self._lock:
+            rows = np.flatnonzero((self._slot[: self._n] < 0) & self._has_vec[: self._n])
+            return rows, self._hits[rows].copy()
+
+    def demote(self, rows: np.ndarray) -> int:
+        """Перенести строки из RAM в холодный ярус; удалённые строки просто выбросить."""
+        with self._lock:
+            assert self._cold is not None
+            rows = np.unique(np.asarray(rows, dtype=np.int64))
+            rows = rows[self._slot[rows] >= 0]
+            if rows.shape[0] == 0:
+                return 0
+            keep = rows[self._has_vec[rows] & self._alive[rows]]
+            if keep.shape[0]:
+                self._cold.add(keep, self._vecs[self._slot[keep]], self._norms[keep])
+            dropped = rows[~(self._has_vec[rows] & self._alive[rows])]
+            self._has_vec[dropped] = False
+            self._slot[rows] = -1
+            self._hits[rows] = 0.0
+            self._rebuild_hot()
+            return int(rows.shape[0])
+
+    def promote(self, rows: np.ndarray, vectors: np.ndarray) -> None:
+        """Вернуть строки в RAM с полными (не квантованными) `vectors`."""
+        with self._lock:
+            rows = np.asarray(rows, dtype=np.int64)
+            for row, vec in zip(rows.tolist(), vectors, strict=True):
+                if self._slot[row] >= 0:
+                    continue
+                slot = self._take_slot(row)
+                norm = float(np.linalg.norm(vec))
+                if norm > 0.0:
+                    self._vecs[slot] = np.asarray(vec, dtype=np.float32)[: self._vecs.shape[1]] / norm
+            self._hits[rows] = 0.0
+            if self._cold is not None:
+                self._cold.discard(rows)
+
+    def query_vector(self, embedding: list[float]) -> np.ndarray | None:
+        """Нормированный вектор запроса в размерности индекса."""
+        with self._lock:
+            q = self._prepare(embedding)
+        if q is None:
+            return None
+        q_norm = float(np.linalg.norm(q))
+        return q / q_norm if q_norm > 0.0 else None
+
+    def meta(self, row: int) -> dict[str, Any]:
+        """Запись строки без эмбеддинга."""
+        with self._lock:
+            return dict(self._records[row])
+
+    def record(self, row: int) -> dict[str, Any]:
+        """Запись строки с восстановленным (ненормированным) эмбеддингом."""
+        with self._lock:
+            rec = dict(self._records[row])
+            if self._has_vec[row]:
+                vec = self.row_vectors(np.array([row]))[0]
+                rec["embedding"] = (vec * self._norms[row]).tolist()
+            else:
+                rec["embedding"] = None
+            return rec
+
+    def rows(
+        self,
+        *,
+        kinds: list[str] | None = None,
+        tags: list[str] | None = None,
+        since: float | None = None,
+        until: float | None = None,
+    ) -> np.ndarray:
+        """Номера строк (по возрастанию), прошедших фильтры.
+
+        `kinds` — любой из перечисленных типов; `tags` — все перечисленные ярлыки;
+        `since`/`until` — epoch, включительно.
+        """
+        with self._lock:
+            rows = self._restrict(None, kinds, tags, since, until)
+            return np.arange(self._n) if rows is None else rows
+
+    def search(
+        self,
+        query_embedding: list[float] | None,
+        *,
+        top_k: int,
+        decay_half_life_days: float,
+        now: float | None = None,
+        candidates: np.ndarray | None = None,
+        since: float | None = None,
+        until: float | None = None,
+        kinds: list[str] | None = None,
+        tags: list[str] | None = None,
+        query_text: str | None = None,
+        lexical_weight: float = 0.0,
+    ) -> list[tuple[int, float]]:
+        """Top-k строк по `relevance * (0.2 + 0.8 * importance) * decay`.
+
+        relevance = `(1 - lexical_weight) * cos + lexical_weight * bm25`, где
+        BM25 по `query_text` нормирован на лучший результат запроса (0..1).
+        Без `query_embedding` поиск чисто лексический (relevance = bm25) и
+        смотрит только строки, где встретились слова запроса.
+
+        `candidates` — отсортированные номера строк, которыми ограничен поиск
+        (например, от IVF-индекса); None — все строки. Лексические совпадения
+        добавляются к кандидатам, так что записи без эмбеддинга не теряются.
+        Фильтры (`kinds`, `tags`, `since`/`until`, см. `rows()`) сужают набор
+        строк до вычисления близости; если фильтр сам отобрал не больше строк,
+        чем дали кандидаты, поиск по нему идёт точно, без кандидатов.
+        Порядок при равных скорах — по возрастанию номера строки,
+        как у прежнего линейного прохода со стабильной сортировкой.
+        """
+        with self._lock:
+            n = self._n
+            if n == 0 or top_k <= 0:
+                return []
+            now = time.time() if now is None else now
+            lexical_only = query_embedding is None
+            lex_rows = lex = None
+            if query_text and (lexical_only or lexical_weight > 0.0):
+                lex_rows, lex = self._bm25.scores(tokenize(query_text))
+                if lex.shape[0]:
+                    lex = lex / lex.max()
+
+            if lexical_only:
+                if lex_rows is None or lex_rows.shape[0] == 0:
+                    return []
+                allowed = self._restrict(None, kinds, tags, since, until)
+                keep = np.ones(lex_rows.shape[0], dtype=bool)
+                if allowed is not None:
+                    keep = np.isin(lex_rows, allowed, assume_unique=True)
+                keep &= self._alive[lex_rows]
+                rows, rel = lex_rows[keep], lex[keep]  # type: ignore[index]
+                if rows.shape[0] == 0:
+                    return []
+                sel: slice | np.ndarray = rows
+            else:
+                if candidates is not None and lex_rows is not None:
+                    candidates = np.union1d(candidates, lex_rows)
+                rows = self._restrict(candidates, kinds, tags, since, until)
+                if rows is None:
+                    rows = np.arange(n)
+                if rows.shape[0] == 0:
+                    return []
+                # сплошной диапазон строк — срез без копирования матрицы
+                contiguous = int(rows[-1]) - int(rows[0]) + 1 == rows.shape[0]
+                sel = slice(int(rows[0]), int(rows[-1]) + 1) if contiguous else rows
+
+                rel = np.zeros(rows.shape[0], dtype=np.float64)
+                cold_pos = np.zeros(0, dtype=np.int64)
+                # доля близости в оценке; холодные строки считаются с той же долей
+                vector_weight = 1.0
+                q = self.query_vector(query_embedding)  # type: ignore[arg-type]
+                if q is not None and self._identity:
+                    rel = (self._vecs[sel] @ q).astype(np.float64)
+                elif q is not None:
+                    slots = self._slot[rows]
+                    hot = slots >= 0
+                    rel[hot] = self._vecs[slots[hot]] @ q
+                    cold_pos = np.flatnonzero(~hot & self._has_vec[rows])
+                if lex_rows is not None and lex_rows.shape[0]:
+                    vector_weight = 1.0 - lexical_weight
+                    rel *= vector_weight
+                    pos = np.minimum(np.searchsorted(rows, lex_rows), rows.shape[0] - 1)
+                    hit = rows[pos] == lex_rows
+                    rel[pos[hit]] += lexical_weight * lex[hit]  # type: ignore[index]
+
+            decay = self._decay(decay_half_life_days, now)[sel]
+            weight = self._weight[sel] * decay
+            scores = rel * weight
+            if not lexical_only and cold_pos.shape[0] and self._cold is not None:
+                self._scan_cold(rows, cold_pos, scores, weight, q, top_k, vector_weight)
+
+            top = _top_k_stable(scores, top_k)
+            self._hits[rows[top]] += 1.0
+            return [(int(rows[i]), float(scores[i])) for i in top]
+
+    # ---------- internals ----------
+    def _scan_cold(
+        self,
+        rows: np.ndarray,
+        cold_pos: np.ndarray,
+        scores: np.ndarray,
+        weight: np.ndarray,
+        q: np.ndarray,
+        top_k: int,
+        vector_weight: float,
+    ) -> None:
+        """Досчитать близость холодных строк, которые могут попасть в top-k."""
+        k = min(top_k, scores.shape[0])
+        kth = float(np.partition(scores, scores.shape[0] - k)[scores.shape[0] - k])
+        if kth >= self._cold_floor:
+            return
+        # косинус не больше 1: строки с верхней оценкой ниже k-го скора не пройдут
+        bound = scores[cold_pos] + vector_weight * weight[cold_pos]
+        need = cold_pos[bound > kth]
+        if need.shape[0] == 0:
+            return
+        sims = self._cold.similarities(rows[need], q)  # type: ignore[union-attr]
+        scores[need] += vector_weight * sims * weight[need]
+        if self._exact is None or self._rerank <= 0:
+            return
+        # точный пересчёт лучших кандидатов, оценённых по кодам
+        top = _top_k_stable(scores, max(top_k, self._rerank))
+        pos = np.flatnonzero(np.isin(need, top))
+        if pos.shape[0]:
+            vecs = np.asarray(self._exact(rows[need[pos]]), dtype=np.float32)
+            norms = np.linalg.norm(vecs, axis=1)
+            exact = (vecs @ q) / np.where(norms > 0.0, norms, 1.0)
+            scores[need[pos]] += vector_weight * (exact - sims[pos]) * weight[need[pos]]
+
+    def _take_slot(self, row: int) -> int:
+        if self._nh == self._hcap:
+            self._hcap *= 2
+            vecs = np.zeros((self._hcap, self._vecs.shape[1]), dtype=np.float32)
+            vecs[: self._nh] = self._vecs[: self._nh]
+            self._vecs = vecs
+            hrow = np.zeros(self._hcap, dtype=np.int64)
+            hrow[: self._nh] = self._hrow[: self._nh]
+            self._hrow = hrow
+        slot = self._nh
+        self._nh += 1
+        self._hrow[slot] = row
+        self._slot[row] = slot
+        if slot != row:
+            self._identity = False
+        return slot
+
+    def _rebuild_hot(self) -> None:
+        """Уплотнить матрицу горячего яруса после понижения строк."""
+        rows = np.flatnonzero(self._slot[: self._n] >= 0)
+        slots = self._slot[rows]
+        self._nh = int(rows.shape[0])
+        self._hcap = max(1024, self._nh)
+        vecs = np.zeros((self._hcap, self._vecs.shape[1]), dtype=np.float32)
+        vecs[: self._nh] = self._vecs[slots]
+        self._vecs = vecs
+        self._hrow = np.zeros(self._hcap, dtype=np.int64)
+        self._hrow[: self._nh] = rows
+        self._slot[rows] = np.arange(self._nh)
+        self._identity = False
+
+    def _post(self, row: int, record: dict[str, Any]) -> None:
+        """Занести строку в инвертированные списки kind/tag и BM25."""
+        if "id" in record:
+            self._row_of[str(record["id"])] = row
+        self._bm25.add(row, str(record.get("text", "")))
+        self._by_kind.setdefault(str(record.get("kind", "")), array("q")).append(row)
+        for tag in set(record.get("tags") or ()):
+            self._by_tag.setdefault(str(tag), array("q")).append(row)
+
+    def _postings(self, index: dict[str, array[int]], key: str) -> np.ndarray:
+        post = index.get(key)
+        if not post:
+            return np.zeros(0, dtype=np.int64)
+        # копия: живой view на буфер не дал бы array дальше расти
+        return np.frombuffer(post, dtype=np.int64).copy()
+
+    def _restrict(
+        self,
+        candidates: np.ndarray | None,
+        kinds: list[str] | None,
+        tags: list[str] | None,
+        since: float | None,
+        until: float | None,
+    ) -> np.ndarray | None:
+        """Пересечение кандидатов и фильтров; None — ограничений нет."""
+        n = self._n
+        rows: np.ndarray | None = None
+        if kinds:
+            parts = [self._postings(self._by_kind, k) for k in set(kinds)]
+            rows = parts[0] if len(parts) == 1 else np.unique(np.concatenate(parts))
+        for tag in sorted(set(tags or ()), key=lambda t: len(self._by_tag.get(t, ()))):
+            post = self._postings(self._by_tag, tag)
+            rows = post if rows is None else np.intersect1d(rows, post, assume_unique=True)
+        if since is not None or until is not None:
+            window = self._window(since, until)
+            rows = window if rows is None else np.intersect1d(rows, window, assume_unique=True)
+        if candidates is not None:
+            cands = candidates[candidates < n]
+            if rows is None or cands.shape[0] < rows.shape[0]:
+                rows = cands if rows is None else np.intersect1d(rows, cands, assume_unique=True)
+        if self._n_dead:
+            rows = np.flatnonzero(self._alive[:n]) if rows is None else rows[self._alive[rows]]
+        return rows
+
+    def _window(self, since: float | None, until: float | None) -> np.ndarray:
+        """Номера строк с `since <= ts <= until` (по возрастанию)."""
+        n = self._n
+        if since is None and until is None:
+            return np.arange(n)
+        ts = self._ts[:n]
+        lo_ts = -np.inf if since is None else since
+        hi_ts = np.inf if until is None else until
+        if self._ts_sorted:
+            lo = int(np.searchsorted(ts, lo_ts, side="left"))
+            hi = int(np.searchsorted(ts, hi_ts, side="right"))
+            return np.arange(lo, max(lo, hi))
+        return np.flatnonzero((ts >= lo_ts) & (ts <= hi_ts))
+
+    def _decay(self, half_life_days: float, now: float) -> np.ndarray:
+        """Множитель затухания для строк `[0, n)` на начало минутного бакета `now`."""
+        half_life = max(half_life_days, 0.1)
+        bucket = int(now // _DECAY_BUCKET_SECONDS)
+        key = (half_life, bucket)
+        n = self._n
+        cached = self._decay_cache.get(key)
+        if cached is not None and cached.shape[0] >= n:
+            self._decay_cache.move_to_end(key)
+            return cached
+        start = 0 if cached is None else cached.shape[0]
+        ref = bucket * _DECAY_BUCKET_SECONDS
+        age_days = np.maximum(0.0, (ref - self._ts[start:n]) / _SECONDS_PER_DAY)
+        tail = 0.5 ** (age_days / half_life)
+        decay = tail if cached is None else np.concatenate([cached, tail])
+        self._decay_cache[key] = decay
+        self._decay_cache.move_to_end(key)
+        while len(self._decay_cache) > _DECAY_CACHE_SIZE:
+            self._decay_cache.popitem(last=False)
+        return decay
+
+    def _prepare(self, embedding: list[float] | np.ndarray | None) -> np.ndarray | None:
+        """Привести вектор к размерности индекса (обрезка/дополнение нулями)."""
+        if embedding is None or len(embedding) == 0:
+            return None
+        vec = np.asarray(embedding, dtype=np.float32)
+        if self._dim is None:
+            self._dim = int(vec.shape[0])
+            self._vecs = np.zeros((self._hcap, self._dim), dtype=np.float32)
+        if vec.shape[0] == self._dim:
+            return vec
+        logger.warning(
+            "Embedding dim %s differs from memory index dim %s", vec.shape[0], self._dim
+        )
+        out = np.zeros(self._dim, dtype=np.float32)
+        n = min(self._dim, vec.shape[0])
+        out[:n] = vec[:n]
+        return out
+
+    def _grow(self, cap: int) -> None:
+        def grow(a: np.ndarray) -> np.ndarray:
+            out = np.zeros((cap, *a.shape[1:]), dtype=a.dtype)
+            out[: self._n] = a[: self._n]
+            return out
+
+        self._norms = grow(self._norms)
+        self._has_vec = grow(self._has_vec)
+        self._ts = grow(self._ts)
+        self._weight = grow(self._weight)
+        self._alive = grow(self._alive)
+        self._hits = grow(self._hits)
+        slot = np.full(cap, -1, dtype=np.int64)
+        slot[: self._n] = self._slot[: self._n]
+        self._slot = slot
+        self._cap = cap
+
+
+def _top_k_stable(scores: np.ndarray, k: int) -> np.ndarray:
+    """Индексы top-k по убыванию скора; при равенстве — меньший индекс раньше."""
+    n = scores.shape[0]
+    if k >= n:
+        return np.lexsort((np.arange(n), -scores))
+    kth = scores[np.argpartition(scores, n - k)[n - k :]].min()
+    above = np.flatnonzero(scores > kth)
+    ties = np.flatnonzero(scores == kth)[: k - above.shape[0]]
+    rows = np.concatenate([above, ties])
+    return rows[np.lexsort((rows, -scores[rows]))]
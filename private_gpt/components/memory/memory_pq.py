@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import logging
+import os
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# центроидов на подпространство: код подвектора — один байт
+_KSUB = 256
+# обучающая выборка: не больше стольких векторов на центроид
+_TRAIN_PER_CENTROID = 64
+# строк на одно умножение при кодировании: (block x 256) float32 в RAM
+_ENCODE_BLOCK = 8192
+
+
+class ProductQuantizer:
+    """Product quantization для нормированных эмбеддингов памяти.
+
+    Вектор режется на `m` подвекторов, каждый заменяется номером ближайшего
+    из 256 центроидов своего подпространства — `m` байт на запись вместо
+    `4 * dim`. Размерность, не кратная `m`, дополняется нулями.
+
+    Близость к запросу считается асимметрично (ADC): запрос не квантуется,
+    для него строится таблица `(m, 256)` скалярных произведений подвекторов
+    с центроидами, и скор записи — сумма `m` значений из таблицы по её кодам.
+    """
+
+    def __init__(self, codebooks: np.ndarray, dim: int) -> None:
+        self.codebooks = codebooks.astype(np.float32)  # (m, ksub, dsub)
+        self.dim = dim
+
+    @property
+    def m(self) -> int:
+        return int(self.codebooks.shape[0])
+
+    @property
+    def dsub(self) -> int:
+        return int(self.codebooks.shape[2])
+
+    @classmethod
+    def train(cls, vectors: np.ndarray, m: int, *, iters: int = 15, seed: int = 0) -> ProductQuantizer:
+        """Обучить кодовые книги k-means'ом в каждом подпространстве."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        n, dim = vectors.shape
+        if n == 0:
+            raise ValueError("Cannot train product quantizer on an empty set")
+        rng = np.random.default_rng(seed)
+        ksub = min(_KSUB, n)
+        if n > _TRAIN_PER_CENTROID * ksub:
+            vectors = vectors[rng.choice(n, _TRAIN_PER_CENTROID * ksub, replace=False)]
+        sub = _split(vectors, m)
+        books = np.zeros((m, _KSUB, sub.shape[2]), dtype=np.float32)
+        for j in range(m):
+            data = sub[:, j]
+            cent = data[rng.choice(data.shape[0], ksub, replace=False)].copy()
+            for _ in range(iters):
+                labels = _nearest(data, cent)
+                sums = np.zeros_like(cent)
+                np.add.at(sums, labels, data)
+                counts = np.bincount(labels, minlength=ksub)
+                used = counts > 0
+                cent[used] = sums[used] / counts[used, None]
+            books[j, :ksub] = cent
+            # при малой выборке лишние центроиды повторяют первый и не выбираются
+            books[j, ksub:] = cent[0]
+        logger.info("Memory PQ trained: %d vectors, %d x %d centroids", vectors.shape[0], m, ksub)
+        return cls(books, dim)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        """Коды `(n, m)` uint8."""
+        sub = _split(np.asarray(vectors, dtype=np.float32), self.m)
+        codes = np.empty((sub.shape[0], self.m), dtype=np.uint8)
+        for start in range(0, sub.shape[0], _ENCODE_BLOCK):
+            block = sub[start : start + _ENCODE_BLOCK]
+            for j in range(self.m):
+                codes[start : start + block.shape[0], j] = _nearest(block[:, j], self.codebooks[j])
+        return codes
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        parts = [self.codebooks[j, codes[:, j]] for j in range(self.m)]
+        return np.concatenate(parts, axis=1)[:, : self.dim]
+
+    def adc_table(self, query: np.ndarray) -> np.ndarray:
+        """Таблица `(m, 256)`: скалярные произведения подвекторов запроса с центроидами."""
+        q = _split(np.asarray(query, dtype=np.float32)[None, :], self.m)[0]
+        return np.asarray(np.einsum("jkd,jd->jk", self.codebooks, q), dtype=np.float32)
+
+    def similarities(self, codes: np.ndarray, table: np.ndarray) -> np.ndarray:
+        """Оценка скалярного произведения с запросом по кодам (ADC)."""
+        return np.asarray(table[np.arange(self.m), codes].sum(axis=1), dtype=np.float32)
+
+    # ---------- persistence ----------
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        with tmp.open("wb") as f:
+            np.savez(f, codebooks=self.codebooks, dim=np.array(self.dim))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path) -> ProductQuantizer | None:
+        if not path.exists():
+            return None
+        try:
+            with np.load(path) as data:
+                return cls(data["codebooks"], int(data["dim"]))
+        except Exception as e:  # noqa: BLE001
+            logger.warning("Ignoring unreadable PQ codebook %s: %s", path, e)
+            return None
+
+
+def _split(vectors: np.ndarray, m: int) -> np.ndarray:
+    """`(n, dim)` → `(n, m, dsub)` с дополнением нулями до кратной `m` размерности."""
+    n, dim = vectors.shape
+    dsub = -(-dim // m)
+    if dsub * m != dim:
+        padded = np.zeros((n, dsub * m), dtype=np.float32)
+        padded[:, :dim] = vectors
+        vectors = padded
+    return vectors.reshape(n, m, dsub)
+
+
+def _nearest(data: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    # |x - c|^2 = |x|^2 - 2 x.c + |c|^2; |x|^2 на выбор не влияет
+    dist = (centroids * centroids).sum(axis=1)[None, :] - 2.0 * (data @ centroids.T)
+    return np.asarray(np.argmin(dist, axis=1), dtype=np.intp)
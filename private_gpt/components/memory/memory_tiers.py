@@ -0,0 +1,288 @@
+from __future__ import annotations
+
+import logging
+import os
+import shutil
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+from private_gpt.components.memory.memory_pq import ProductQuantizer
+
+logger = logging.getLogger(__name__)
+
+_PQ_FILE = "pq.npz"
+
+
+@dataclass
+class _Segment:
+    path: Path
+    rows: np.ndarray  # int64, номера строк памяти
+    codes: np.ndarray  # int8 (m, dim) или uint8 PQ-коды (m, pq.m), memmap
+    scale: np.ndarray  # float32 (m,), множитель деквантования (у PQ — единицы)
+    norms: np.ndarray  # float32 (m,), норма исходного эмбеддинга
+
+
+class ColdStore:
+    """Холодный ярус памяти: сегменты int8-кодов векторов, открытые через memmap.
+
+    Вектор строки (уже нормированный) хранится как `codes * scale` с
+    симметричным int8-квантованием по строке — в 4 раза компактнее float32.
+    Каждый сегмент — каталог `seg-NNNNNN` с файлами `.npy`; коды читаются
+    с диска через memmap только при сканировании холодного яруса.
+
+    С подключённым `ProductQuantizer` (`set_codec`) новые сегменты хранят
+    PQ-коды (`uint8`, `m` байт на строку), а близость считается по ADC.
+    Тип кодов определяется dtype файла, так что старые int8-сегменты остаются
+    читаемыми и перекодируются при `compact()`.
+
+    Строка может быть в нескольких сегментах (понижена, повышена, снова
+    понижена) — действует последний; `discard()` убирает строку из яруса,
+    место в сегменте освобождается при `compact()`.
+    """
+
+    def __init__(self, directory: Path) -> None:
+        self.dir = directory
+        self._lock = threading.RLock()
+        self._pq: ProductQuantizer | None = None
+        self._segments: list[_Segment] = []
+        self._seg_of = np.full(0, -1, dtype=np.int32)
+        self._pos_of = np.zeros(0, dtype=np.int64)
+        self._next_id = 1
+
+    # ---------- state ----------
+    @property
+    def codec(self) -> ProductQuantizer | None:
+        return self._pq
+
+    def set_codec(self, pq: ProductQuantizer) -> None:
+        """Кодировать новые сегменты PQ; кодовая книга сохраняется рядом с сегментами.
+
+        Книга задаётся один раз: уже записанные PQ-коды понимает только она.
+        """
+        with self._lock:
+            if self._pq is not None:
+                raise ValueError("Cold memory tier already has a PQ codebook")
+            pq.save(self.dir / _PQ_FILE)
+            self._pq = pq
+
+    def load(self) -> None:
+        with self._lock:
+            self._segments = []
+            self._seg_of = np.full(0, -1, dtype=np.int32)
+            self._pos_of = np.zeros(0, dtype=np.int64)
+            if not self.dir.exists():
+                return
+            self._pq = ProductQuantizer.load(self.dir / _PQ_FILE)
+            for path in sorted(self.dir.glob("seg-*")):
+                if not path.is_dir() or path.name.endswith(".tmp"):
+                    continue
+                try:
+                    seg = self._open(path)
+                except (OSError, ValueError) as e:
+                    logger.warning("Ignoring unreadable cold memory segment %s: %s", path, e)
+                    continue
+                self._register(seg)
+                self._next_id = max(self._next_id, int(path.name.split("-")[1]) + 1)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return int((self._seg_of >= 0).sum())
+
+    def mask(self, n: int) -> np.ndarray:
+        """Маска строк `[0, n)`, лежащих в холодном ярусе."""
+        with self._lock:
+            out = np.zeros(n, dtype=bool)
+            m = min(n, self._seg_of.shape[0])
+            out[:m] = self._seg_of[:m] >= 0
+            return out
+
+    def size_bytes(self) -> int:
+        with self._lock:
+            return sum(
+                s.codes.nbytes + s.scale.nbytes + s.norms.nbytes + s.rows.nbytes
+                for s in self._segments
+            )
+
+    # ---------- write ----------
+    def add(self, rows: np.ndarray, vectors: np.ndarray, norms: np.ndarray) -> None:
+        """Записать новый сегмент с нормированными `vectors` строк `rows`."""
+        if rows.shape[0] == 0:
+            return
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            if self._pq is not None and self._pq.dim == vectors.shape[1]:
+                codes = self._pq.encode(vectors)
+                scale = np.ones(vectors.shape[0], dtype=np.float32)
+            else:
+                peak = np.abs(vectors).max(axis=1)
+                scale = np.where(peak > 0.0, peak / 127.0, 1.0).astype(np.float32)
+                codes = np.clip(np.rint(vectors / scale[:, None]), -127, 127).astype(np.int8)
+            self.dir.mkdir(parents=True, exist_ok=True)
+            path = self.dir / f"seg-{self._next_id:06d}"
+            self._next_id += 1
+            tmp = path.with_name(path.name + ".tmp")
+            shutil.rmtree(tmp, ignore_errors=True)
+            tmp.mkdir()
+            np.save(tmp / "rows.npy", np.asarray(rows, dtype=np.int64))
+            np.save(tmp / "codes.npy", codes)
+            np.save(tmp / "scale.npy", scale)
+            np.save(tmp / "norms.npy", np.asarray(norms, dtype=np.float32))
+            os.replace(tmp, path)
+            self._register(self._open(path))
+
+    def discard(self, rows: np.ndarray) -> None:
+        """Убрать строки из яруса (повышены в горячий или удалены).
+
+        В `rows.npy` сегмента строка заменяется на `-1`, чтобы после
+        перезапуска она не вернулась в ярус.
+        """
+        with self._lock:
+            for seg_id, _, pos in self._locate(rows):
+                seg = self._segments[seg_id]
+                self._seg_of[seg.rows[pos]] = -1
+                seg.rows[pos] = -1
+                self._save_rows(seg.path, seg.rows)
+
+    def remap(self, mapping: np.ndarray) -> None:
+        """Перенумеровать строки после перезаписи хранилища (`-1` — строка удалена)."""
+        with self._lock:
+            for seg_id, seg in enumerate(self._segments):
+                live = np.zeros(seg.rows.shape[0], dtype=bool)
+                valid = seg.rows >= 0
+                live[valid] = self._seg_of[seg.rows[valid]] == seg_id
+                keep = live & (seg.rows < mapping.shape[0])
+                new_rows = np.full(seg.rows.shape[0], -1, dtype=np.int64)
+                new_rows[keep] = mapping[seg.rows[keep]]
+                self._save_rows(seg.path, new_rows)
+            self.load()
+            self.compact()
+
+    def compact(self) -> None:
+        """Слить сегменты в один, если в них больше мусора, чем живых строк."""
+        with self._lock:
+            live = len(self)
+            total = sum(s.rows.shape[0] for s in self._segments)
+            if len(self._segments) < 2 and total == live:
+                return
+            if total - live < live and len(self._segments) < 16:
+                return
+            rows = np.flatnonzero(self._seg_of >= 0)
+            vectors, norms = self.vectors(rows), self.norms(rows)
+            old = [s.path for s in self._segments]
+            self._segments = []
+            self._seg_of = np.full(0, -1, dtype=np.int32)
+            self._pos_of = np.zeros(0, dtype=np.int64)
+            # повторное квантование уже квантованных векторов — ошибка растёт
+            # незначительно, а исходные float32 остаются в sidecar
+            self.add(rows, vectors, norms)
+            for path in old:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def clear(self) -> None:
+        with self._lock:
+            shutil.rmtree(self.dir, ignore_errors=True)
+            self._pq = None
+            self._segments = []
+            self._seg_of = np.full(0, -1, dtype=np.int32)
+            self._pos_of = np.zeros(0, dtype=np.int64)
+
+    # ---------- read ----------
+    def similarities(self, rows: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """Косинус нормированного `query` с (деквантованными) векторами `rows`."""
+        out = np.zeros(rows.shape[0], dtype=np.float64)
+        with self._lock:
+            # таблица ADC нужна только сегментам с PQ-кодами — считаем один раз, по требованию
+            table: np.ndarray | None = None
+            for seg_id, where, pos in self._locate(rows):
+                seg = self._segments[seg_id]
+                order = np.argsort(pos)  # последовательное чтение memmap
+                codes = np.asarray(seg.codes[pos[order]])
+                if codes.dtype == np.uint8:
+                    pq = self._require_pq(seg)
+                    if table is None:
+                        table = pq.adc_table(query)
+                    sims = pq.similarities(codes, table)
+                else:
+                    sims = (codes.astype(np.float32) @ query) * seg.scale[pos[order]]
+                out[where[order]] = sims
+        return out
+
+    def vectors(self, rows: np.ndarray) -> np.ndarray:
+        with self._lock:
+            out = np.zeros((rows.shape[0], self._dim()), dtype=np.float32)
+            for seg_id, where, pos in self._locate(rows):
+                seg = self._segments[seg_id]
+                codes = np.asarray(seg.codes[pos])
+                if codes.dtype == np.uint8:
+                    out[where] = self._require_pq(seg).decode(codes)
+                else:
+                    out[where] = codes.astype(np.float32) * seg.scale[pos, None]
+            return out
+
+    def norms(self, rows: np.ndarray) -> np.ndarray:
+        with self._lock:
+            out = np.zeros(rows.shape[0], dtype=np.float32)
+            for seg_id, where, pos in self._locate(rows):
+                out[where] = self._segments[seg_id].norms[pos]
+            return out
+
+    # ---------- internals ----------
+    def _dim(self) -> int:
+        for seg in self._segments:
+            if seg.codes.dtype == np.int8:
+                return int(seg.codes.shape[1])
+        return self._pq.dim if self._pq is not None else 0
+
+    def _require_pq(self, seg: _Segment) -> ProductQuantizer:
+        if self._pq is None:
+            raise ValueError(f"Cold memory segment {seg.path} holds PQ codes, but no codebook is loaded")
+        return self._pq
+
+    @staticmethod
+    def _open(path: Path) -> _Segment:
+        return _Segment(
+            path=path,
+            rows=np.load(path / "rows.npy"),
+            codes=np.load(path / "codes.npy", mmap_mode="r"),
+            scale=np.load(path / "scale.npy"),
+            norms=np.load(path / "norms.npy"),
+        )
+
+    @staticmethod
+    def _save_rows(path: Path, rows: np.ndarray) -> None:
+        tmp = path / "rows.npy.tmp"
+        with tmp.open("wb") as f:
+            np.save(f, rows)
+        os.replace(tmp, path / "rows.npy")
+
+    def _register(self, seg: _Segment) -> None:
+        seg_id = len(self._segments)
+        self._segments.append(seg)
+        valid = seg.rows >= 0
+        rows = seg.rows[valid]
+        if rows.shape[0] == 0:
+            return
+        end = int(rows.max()) + 1
+        if self._seg_of.shape[0] < end:
+            grown = np.full(end, -1, dtype=np.int32)
+            grown[: self._seg_of.shape[0]] = self._seg_of
+            self._seg_of = grown
+            pos = np.zeros(end, dtype=np.int64)
+            pos[: self._pos_of.shape[0]] = self._pos_of
+            self._pos_of = pos
+        self._seg_of[rows] = seg_id
+        self._pos_of[rows] = np.flatnonzero(valid)
+
+    def _locate(self, rows: np.ndarray) -> list[tuple[int, np.ndarray, np.ndarray]]:
+        """(сегмент, позиции в `rows`, позиции в сегменте) для строк яруса."""
+        inside = rows < self._seg_of.shape[0]
+        seg = np.full(rows.shape[0], -1, dtype=np.int32)
+        seg[inside] = self._seg_of[rows[inside]]
+        out = []
+        for seg_id in np.unique(seg[seg >= 0]).tolist():
+            where = np.flatnonzero(seg == seg_id)
+            out.append((seg_id, where, self._pos_of[rows[where]]))
+        return out
@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import logging
+import struct
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 16 байт: magic(8) + dim(uint32) + version(uint32)
+_MAGIC = b"PGMEMF32"
+_HEADER = struct.Struct("<8sII")
+_VERSION = 1
+
+
+@dataclass
+class VectorFile:
+    """Append-only файл float32-векторов фиксированной размерности.
+
+    Вектор адресуется номером строки; чтение — через `np.memmap`,
+    без разбора JSON. Размерность фиксируется первым записанным вектором,
+    остальные обрезаются/дополняются нулями до неё.
+    """
+
+    path: Path
+
+    def ensure(self) -> None:
+        """Отрезать недописанный хвост (обрыв записи посреди строки)."""
+        dim = self.dim()
+        if dim is None:
+            return
+        size = self.path.stat().st_size
+        row_bytes = dim * 4
+        tail = (size - _HEADER.size) % row_bytes
+        if tail:
+            logger.warning("Truncating %d dangling bytes in %s", tail, self.path)
+            with self.path.open("r+b") as f:
+                f.truncate(size - tail)
+
+    def dim(self) -> int | None:
+        if not self.path.exists() or self.path.stat().st_size < _HEADER.size:
+            return None
+        with self.path.open("rb") as f:
+            magic, dim, _version = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != _MAGIC:
+            raise ValueError(f"Not a memory vector file: {self.path}")
+        return int(dim)
+
+    def rows(self) -> int:
+        dim = self.dim()
+        if dim is None:
+            return 0
+        return (self.path.stat().st_size - _HEADER.size) // (dim * 4)
+
+    def append(self, vector: list[float] | np.ndarray) -> int:
+        """Дописать вектор и вернуть номер его строки."""
+        vec = np.asarray(vector, dtype=np.float32)
+        dim = self.dim()
+        if dim is None:
+            dim = int(vec.shape[0])
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("wb") as f:
+                f.write(_HEADER.pack(_MAGIC, dim, _VERSION))
+        if vec.shape[0] != dim:
+            out = np.zeros(dim, dtype=np.float32)
+            n = min(dim, vec.shape[0])
+            out[:n] = vec[:n]
+            vec = out
+        with self.path.open("ab") as f:
+            row = (f.tell() - _HEADER.size) // (dim * 4)
+            f.write(vec.astype("<f4", copy=False).tobytes())
+        return int(row)
+
+    def open(self) -> np.memmap | None:
+        """Read-only отображение всех строк `(rows, dim)` или None, если файл пуст."""
+        dim = self.dim()
+        rows = self.rows()
+        if dim is None or rows == 0:
+            return None
+        return np.memmap(self.path, dtype="<f4", mode="r", offset=_HEADER.size, shape=(rows, dim))
+
+    def clear(self) -> None:
+        self.path.unlink(missing_ok=True)
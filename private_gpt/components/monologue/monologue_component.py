@@ -3,31 +3,65 @@ from __future__ import annotations
 import asyncio
 import json
 import logging
-from dataclasses import dataclass
-from typing import Optional
+import threading
+import time
+from collections import Counter
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Optional, TypeVar
 
 from injector import inject, singleton
 from llama_index.core.llms import ChatMessage, MessageRole
+from pydantic import BaseModel, Field
 
+from private_gpt.components.hypothesis.hypothesis_component import HypothesisComponent
 from private_gpt.components.llm.llm_component import LLMComponent
+from private_gpt.components.llm.llm_gate import LLMGate
+from private_gpt.components.llm.structured_output import chat_json, llm_schema
 from private_gpt.components.memory.memory_component import MemoryComponent
 from private_gpt.components.self_model.self_model_component import SelfModelComponent, SelfState
 from private_gpt.settings.settings import Settings
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
 
-@dataclass
-class _Cfg:
-    enabled: bool
-    interval_minutes: int
-    top_k_memories: int
-    system_prompt: str
+
+class MonologueThought(BaseModel):
+    """Ответ внутренней речи."""
+    note: str
+    new_goals: list[str] = Field(default_factory=list)
+    tags: list[str] = Field(default_factory=list)
+
+
+_THOUGHT_SCHEMA = llm_schema(MonologueThought, ("note", "new_goals", "tags"))
+
+
+_DEFAULT_PROMPT = (
+    "You are the agent's inner voice. Produce STRICT JSON with keys: note (string), "
+    "new_goals (array of strings), tags (array of strings). Be brief, 1-2 sentences max in 'note'."
+)
+# как часто отложенный тик проверяет, освободилась ли LLM
+_DEFER_POLL_S = 5.0
 
 
 @singleton
 class MonologueRunner:
-    """Фоновая внутренняя речь: периодически генерирует короткую мысль и записывает её в память и SelfModel."""
+    """Фоновая внутренняя речь: периодически генерирует короткую мысль и записывает её в память и SelfModel.
+
+    Интервал адаптивный (см. `MonologueSettings`): после всплеска новых
+    воспоминаний — `min_interval_minutes`, если с прошлого тика ничего не
+    изменилось — тик пропускается без LLM, а интервал удваивается до
+    `max_interval_minutes`. Тик берёт LLM через `LLMGate` с низшим
+    приоритетом: он ждёт, пока нет запросов чата, и пропускается, если
+    прождал дольше `max_defer_minutes`. Пауза после тика не меньше, чем
+    нужно, чтобы доля времени LLM на монолог не превышала `max_llm_share`.
+
+    Блокирующая работа тика (LLM, эмбеддинг заметки, запись JSONL) идёт в
+    отдельном потоке, event loop сервера не ждёт её. При остановке тик
+    отменяется: начатый вызов LLM дорабатывает в потоке, но его результат
+    уже не записывается.
+    """
 
     @inject
     def __init__(
@@ -36,22 +70,24 @@ class MonologueRunner:
         llm_component: LLMComponent,
         memory: MemoryComponent,
         self_model: SelfModelComponent,
+        gate: LLMGate,
+        hypothesis: HypothesisComponent,
     ) -> None:
-        s = settings
-        self._cfg = _Cfg(
-            enabled=getattr(s, "monologue", None) is not None and s.monologue.enabled,
-            interval_minutes=s.monologue.interval_minutes if getattr(s, "monologue", None) else 10,
-            top_k_memories=s.monologue.top_k_memories if getattr(s, "monologue", None) else 5,
-            system_prompt=(
-                s.monologue.system_prompt
-                if getattr(s, "monologue", None) and s.monologue.system_prompt
-                else "You are the agent's inner voice. Produce STRICT JSON with keys: note (string), new_goals (array of strings), tags (array of strings). Be brief, 1-2 sentences max in 'note'."
-            ),
-        )
+        self._cfg = settings.monologue
+        self._system_prompt = self._cfg.system_prompt or _DEFAULT_PROMPT
         self._llm = llm_component.llm
         self._memory = memory
         self._self = self_model
+        self._gate = gate
+        self._hypothesis = hypothesis
         self._task: Optional[asyncio.Task] = None
+        self._interval_s = self._cfg.interval_minutes * 60
+        # отпечаток входа прошлого тика: без изменений LLM не вызывается
+        self._last_seen_ts: float | None = None
+        self._last_state_ts: str | None = None
+        self._counters: Counter[str] = Counter()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="monologue")
+        self._stopping = threading.Event()
 
     # --- lifecycle ---
     def mount_app(self, app) -> None:
@@ -68,42 +104,126 @@ class MonologueRunner:
         @app.on_event("shutdown")
         async def _stop() -> None:  # noqa: D401
             """Stop monologue loop."""
-            if self._task:
-                self._task.cancel()
-                try:
-                    await self._task
-                except Exception:  # noqa: BLE001
-                    pass
-            logger.info("Internal monologue stopped")
+            await self.stop()
+
+    async def stop(self) -> None:
+        """Отменить цикл и текущий тик; результат недоработавшего вызова LLM отбрасывается."""
+        self._stopping.set()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except BaseException:  # noqa: BLE001
+                pass
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        logger.info("Internal monologue stopped")
+
+    def stats(self) -> dict[str, float]:
+        out: dict[str, float] = dict(self._counters)
+        out["interval_s"] = self._interval_s
+        out["llm_share"] = self._gate.background_share()
+        return out
 
     # --- worker ---
     async def _loop(self) -> None:
         while True:
             try:
-                await self._tick()
+                delay = await self._step()
             except asyncio.CancelledError:
                 raise
             except Exception as e:  # noqa: BLE001
-                logger.error("Monologue tick error: %s", e)
-            await asyncio.sleep(max(60, self._cfg.interval_minutes * 60))
+                # сбой вне тика (снимок памяти, Self, планировщик) не должен останавливать цикл
+                logger.error("Monologue step error: %s", e)
+                self._counters["errors"] += 1
+                delay = self._interval_s
+            await asyncio.sleep(delay)
+
+    async def _step(self) -> float:
+        """Один шаг планировщика: тик, если есть что обдумать и LLM свободна; вернуть паузу до следующего."""
+        seen_at = time.time()
+        fresh, current_self = await self._offload(self._snapshot)
+        state_ts = current_self.timestamp if current_self else None
+        first = self._last_seen_ts is None
+        if not first and fresh == 0 and state_ts == self._last_state_ts:
+            self._counters["skipped.unchanged"] += 1
+            return self._adapt(0, took=0.0)
+        if not await self._acquire_llm():
+            self._counters["skipped.busy"] += 1
+            return self._interval_s
+        started = time.monotonic()
+        try:
+            await self._offload(self._tick, current_self)
+            self._counters["ticks"] += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:  # noqa: BLE001
+            logger.error("Monologue tick error: %s", e)
+            self._counters["errors"] += 1
+        finally:
+            self._gate.release_background(started)
+        self._last_seen_ts = seen_at
+        latest = await self._offload(self._self.get_current_state)
+        self._last_state_ts = latest.timestamp if latest else None
+        return self._adapt(None if first else fresh, took=time.monotonic() - started)
+
+    async def _offload(self, fn: Callable[..., T], *args: Any) -> T:
+        """Выполнить блокирующую функцию в потоке монолога."""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
 
-    async def _tick(self) -> None:
-        # собрать контекст: лучшие воспоминания + текущее состояние Self
-        mem = self._memory.list(limit=200)
-        best = mem[-self._cfg.top_k_memories:] if mem else []
-        current_self = self._self.get_current_state()
+    def _snapshot(self) -> tuple[int, SelfState | None]:
+        """Сколько воспоминаний появилось с прошлого тика (свои заметки монолога не в счёт) и текущий Self."""
+        since = self._last_seen_ts
+        fresh = 0
+        if since is not None:
+            fresh = self._memory.count(since=since) - self._memory.count(since=since, kinds=["monologue"])
+        return fresh, self._self.get_current_state()
+
+    async def _acquire_llm(self) -> bool:
+        """Дождаться простоя чата и взять фоновый слот LLMGate; False — тик пропускается."""
+        deadline = time.monotonic() + self._cfg.max_defer_minutes * 60
+        while True:
+            if self._gate.background_share() < self._cfg.max_llm_share and self._gate.try_background(self._cfg.quiet_s):
+                return True
+            if time.monotonic() >= deadline:
+                return False
+            self._counters["deferred"] += 1
+            await asyncio.sleep(min(_DEFER_POLL_S, max(0.01, self._cfg.quiet_s)))
+
+    def _adapt(self, fresh: int | None, *, took: float) -> float:
+        """Новый интервал по числу свежих воспоминаний (None — первый тик); вернуть паузу."""
+        cfg = self._cfg
+        if fresh is None:
+            self._interval_s = cfg.interval_minutes * 60
+        elif fresh >= cfg.burst_memories:
+            self._interval_s = cfg.min_interval_minutes * 60
+        elif fresh == 0:
+            self._interval_s = min(self._interval_s * 2, cfg.max_interval_minutes * 60)
+        else:
+            self._interval_s = cfg.interval_minutes * 60
+        # потолок доли времени LLM: тик длиной t требует паузы t * (1/share - 1)
+        return max(self._interval_s, took * (1.0 / cfg.max_llm_share - 1.0))
+
+    def _tick(self, current_self: SelfState | None) -> None:
+        # контекст: воспоминания, ближайшие к целям и заметкам Self, + само состояние
+        goals = current_self.goals if current_self else []
+        query = " ".join([*goals, current_self.self_notes if current_self else ""])
+        best = self._memory.context(
+            query, max_tokens=self._cfg.context_tokens, max_items=self._cfg.top_k_memories
+        )
 
         user_payload = self._compose_payload(best, current_self)
         messages = [
-            ChatMessage(role=MessageRole.SYSTEM, content=self._cfg.system_prompt),
+            ChatMessage(role=MessageRole.SYSTEM, content=self._system_prompt),
             ChatMessage(role=MessageRole.USER, content=user_payload),
         ]
         try:
-            resp = self._llm.chat(messages)  # type: ignore
+            resp = chat_json(self._llm, messages, _THOUGHT_SCHEMA, name="monologue")
             text = getattr(resp, "message", None).content if hasattr(resp, "message") and resp.message else getattr(resp, "text", str(resp))
         except Exception as e:  # noqa: BLE001
             logger.error("Monologue LLM failed: %s", e)
             return
+        if self._stopping.is_set():
+            return
 
         data = self._safe_parse(text)
         note = data.get("note", "").strip()
@@ -112,13 +232,11 @@ class MonologueRunner:
 
         if note:
             self._memory.add(text=note, kind="monologue", importance=0.6, tags=tags, embed=True)
-            # обновим SelfModel короткой заметкой и целями (если есть)
-            merged_goals = []
-            if current_self and current_self.goals:
-                merged_goals.extend(current_self.goals)
-            merged_goals.extend([g for g in new_goals if g not in merged_goals])
+            # обновим SelfModel короткой заметкой; цели — через ограниченный набор SelfModel
+            statuses = {h.title: h.status for h in self._hypothesis.list(limit=100)}
+            goals = self._self.merge_goals(new_goals, statuses)
             self._self.record_state(
-                SelfState(goals=merged_goals, emotions=current_self.emotions if current_self else {}, self_notes=note, tags=list(set((current_self.tags if current_self else []) + tags)))
+                SelfState(goals=goals, emotions=current_self.emotions if current_self else {}, self_notes=note, tags=list(set((current_self.tags if current_self else []) + tags)))
             )
 
     # --- utils ---
@@ -128,7 +246,7 @@ class MonologueRunner:
             "self": current_self.model_dump() if current_self else {},
             "memories": [
                 {"id": m.id, "kind": m.kind, "text": m.text, "importance": m.importance, "tags": m.tags}
-                for m in memories[-10:]
+                for m in memories
             ],
         }
         return json.dumps(payload, ensure_ascii=False)
@@ -3,8 +3,7 @@ from __future__ import annotations
 import json
 import logging
 from datetime import datetime, timezone
-from pathlib import Path
-from typing import Any, Iterable, Optional
+from typing import Any, Optional
 
 from injector import inject, singleton
 from pydantic import BaseModel, Field
@@ -12,11 +11,28 @@ from llama_index.core.llms import ChatMessage, MessageRole
 
 from private_gpt.paths import local_data_path
 from private_gpt.components.llm.llm_component import LLMComponent
+from private_gpt.components.llm.structured_output import array_schema, chat_json, llm_schema
+from private_gpt.settings.settings import Settings
+from private_gpt.utils.append_log import AppendLog
+from private_gpt.utils.pagination import in_window, take_page
+from private_gpt.utils.result_cache import ResultCache, fingerprint
 
 logger = logging.getLogger(__name__)
 
 _REFLECTION_DIR = local_data_path / "reflection"
 _REFLECTION_FILE = _REFLECTION_DIR / "reflections.jsonl"
+_CACHE_FILE = _REFLECTION_DIR / "cache.jsonl"
+
+_FALLBACK_JSON = '{"why":"internal_error","alternatives":[],"error_patterns":["reflection_llm_failed"],"confidence":0.0}'
+_BATCH_SYSTEM_PROMPT = (
+    "You are a concise introspection module. "
+    "You get a JSON array of {n} chat turns (user message, assistant answer, optional context sources), "
+    "each with an `index`. Output STRICT JSON: an object with key items - an array of exactly {n} objects "
+    "in the same order, each with keys: "
+    "index (integer, copied from the turn), why (string), alternatives (array of 1-3 short strings), "
+    "error_patterns (array of short strings), confidence (0..1). "
+    "Be brief, actionable, no markdown."
+)
 
 
 class ReflectionRecord(BaseModel):
@@ -33,16 +49,27 @@ class ReflectionRecord(BaseModel):
     confidence: float = 0.5
 
 
+# поля, которые заполняет LLM; схема уходит бэкенду как ограничение вывода
+_LLM_FIELDS = ("why", "alternatives", "error_patterns", "confidence")
+_REFLECTION_SCHEMA = llm_schema(ReflectionRecord, _LLM_FIELDS)
+_BATCH_ITEM_SCHEMA = {
+    **_REFLECTION_SCHEMA,
+    "properties": {"index": {"type": "integer"}, **_REFLECTION_SCHEMA["properties"]},
+    "required": ["index", *_REFLECTION_SCHEMA["required"]],
+}
+
+
 @singleton
 class ReflectionComponent:
     """Компонент: вызывает локальную LLM и сохраняет разбор ответа."""
 
     @inject
-    def __init__(self, llm_component: LLMComponent) -> None:
+    def __init__(self, llm_component: LLMComponent, settings: Settings) -> None:
         self._llm = llm_component.llm
-        _REFLECTION_DIR.mkdir(parents=True, exist_ok=True)
-        if not _REFLECTION_FILE.exists():
-            _REFLECTION_FILE.touch()
+        self._log = AppendLog(_REFLECTION_FILE)
+        self._log.ensure()
+        cfg = settings.reflection
+        self._cache = ResultCache(_CACHE_FILE, ttl_s=cfg.cache_ttl_s, max_items=cfg.cache_max_items)
         logger.info("Reflection storage at %s", _REFLECTION_FILE)
 
     # --------- публичное API ----------
@@ -55,52 +82,193 @@ class ReflectionComponent:
         assistant_response: str,
         sources: list[dict[str, Any]] | None,
     ) -> ReflectionRecord:
-        """Сгенерировать и сохранить рефлексию по ответу."""
-        messages = self._build_reflection_chat(
-            system_prompt=system_prompt,
-            last_user_message=last_user_message,
-            chat_history=chat_history,
-            assistant_response=assistant_response,
-            sources=sources,
-        )
+        """Сгенерировать и сохранить рефлексию по ответу.
+
+        Для хода с тем же содержимым (см. `_cache_key`) в пределах
+        `reflection.cache_ttl_s` разбор берётся из кэша без вызова LLM;
+        в журнал всё равно пишется новая запись с текущим временем.
+        """
+        turn = {
+            "system_prompt": system_prompt,
+            "last_user_message": last_user_message,
+            "chat_history": chat_history,
+            "assistant_response": assistant_response,
+            "sources": sources,
+        }
+        key = self._cache_key(turn)
+        cached = self._cache.get(key)
+        if cached is None:
+            return self._reflect_uncached(turn, key)
+        record = self._from_cache(cached)
+        self._log.append(record.model_dump())
+        return record
+
+    def reflect_batch(self, turns: list[dict[str, Any]]) -> list[ReflectionRecord]:
+        """Рефлексия нескольких ходов одним вызовом LLM.
+
+        `turns` — аргументы `reflect()` по ходам. Модель получает JSON-массив
+        ходов и должна вернуть массив разборов в том же порядке (с `index`).
+        Ходы, чей разбор не разобрался или пропущен, рефлексируются по одному.
+        Все записи пачки попадают в журнал одной дозаписью в порядке ходов.
+        """
+        keys = [self._cache_key(t) for t in turns]
+        records: list[ReflectionRecord | None] = []
+        for key in keys:
+            cached = self._cache.get(key)
+            records.append(self._from_cache(cached) if cached is not None else None)
+        todo = [i for i, r in enumerate(records) if r is None]
+        if len(todo) > 1:
+            payload = [
+                {"index": n, **json.loads(self._compose_user_payload(**self._payload_args(turns[i])))}
+                for n, i in enumerate(todo)
+            ]
+            messages = [
+                ChatMessage(role=MessageRole.SYSTEM, content=_BATCH_SYSTEM_PROMPT.format(n=len(todo))),
+                ChatMessage(role=MessageRole.USER, content=json.dumps(payload, ensure_ascii=False)),
+            ]
+            schema = array_schema(_BATCH_ITEM_SCHEMA, len(todo))
+            parsed = self._parse_batch(self._chat(messages, schema) or "[]", len(todo))
+            fresh = []
+            for i, p in zip(todo, parsed, strict=True):
+                if p is not None:
+                    records[i] = self._make_record(p, **turns[i])
+                    fresh.append(i)
+            for i in fresh:
+                self._cache.put(keys[i], records[i].model_dump())  # type: ignore[union-attr]
+            missing = len(todo) - len(fresh)
+            if missing:
+                logger.warning("Batch reflection: %d of %d items unparsed, retrying one by one", missing, len(todo))
+        for i, r in enumerate(records):
+            if r is None:
+                records[i] = self._reflect_uncached(turns[i], keys[i], log=False)
+        self._log.append_many(r.model_dump() for r in records)  # type: ignore[union-attr]
+        return records  # type: ignore[return-value]
+
+    def latest(self) -> ReflectionRecord | None:
+        last = self._log.latest()
+        return ReflectionRecord(**last) if last else None
+
+    def history(self, limit: int = 50) -> list[ReflectionRecord]:
+        return [ReflectionRecord(**rec) for rec in self._log.last(limit)]
+
+    def page(
+        self,
+        limit: int = 50,
+        *,
+        before: int | None = None,
+        since: datetime | None = None,
+        until: datetime | None = None,
+        max_confidence: float | None = None,
+    ) -> tuple[list[ReflectionRecord], int | None]:
+        """Страница истории: последние `limit` записей до позиции `before` (старые первыми).
+
+        Журнал читается с конца кусками, пока страница не заполнится.
+        Второе значение — позиция следующей (более старой) страницы или None.
+        """
+
+        def match(rec: dict[str, Any]) -> bool:
+            if max_confidence is not None and float(rec.get("confidence", 0.5)) > max_confidence:
+                return False
+            return in_window(rec.get("timestamp"), since, until)
+
+        recs, next_before = take_page(self._log.scan_back(before), limit, match)
+        return [ReflectionRecord(**rec) for rec in recs], next_before
+
+    def version(self) -> tuple[int, int]:
+        """(поколение журнала, число записей) — меняется при любой записи или очистке."""
+        return self._log.generation, len(self._log)
+
+    def clear(self) -> None:
+        self._log.clear()
+        self._cache.clear()
+        logger.warning("Reflection storage cleared")
+
+    def cache_stats(self) -> dict[str, int]:
+        return {"size": len(self._cache), "hits": self._cache.hits, "misses": self._cache.misses}
+
+    # --------- внутренние ----------
+    def _reflect_uncached(self, turn: dict[str, Any], key: str, *, log: bool = True) -> ReflectionRecord:
+        messages = self._build_reflection_chat(**self._payload_args(turn))
+        text = self._chat(messages, _REFLECTION_SCHEMA)
+        record = self._make_record(self._safe_parse_json(text or _FALLBACK_JSON), **self._payload_args(turn))
+        if log:
+            self._log.append(record.model_dump())
+        if text is not None:
+            # ошибку LLM не кэшируем — следующий такой же ход попробует снова
+            self._cache.put(key, record.model_dump())
+        return record
+
+    @staticmethod
+    def _from_cache(cached: dict[str, Any]) -> ReflectionRecord:
+        """Новая запись с разбором из кэша: время — текущее, а не исходного хода."""
+        return ReflectionRecord(**{k: v for k, v in cached.items() if k != "timestamp"})
+
+    def _chat(self, messages: list[ChatMessage], schema: dict[str, Any]) -> str | None:
+        """Текст ответа LLM, ограниченного JSON-схемой; None — если вызов упал."""
         try:
-            resp = self._llm.chat(messages)  # type: ignore
-            text = getattr(resp, "message", None).content if hasattr(resp, "message") and resp.message else getattr(resp, "text", str(resp))
+            resp = chat_json(self._llm, messages, schema, name="reflection")
+            return getattr(resp, "message", None).content if hasattr(resp, "message") and resp.message else getattr(resp, "text", str(resp))
         except Exception as e:
             logger.error("Reflection LLM call failed: %s", e)
-            text = '{"why":"internal_error","alternatives":[],"error_patterns":["reflection_llm_failed"],"confidence":0.0}'
+            return None
+
+    def _cache_key(self, turn: dict[str, Any]) -> str:
+        """Отпечаток хода — хеш того же JSON, что уходит в LLM."""
+        return fingerprint("reflection", self._compose_user_payload(**self._payload_args(turn)))
 
-        parsed = self._safe_parse_json(text)
-        record = ReflectionRecord(
+    def _make_record(
+        self,
+        parsed: dict[str, Any],
+        *,
+        system_prompt: Optional[str],
+        last_user_message: str,
+        chat_history: list[Any] | None,
+        assistant_response: str,
+        sources: list[dict[str, Any]] | None,
+    ) -> ReflectionRecord:
+        return ReflectionRecord(
             system_prompt=system_prompt,
             last_user_message=last_user_message,
             chat_history=self._normalize_history(chat_history),
             assistant_response=assistant_response,
             sources=sources,
-            why=parsed.get("why", "")[:2000],
+            why=str(parsed.get("why", ""))[:2000],
             alternatives=[str(a) for a in parsed.get("alternatives", [])][:5],
             error_patterns=[str(e) for e in parsed.get("error_patterns", [])][:10],
             confidence=float(parsed.get("confidence", 0.5)),
         )
-        self._append_jsonl(record.model_dump())
-        return record
-
-    def latest(self) -> ReflectionRecord | None:
-        last = self._read_last()
-        return ReflectionRecord(**last) if last else None
 
-    def history(self, limit: int = 50) -> list[ReflectionRecord]:
-        items: list[ReflectionRecord] = []
-        for rec in self._iter_all():
-            items.append(ReflectionRecord(**rec))
-        return items[-limit:]
+    @staticmethod
+    def _payload_args(turn: dict[str, Any]) -> dict[str, Any]:
+        keys = ("system_prompt", "last_user_message", "chat_history", "assistant_response", "sources")
+        return {k: turn.get(k) for k in keys}
 
-    def clear(self) -> None:
-        _REFLECTION_FILE.unlink(missing_ok=True)
-        _REFLECTION_FILE.touch()
-        logger.warning("Reflection storage cleared")
+    @staticmethod
+    def _parse_batch(text: str, n: int) -> list[dict[str, Any] | None]:
+        """Разборы по порядку ходов; None — для пропущенных или битых элементов."""
+        out: list[dict[str, Any] | None] = [None] * n
+        t = text.strip()
+        start, end = t.find("["), t.rfind("]")
+        if start == -1 or end <= start:
+            return out
+        try:
+            items = json.loads(t[start : end + 1])
+        except Exception:  # noqa: BLE001
+            return out
+        if not isinstance(items, list):
+            return out
+        for pos, item in enumerate(items):
+            if not isinstance(item, dict) or "why" not in item:
+                continue
+            idx = item.get("index", pos)
+            if isinstance(idx, int) and 0 <= idx < n and out[idx] is None:
+                try:
+                    float(item.get("confidence", 0.5))
+                except (TypeError, ValueError):
+                    continue
+                out[idx] = item
+        return out
 
-    # --------- внутренние ----------
     def _build_reflection_chat(
         self,
         *,
@@ -185,31 +353,3 @@ class ReflectionComponent:
             if role and content:
                 out.append({"role": str(role), "content": str(content)})
         return out
-
-    # ---- storage helpers ----
-    @staticmethod
-    def _append_jsonl(d: dict[str, Any]) -> None:
-        with _REFLECTION_FILE.open("a", encoding="utf-8") as f:
-            f.write(json.dumps(d, ensure_ascii=False) + "\n")
-
-    @staticmethod
-    def _read_last() -> dict[str, Any] | None:
-        if not _REFLECTION_FILE.exists() or _REFLECTION_FILE.stat().st_size == 0:
-            return None
-        last = None
-        with _REFLECTION_FILE.open("r", encoding="utf-8") as f:
-            for line in f:
-                t = line.strip()
-                if t:
-                    last = json.loads(t)
-        return last
-
-    @staticmethod
-    def _iter_all() -> Iterable[dict[str, Any]]:
-        if not _REFLECTION_FILE.exists() or _REFLECTION_FILE.stat().st_size == 0:
-            return []
-        with _REFLECTION_FILE.open("r", encoding="utf-8") as f:
-            for line in f:
-                t = line.strip()
-                if t:
-                    yield json.loads(t)
@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import json
+import logging
+import math
+import os
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+import numpy as np
+from pydantic import BaseModel
+
+from private_gpt.utils.append_log import AppendLog
+
+logger = logging.getLogger(__name__)
+
+# множитель оценки цели по статусу одноимённой гипотезы; done/discarded — цель закрыта
+_STATUS_WEIGHT = {"pending": 1.0, "in_progress": 1.5}
+_RESOLVED = {"done", "discarded"}
+
+
+class Goal(BaseModel):
+    """Цель с накопленной статистикой."""
+    text: str
+    first_seen: float
+    last_seen: float
+    mentions: int = 1
+    status: str = "pending"
+    embedding: list[float] | None = None
+
+
+def normalize(text: str) -> str:
+    return " ".join(text.casefold().split())
+
+
+class GoalSet:
+    """Ограниченный набор целей с приоритетами.
+
+    Оценка цели: свежесть (полураспад `half_life_days` от последнего
+    упоминания) × (1 + ln(число упоминаний)) × вес статуса гипотезы с тем же
+    заголовком. Сверх `max_goals` остаются цели с лучшей оценкой, остальные
+    уходят в архив (`goals.archive.jsonl`) вместе с закрытыми (гипотеза
+    done/discarded). Почти одинаковые формулировки (косинус эмбеддингов не
+    ниже `dedupe_threshold` или совпадение после нормализации) считаются
+    повторным упоминанием уже известной цели.
+
+    Набор хранится в `goals.json` целиком: он маленький и переписывается
+    атомарно при каждом изменении.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        *,
+        max_goals: int,
+        half_life_days: float,
+        dedupe_threshold: float,
+        embed: Callable[[list[str]], list[list[float]]] | None = None,
+    ) -> None:
+        self.path = path
+        self.max_goals = max_goals
+        self.half_life_days = half_life_days
+        self.dedupe_threshold = dedupe_threshold
+        self._embed = embed
+        self._archive = AppendLog(path.with_name(path.stem + ".archive.jsonl"), ring_size=0)
+        self._goals: dict[str, Goal] = {}
+
+    # ---------- API ----------
+    def load(self) -> None:
+        self._goals = {}
+        if not self.path.exists():
+            return
+        try:
+            raw = json.loads(self.path.read_text(encoding="utf-8"))
+            goals = [Goal(**g) for g in raw]
+        except (OSError, ValueError) as e:
+            logger.warning("Goal set %s unreadable, starting empty: %s", self.path, e)
+            return
+        self._goals = {normalize(g.text): g for g in goals}
+
+    def ranked(self, now: float | None = None) -> list[str]:
+        """Тексты целей по убыванию оценки."""
+        now = time.time() if now is None else now
+        goals = sorted(self._goals.values(), key=lambda g: self.score(g, now), reverse=True)
+        return [g.text for g in goals]
+
+    def score(self, goal: Goal, now: float) -> float:
+        age_days = max(0.0, now - goal.last_seen) / 86400.0
+        recency = 0.5 ** (age_days / self.half_life_days) if self.half_life_days > 0 else 1.0
+        return recency * (1.0 + math.log(max(1, goal.mentions))) * _STATUS_WEIGHT.get(goal.status, 1.0)
+
+    def mention(self, texts: list[str], now: float | None = None) -> list[str]:
+        """Учесть упоминание целей (новые добавляются, повторы усиливают); вернуть набор по оценке."""
+        now = time.time() if now is None else now
+        self._upsert(texts, now, repeat=True)
+        return self._settle(now)
+
+    def replace(self, texts: list[str], now: float | None = None) -> list[str]:
+        """Сделать набор равным `texts` (статистика совпавших целей сохраняется); вернуть набор по оценке."""
+        now = time.time() if now is None else now
+        keep = {normalize(t) for t in texts}
+        gone = [k for k in self._goals if k not in keep]
+        self._archive_goals([self._goals.pop(k) for k in gone], "dropped", now)
+        self._upsert([t for t in texts if normalize(t) not in self._goals], now, repeat=False)
+        return self._settle(now)
+
+    def apply_statuses(self, statuses: dict[str, str], now: float | None = None) -> list[str]:
+        """Перенести статусы гипотез (заголовок → статус) на одноимённые цели; закрытые — в архив."""
+        now = time.time() if now is None else now
+        by_title = {normalize(t): s for t, s in statuses.items()}
+        resolved = []
+        for key, goal in list(self._goals.items()):
+            status = by_title.get(key)
+            if status is None or status == goal.status:
+                continue
+            if status in _RESOLVED:
+                resolved.append(self._goals.pop(key))
+            else:
+                goal.status = status
+        self._archive_goals(resolved, "resolved", now)
+        return self._settle(now)
+
+    def clear(self) -> None:
+        self._goals = {}
+        self.path.unlink(missing_ok=True)
+
+    def __len__(self) -> int:
+        return len(self._goals)
+
+    # ---------- internals ----------
+    def _upsert(self, texts: list[str], now: float, *, repeat: bool) -> None:
+        texts = [t.strip() for t in texts if t and t.strip()]
+        if not texts:
+            return
+        vectors = self._vectors(texts)
+        for text, vec in zip(texts, vectors, strict=True):
+            match = self._find(text, vec)
+            if match is not None:
+                if repeat:
+                    match.mentions += 1
+                    match.last_seen = now
+                continue
+            goal = Goal(text=text, first_seen=now, last_seen=now, embedding=vec)
+            self._goals[normalize(text)] = goal
+
+    def _find(self, text: str, vec: list[float] | None) -> Goal | None:
+        same = self._goals.get(normalize(text))
+        if same is not None or vec is None:
+            return same
+        known = [g for g in self._goals.values() if g.embedding is not None and len(g.embedding) == len(vec)]
+        if not known:
+            return None
+        matrix = np.asarray([g.embedding for g in known], dtype=np.float32)
+        q = np.asarray(vec, dtype=np.float32)
+        sims = matrix @ q / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(q) + 1e-12)
+        best = int(np.argmax(sims))
+        return known[best] if sims[best] >= self.dedupe_threshold else None
+
+    def _vectors(self, texts: list[str]) -> list[list[float] | None]:
+        if self._embed is None:
+            return [None] * len(texts)
+        try:
+            return [list(map(float, v)) for v in self._embed(texts)]
+        except Exception as e:  # noqa: BLE001
+            logger.warning("Goal embedding failed, deduplicating by text only: %s", e)
+            return [None] * len(texts)
+
+    def _settle(self, now: float) -> list[str]:
+        """Вытеснить лишние цели, сохранить набор и вернуть его по оценке."""
+        ranked = self.ranked(now)
+        if self.max_goals > 0 and len(ranked) > self.max_goals:
+            evicted = [self._goals.pop(normalize(t)) for t in ranked[self.max_goals :]]
+            self._archive_goals(evicted, "evicted", now)
+            ranked = ranked[: self.max_goals]
+        self._save()
+        return ranked
+
+    def _archive_goals(self, goals: list[Goal], reason: str, now: float) -> None:
+        if not goals:
+            return
+        self._archive.ensure()
+        self._archive.append_many(
+            {**g.model_dump(exclude={"embedding"}), "archived_reason": reason, "archived_at": now}
+            for g in goals
+        )
+
+    def _save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(
+            json.dumps([g.model_dump() for g in self._goals.values()], ensure_ascii=False),
+            encoding="utf-8",
+        )
+        os.replace(tmp, self.path)
@@ -1,22 +1,29 @@
 from __future__ import annotations
 
-import json
 import logging
-from dataclasses import asdict, dataclass, field
+import threading
+from dataclasses import dataclass
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Iterable
+from typing import Any, Iterable, Iterator
 
 from injector import inject, singleton
 from pydantic import BaseModel, Field
 
+from private_gpt.components.embedding.embedding_component import EmbeddingComponent
+from private_gpt.components.self_model.goal_set import GoalSet, normalize
 from private_gpt.paths import local_data_path
 from private_gpt.settings.settings import Settings
+from private_gpt.utils.append_log import AppendLog
+from private_gpt.utils.pagination import in_window, take_page
 
 logger = logging.getLogger(__name__)
 
 _DATA_DIR = local_data_path / "self_model"
 _STATE_FILE = _DATA_DIR / "mental_states.jsonl"
+_GOALS_FILE = _DATA_DIR / "goals.json"
+# полный снимок состояния — раз в столько событий журнала, между ними дельты
+_SNAPSHOT_EVERY = 32
 
 
 class SelfState(BaseModel):
@@ -47,90 +54,276 @@ class SelfState(BaseModel):
 
 @dataclass
 class _SelfModelStorage:
+    """Журнал состояний: полные снимки и дельты к предыдущему состоянию.
+
+    Событие `snapshot` — полное состояние (строки без `op`, старый формат,
+    тоже снимки). Событие `delta` — только изменения: `goals+`/`goals-` и
+    `tags+`/`tags-` (добавленные и убранные элементы; если так порядок не
+    восстановить — список целиком), изменённые `emotions` и `emotions-`,
+    новый `self_notes`. Снимок пишется каждые `snapshot_every` событий,
+    поэтому любое состояние восстанавливается не более чем из стольких строк.
+    """
+
     file_path: Path = _STATE_FILE
+    snapshot_every: int = _SNAPSHOT_EVERY
+
+    def __post_init__(self) -> None:
+        self.log = AppendLog(self.file_path)
 
     def ensure(self) -> None:
-        self.file_path.parent.mkdir(parents=True, exist_ok=True)
-        if not self.file_path.exists():
-            self.file_path.touch()
+        self.log.ensure()
 
     def append(self, record: dict[str, Any]) -> None:
         """Append JSON line to storage."""
-        with self.file_path.open("a", encoding="utf-8") as f:
-            f.write(json.dumps(record, ensure_ascii=False) + "\n")
-
-    def read_last(self) -> dict[str, Any] | None:
-        """Return last JSON object or None if empty."""
-        if not self.file_path.exists() or self.file_path.stat().st_size == 0:
-            return None
-        last = None
-        with self.file_path.open("r", encoding="utf-8") as f:
-            for line in f:
-                line = line.strip()
-                if not line:
-                    continue
-                last = json.loads(line)
-        return last
+        self.log.append(record)
+
+    def __len__(self) -> int:
+        return len(self.log)
+
+    @property
+    def generation(self) -> int:
+        return self.log.generation
+
+    def read_range(self, start: int, stop: int) -> list[dict[str, Any]]:
+        return self.log.read_range(start, stop)
+
+    def scan(self, start: int, stop: int) -> list[tuple[int, dict[str, Any]]]:
+        return self.log.scan(start, stop)
+
+    def last_snapshot(self, before: int) -> int:
+        """Позиция последнего снимка не позже `before`.
+
+        0, если журнал начинается с дельт.
+        """
+        pos = before
+        while pos > 0:
+            lo = max(0, pos - self.snapshot_every)
+            events = self.log.read_range(lo, pos + 1)
+            for i in range(len(events) - 1, -1, -1):
+                if _is_snapshot(events[i]):
+                    return lo + i
+            pos = lo - 1
+        return 0
 
     def iter_all(self) -> Iterable[dict[str, Any]]:
-        if not self.file_path.exists() or self.file_path.stat().st_size == 0:
-            return []
-        with self.file_path.open("r", encoding="utf-8") as f:
-            for line in f:
-                line = line.strip()
-                if not line:
-                    continue
-                yield json.loads(line)
+        return self.log.iter_all()
+
+    def clear(self) -> None:
+        self.log.clear()
+
+
+def _is_snapshot(event: dict[str, Any]) -> bool:
+    return str(event.get("op", "snapshot")) != "delta"
+
+
+def _apply_list(old: list[str], added: list[str], removed: list[str]) -> list[str]:
+    gone = set(removed)
+    return [x for x in old if x not in gone] + added
+
+
+def _delta(prev: SelfState, new: SelfState) -> dict[str, Any]:
+    """Дельта-событие, переводящее `prev` в `new`."""
+    event: dict[str, Any] = {"op": "delta", "timestamp": new.timestamp}
+    for name in ("goals", "tags"):
+        old, cur = getattr(prev, name), getattr(new, name)
+        if old == cur:
+            continue
+        added = [x for x in cur if x not in old]
+        removed = [x for x in old if x not in cur]
+        if _apply_list(old, added, removed) == cur:
+            if added:
+                event[f"{name}+"] = added
+            if removed:
+                event[f"{name}-"] = removed
+        else:
+            event[name] = cur
+    changed = {k: v for k, v in new.emotions.items() if prev.emotions.get(k) != v}
+    if changed:
+        event["emotions"] = changed
+    dropped = [k for k in prev.emotions if k not in new.emotions]
+    if dropped:
+        event["emotions-"] = dropped
+    if new.self_notes != prev.self_notes:
+        event["self_notes"] = new.self_notes
+    return event
+
+
+def _apply(state: SelfState | None, event: dict[str, Any]) -> SelfState:
+    """Состояние после события журнала."""
+    if _is_snapshot(event) or state is None:
+        return SelfState(**{k: v for k, v in event.items() if k != "op"})
+    data = state.model_dump()
+    data["timestamp"] = event.get("timestamp", data["timestamp"])
+    for name in ("goals", "tags"):
+        if name in event:
+            data[name] = list(event[name])
+        else:
+            data[name] = _apply_list(
+                data[name], event.get(f"{name}+", []), event.get(f"{name}-", [])
+            )
+    gone = set(event.get("emotions-", []))
+    emotions = {k: v for k, v in data["emotions"].items() if k not in gone}
+    emotions.update(event.get("emotions", {}))
+    data["emotions"] = emotions
+    data["self_notes"] = event.get("self_notes", data["self_notes"])
+    return SelfState(**data)
 
 
 @singleton
 class SelfModelComponent:
     """Ядро субъективности: фиксация состояний, целей, эмоций, тегов.
 
-    Хранение: JSONL (`local_data/self_model/mental_states.jsonl`).
+    Хранение: JSONL (`local_data/self_model/mental_states.jsonl`), снимки и
+    дельты (см. `_SelfModelStorage`). Текущее состояние держится в памяти и
+    догоняет строки, дописанные другими процессами.
+
+    Цели состояния проходят через `GoalSet`: их не больше
+    `self_model.max_goals`, порядок — по оценке (свежесть, повторы, статус
+    гипотезы), дубли сливаются по эмбеддингам.
     """
 
     @inject
-    def __init__(self, settings: Settings) -> None:
+    def __init__(
+        self, settings: Settings, embedding_component: EmbeddingComponent
+    ) -> None:
         self._settings = settings
         self._storage = _SelfModelStorage()
         self._storage.ensure()
+        cfg = settings.self_model
+        model = embedding_component.embedding_model
+        self._goals = GoalSet(
+            _GOALS_FILE,
+            max_goals=cfg.max_goals,
+            half_life_days=cfg.goal_half_life_days,
+            dedupe_threshold=cfg.goal_dedupe_threshold,
+            embed=lambda texts: model.get_text_embedding_batch(texts),
+        )
+        self._goals.load()
+        self._lock = threading.RLock()
+        self._current: SelfState | None = None
+        self._applied = 0
+        self._since_snapshot = 0
+        self._generation = self._storage.generation
+        self._catch_up()
+        if not len(self._goals) and self._current and self._current.goals:
+            # журнал старше набора целей: засеять его целями текущего состояния
+            self._goals.replace(self._current.goals)
         logger.info("SelfModel storage at %s", self._storage.file_path)
 
     def record_state(self, state: SelfState) -> SelfState:
-        """Сохранить состояние и вернуть его обратно."""
-        self._storage.append(state.model_dump())
+        """Сохранить состояние и вернуть его обратно.
+
+        Цели сверх `GoalSet` и дубли отбрасываются.
+        """
+        with self._lock:
+            self._catch_up()
+            current = self._current.goals if self._current else []
+            if state.goals != current or len(state.goals) > self._goals.max_goals > 0:
+                kept = {normalize(t) for t in self._goals.replace(state.goals)}
+                state.goals = [g for g in state.goals if normalize(g) in kept]
+            every = self._storage.snapshot_every
+            if self._current is None or self._since_snapshot + 1 >= every:
+                self._storage.append({"op": "snapshot", **state.model_dump()})
+            else:
+                self._storage.append(_delta(self._current, state))
+            self._catch_up()
         logger.info("SelfModel: state recorded at %s", state.timestamp)
         return state
 
     def get_current_state(self) -> SelfState | None:
         """Вернуть последнее зафиксированное состояние или None."""
-        last = self._storage.read_last()
-        return SelfState(**last) if last else None
+        with self._lock:
+            self._catch_up()
+            return self._current.model_copy(deep=True) if self._current else None
 
     def history(self, limit: int = 50) -> list[SelfState]:
-        """Вернуть последние N состояний (по умолчанию 50)."""
-        items: list[SelfState] = []
-        for rec in self._storage.iter_all():
-            items.append(SelfState(**rec))
-        return items[-limit:]
+        """Вернуть последние N состояний (по умолчанию 50).
+
+        Каждое восстанавливается от ближайшего снимка.
+        """
+        return self.page(limit)[0] if limit > 0 else []
+
+    def page(
+        self,
+        limit: int = 50,
+        *,
+        before: int | None = None,
+        since: datetime | None = None,
+        until: datetime | None = None,
+        tags: list[str] | None = None,
+    ) -> tuple[list[SelfState], int | None]:
+        """Страница истории: последние `limit` состояний до позиции `before`.
+
+        Состояния — старые первыми; `tags` — все ярлыки, `since`/`until` —
+        время фиксации. Второе значение — позиция для следующей (более
+        старой) страницы или None, если дальше ничего нет.
+        """
+        wanted = set(tags or ())
+
+        def match(state: SelfState) -> bool:
+            in_tags = wanted <= set(state.tags)
+            return in_tags and in_window(state.timestamp, since, until)
+
+        with self._lock:
+            window = max(limit, self._storage.snapshot_every)
+            return take_page(self._states_back(before, window), limit, match)
+
+    def version(self) -> tuple[int, int]:
+        """(поколение журнала, число событий) — меняется при записи или очистке."""
+        return self._storage.generation, len(self._storage)
+
+    def merge_goals(
+        self, new_goals: list[str], statuses: dict[str, str] | None = None
+    ) -> list[str]:
+        """Учесть упоминание целей и статусы гипотез (заголовок → статус).
+
+        Вернуть цели для состояния.
+        """
+        with self._lock:
+            self._goals.mention(new_goals)
+            return self._goals.apply_statuses(statuses or {})
 
     def clear(self) -> None:
         """Очистить хранилище (аккуратно!)."""
-        self._storage.file_path.unlink(missing_ok=True)
-        self._storage.ensure()
+        with self._lock:
+            self._storage.clear()
+            self._goals.clear()
+            self._catch_up()
         logger.warning("SelfModel: storage cleared")
 
-
-
-
-
-
-
-
-
-
-
-
-
-
+    def _states_back(
+        self, stop: int | None, window: int
+    ) -> Iterator[tuple[int, SelfState]]:
+        """Состояния до позиции `stop`, новые первыми.
+
+        Каждое окно восстанавливается от ближайшего снимка.
+        """
+        stop = len(self._storage) if stop is None else min(stop, len(self._storage))
+        while stop > 0:
+            first = max(0, stop - window)
+            state: SelfState | None = None
+            chunk: list[tuple[int, SelfState]] = []
+            origin = self._storage.last_snapshot(first)
+            for pos, ev in self._storage.scan(origin, stop):
+                state = _apply(state, ev)
+                if pos >= first:
+                    chunk.append((pos, state))
+            yield from reversed(chunk)
+            stop = first
+
+    def _catch_up(self) -> None:
+        """Применить события, дописанные с прошлого раза (и другими процессами)."""
+        generation = self._storage.generation
+        total = len(self._storage)
+        if generation != self._generation or total < self._applied:
+            self._generation = generation
+            self._current, self._applied = None, 0
+        if total <= self._applied:
+            return
+        start = self._applied
+        if self._current is None and total > 0:
+            start = self._storage.last_snapshot(total - 1)
+        for ev in self._storage.read_range(start, total):
+            self._current = _apply(self._current, ev)
+            self._since_snapshot = 0 if _is_snapshot(ev) else self._since_snapshot + 1
+        self._applied = total
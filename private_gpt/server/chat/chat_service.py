@@ -1,3 +1,4 @@
+import weakref
 from dataclasses import dataclass
 from typing import TYPE_CHECKING, Any, Iterable
 
@@ -15,13 +16,13 @@ import logging
 
 from private_gpt.components.embedding.embedding_component import EmbeddingComponent
 from private_gpt.components.llm.llm_component import LLMComponent
+from private_gpt.components.llm.llm_gate import LLMGate
 from private_gpt.components.node_store.node_store_component import NodeStoreComponent
 from private_gpt.components.vector_store.vector_store_component import VectorStoreComponent
 from private_gpt.open_ai.extensions.context_filter import ContextFilter
 from private_gpt.server.chunks.chunks_service import Chunk
 from private_gpt.settings.settings import Settings
-from private_gpt.components.reflection.reflection_component import ReflectionComponent
-from private_gpt.components.hypothesis.hypothesis_component import HypothesisComponent
+from private_gpt.components.introspection.introspection_queue import IntrospectionQueue, Turn
 
 if TYPE_CHECKING:
     from llama_index.core.postprocessor.types import BaseNodePostprocessor
@@ -71,15 +72,15 @@ class ChatService:
         vector_store_component: VectorStoreComponent,
         embedding_component: EmbeddingComponent,
         node_store_component: NodeStoreComponent,
-        reflection_component: ReflectionComponent,
-        hypothesis_component: HypothesisComponent,
+        introspection: IntrospectionQueue,
+        llm_gate: LLMGate,
     ) -> None:
         self.settings = settings
         self.llm_component = llm_component
         self.embedding_component = embedding_component
         self.vector_store_component = vector_store_component
-        self.reflection = reflection_component
-        self.hypothesis = hypothesis_component
+        self.introspection = introspection
+        self.llm_gate = llm_gate
         self.storage_context = StorageContext.from_defaults(
             vector_store=vector_store_component.vector_store,
             docstore=node_store_component.doc_store,
@@ -145,7 +146,7 @@ class ChatService:
             )
         return out
 
-    def _reflect_async_safe(
+    def _introspect(
         self,
         *,
         system_prompt: str | None,
@@ -153,17 +154,26 @@ class ChatService:
         chat_history: list[ChatMessage] | None,
         assistant_response: str,
         sources: list[dict[str, Any]] | None,
+        use_context: bool,
     ) -> None:
+        """Поставить ход в очередь рефлексии/авто-гипотезы; ответ её не ждёт."""
         try:
-            self.reflection.reflect(
-                system_prompt=system_prompt,
-                last_user_message=last_user_message or "",
-                chat_history=chat_history or [],
-                assistant_response=assistant_response or "",
-                sources=sources,
+            self.introspection.submit(
+                Turn(
+                    system_prompt=system_prompt,
+                    last_user_message=last_user_message or "",
+                    chat_history=[
+                        {"role": m.role.value, "content": str(m.content)}
+                        for m in chat_history or []
+                        if m.content
+                    ],
+                    assistant_response=assistant_response or "",
+                    sources=sources,
+                    use_context=use_context,
+                )
             )
         except Exception as e:  # noqa: BLE001
-            logger.error("Reflection failed: %s", e)
+            logger.error("Introspection enqueue failed: %s", e)
 
     def stream_chat(
         self,
@@ -177,9 +187,15 @@ class ChatService:
         chat_history = chat_engine_input.chat_history if chat_engine_input.chat_history else None
 
         chat_engine = self._chat_engine(system_prompt=system_prompt, use_context=use_context, context_filter=context_filter)
-        streaming_response = chat_engine.stream_chat(
-            message=last_message_text if last_message_text is not None else "", chat_history=chat_history
-        )
+        # запрос пользователя держит LLMGate до конца стрима: фоновые задачи LLM ждут
+        release_llm = self.llm_gate.enter_user()
+        try:
+            streaming_response = chat_engine.stream_chat(
+                message=last_message_text if last_message_text is not None else "", chat_history=chat_history
+            )
+        except BaseException:
+            release_llm()
+            raise
         sources_chunks = [Chunk.from_node(n) for n in streaming_response.source_nodes]
         sources = self._chunks_to_sources(sources_chunks)
 
@@ -188,48 +204,40 @@ class ChatService:
 
         def wrapped() -> TokenGen:
             full: str = ""
-            for token in token_gen:
-                # накапливаем текст, но отдаём токены как есть
-                try:
-                    if isinstance(token, str):
-                        full += token
-                    else:
-                        delta = getattr(token, "delta", None)
-                        if delta:
-                            full += str(delta)
+            try:
+                for token in token_gen:
+                    # накапливаем текст, но отдаём токены как есть
+                    try:
+                        if isinstance(token, str):
+                            full += token
                         else:
-                            msg = getattr(token, "message", None)
-                            if msg and getattr(msg, "content", None):
-                                full += str(msg.content)
-                except Exception:  # noqa: BLE001
-                    pass
-                yield token
-            # по окончании стрима — рефлексия
-            self._reflect_async_safe(
+                            delta = getattr(token, "delta", None)
+                            if delta:
+                                full += str(delta)
+                            else:
+                                msg = getattr(token, "message", None)
+                                if msg and getattr(msg, "content", None):
+                                    full += str(msg.content)
+                    except Exception:  # noqa: BLE001
+                        pass
+                    yield token
+            finally:
+                release_llm()
+            # по окончании стрима — рефлексия и авто-гипотеза (в фоне)
+            self._introspect(
                 system_prompt=system_prompt,
                 last_user_message=last_message_text or "",
                 chat_history=chat_history or [],
                 assistant_response=full,
                 sources=sources,
+                use_context=use_context,
             )
 
-            # авто-гипотеза при низкой уверенности
-            try:
-                if getattr(self.settings, "hypothesis", None) and self.settings.hypothesis.auto_generate:
-                    threshold = float(self.settings.hypothesis.auto_threshold)
-                    refl_last = self.reflection.latest()  # type: ignore[attr-defined]
-                    if refl_last and refl_last.confidence < threshold:
-                        self.hypothesis.generate(
-                            last_user_message=last_message_text or "",
-                            assistant_response=full,
-                            reflection=refl_last,  # type: ignore[arg-type]
-                            top_memory_limit=5,
-                            tags=["auto"],
-                        )
-            except Exception as e:
-                logger.error("Auto-hypothesis failed: %s", e)
-
-        completion_gen = CompletionGen(response=wrapped(), sources=sources_chunks)
+        response_gen = wrapped()
+        # стрим, который так и не начали читать (клиент ушёл до первого токена),
+        # не дойдёт до finally в wrapped(): слот отпускается при сборке генератора
+        weakref.finalize(response_gen, release_llm)
+        completion_gen = CompletionGen(response=response_gen, sources=sources_chunks)
         return completion_gen
 
     def chat(
@@ -244,38 +252,21 @@ class ChatService:
         chat_history = chat_engine_input.chat_history if chat_engine_input.chat_history else None
 
         chat_engine = self._chat_engine(system_prompt=system_prompt, use_context=use_context, context_filter=context_filter)
-        wrapped_response = chat_engine.chat(message=last_message_text if last_message_text is not None else "", chat_history=chat_history)
+        with self.llm_gate.user():
+            wrapped_response = chat_engine.chat(message=last_message_text if last_message_text is not None else "", chat_history=chat_history)
         sources_chunks = [Chunk.from_node(node) for node in wrapped_response.source_nodes]
         sources = self._chunks_to_sources(sources_chunks)
         completion_text = wrapped_response.response
 
-        # Синхронная рефлексия
-        self._reflect_async_safe(
+        # рефлексия и авто-гипотеза — в фоновой очереди
+        self._introspect(
             system_prompt=system_prompt,
             last_user_message=last_message_text or "",
             chat_history=chat_history or [],
             assistant_response=completion_text or "",
             sources=sources,
+            use_context=use_context,
         )
 
-        # --- авто-гипотеза, если включено и низкая уверенность ---
-        try:
-            if getattr(self.settings, "hypothesis", None) and self.settings.hypothesis.auto_generate:
-                threshold = float(self.settings.hypothesis.auto_threshold)
-                # последняя рефлексия уже сохранена ReflectionComponent-ом;
-                # достанем её напрямую:
-                from private_gpt.components.reflection.reflection_component import ReflectionComponent as RC
-                refl_last = self.reflection.latest()  # type: ignore[attr-defined]
-                if refl_last and refl_last.confidence < threshold:
-                    self.hypothesis.generate(
-                        last_user_message=last_message_text or "",
-                        assistant_response=completion_text or "",
-                        reflection=refl_last,  # type: ignore[arg-type]
-                        top_memory_limit=5,
-                        tags=["auto"],
-                    )
-        except Exception as e:
-            logger.error("Auto-hypothesis failed: %s", e)
-
         completion = Completion(response=completion_text, sources=sources_chunks)
         return completion
@@ -1,4 +1,4 @@
-from typing import Literal
+from typing import Any, Literal
 
 from fastapi import APIRouter, Depends, Request
 from pydantic import BaseModel
@@ -33,3 +33,10 @@ def embeddings_generation(request: Request, body: EmbeddingsBody) -> EmbeddingsR
     input_texts = body.input if isinstance(body.input, list) else [body.input]
     embeddings = service.texts_embeddings(input_texts)
     return EmbeddingsResponse(object="list", model="private-gpt", data=embeddings)
+
+
+@embeddings_router.get("/embeddings/cache", tags=["Embeddings"])
+def embeddings_cache_stats(request: Request) -> dict[str, Any]:
+    """Hit/miss counters and size of the shared embedding cache."""
+    service: EmbeddingsService = request.state.injector.get(EmbeddingsService)
+    return service.cache_stats()
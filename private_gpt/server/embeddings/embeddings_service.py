@@ -1,4 +1,4 @@
-from typing import Literal
+from typing import Any, Literal
 
 from injector import inject, singleton
 from pydantic import BaseModel, Field
@@ -16,8 +16,12 @@ class Embedding(BaseModel):
 class EmbeddingsService:
     @inject
     def __init__(self, embedding_component: EmbeddingComponent) -> None:
+        self.embedding_component = embedding_component
         self.embedding_model = embedding_component.embedding_model
 
+    def cache_stats(self) -> dict[str, Any]:
+        return self.embedding_component.cache_stats()
+
     def texts_embeddings(self, texts: list[str]) -> list[Embedding]:
         texts_embeddings = self.embedding_model.get_text_embedding_batch(texts)
         return [
@@ -1,9 +1,13 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends, Request, Query
+from datetime import datetime
+from typing import Any
+
+from fastapi import APIRouter, Depends, Request, Query, Response
 from pydantic import BaseModel, Field
 
 from private_gpt.server.utils.auth import authenticated
+from private_gpt.server.utils.paging import paged
 from private_gpt.components.hypothesis.hypothesis_component import HypothesisComponent, Hypothesis
 from private_gpt.components.reflection.reflection_component import ReflectionRecord
 
@@ -36,9 +40,27 @@ def generate(request: Request, body: GenerateBody) -> Hypothesis:
 
 
 @hypothesis_router.get("/list", response_model=list[Hypothesis])
-def list_items(request: Request, limit: int = Query(100, ge=1, le=1000)) -> list[Hypothesis]:
+def list_items(
+    request: Request,
+    response: Response,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: str | None = Query(None, description="`X-Next-Cursor` header of the previous page"),
+    status: list[str] | None = Query(None, description="Only these statuses (any of)"),
+    tags: list[str] | None = Query(None, description="Only hypotheses carrying all of these tags"),
+    since: datetime | None = Query(None),
+    until: datetime | None = Query(None),
+) -> list[Hypothesis] | Response:
     h = request.state.injector.get(HypothesisComponent)
-    return h.list(limit=limit)
+    return paged(
+        request,
+        response,
+        scope="hypothesis",
+        version=h.version(),
+        cursor=cursor,
+        fetch=lambda before: h.page(
+            limit, before=before, status=status, tags=tags, since=since, until=until
+        ),
+    )
 
 
 @hypothesis_router.post("/update_status", response_model=Hypothesis | None)
@@ -47,6 +69,12 @@ def update_status(request: Request, body: UpdateStatusBody) -> Hypothesis | None
     return h.update_status(hyp_id=body.id, status=body.status)
 
 
+@hypothesis_router.get("/stats")
+def stats(request: Request) -> dict[str, Any]:
+    h: HypothesisComponent = request.state.injector.get(HypothesisComponent)
+    return {**h.stats(), "cache": h.cache_stats()}
+
+
 @hypothesis_router.post("/clear")
 def clear_all(request: Request) -> dict:
     h = request.state.injector.get(HypothesisComponent)
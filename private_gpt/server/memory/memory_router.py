@@ -1,9 +1,12 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends, Query, Request
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, Query, Request, Response
 from pydantic import BaseModel, Field
 
 from private_gpt.server.utils.auth import authenticated
+from private_gpt.server.utils.paging import paged
 from private_gpt.components.memory.memory_component import MemoryComponent, MemoryItem
 
 memory_router = APIRouter(prefix="/v1/memory", tags=["Memory"], dependencies=[Depends(authenticated)])
@@ -17,10 +20,19 @@ class AddBody(BaseModel):
     embed: bool = True
 
 
+class AddManyBody(BaseModel):
+    items: list[AddBody] = Field(max_length=1000)
+    embed: bool = True
+
+
 class SearchBody(BaseModel):
     query: str
     top_k: int = Field(5, ge=1, le=50)
     decay_half_life_days: float = Field(30.0, ge=0.1, le=3650.0)
+    since: datetime | None = None
+    until: datetime | None = None
+    kinds: list[str] | None = Field(None, description="Only these kinds (any of)")
+    tags: list[str] | None = Field(None, description="Only items carrying all of these tags")
 
 
 @memory_router.post("/add", response_model=MemoryItem)
@@ -29,19 +41,56 @@ def add_item(request: Request, body: AddBody) -> MemoryItem:
     return m.add(text=body.text, kind=body.kind, importance=body.importance, tags=body.tags, embed=body.embed)
 
 
+@memory_router.post("/add_many", response_model=list[MemoryItem])
+def add_items(request: Request, body: AddManyBody) -> list[MemoryItem]:
+    m: MemoryComponent = request.state.injector.get(MemoryComponent)
+    items = [MemoryItem(text=b.text, kind=b.kind, importance=b.importance, tags=b.tags) for b in body.items]
+    return m.add_many(items, embed=body.embed)
+
+
 @memory_router.get("/list", response_model=list[MemoryItem])
-def list_items(request: Request, limit: int = Query(100, ge=1, le=1000)) -> list[MemoryItem]:
+def list_items(
+    request: Request,
+    response: Response,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: str | None = Query(None, description="`X-Next-Cursor` header of the previous page"),
+    kinds: list[str] | None = Query(None),
+    tags: list[str] | None = Query(None),
+    since: datetime | None = Query(None),
+    until: datetime | None = Query(None),
+) -> list[MemoryItem] | Response:
     m = request.state.injector.get(MemoryComponent)
-    return m.list(limit=limit)
+    return paged(
+        request,
+        response,
+        scope="memory",
+        version=m.version(),
+        cursor=cursor,
+        fetch=lambda before: m.page(limit, before=before, kinds=kinds, tags=tags, since=since, until=until),
+    )
 
 
 @memory_router.post("/search")
 def search_items(request: Request, body: SearchBody) -> list[dict]:
     m = request.state.injector.get(MemoryComponent)
-    res = m.search(query=body.query, top_k=body.top_k, decay_half_life_days=body.decay_half_life_days)
+    res = m.search(
+        query=body.query,
+        top_k=body.top_k,
+        decay_half_life_days=body.decay_half_life_days,
+        since=body.since,
+        until=body.until,
+        kinds=body.kinds,
+        tags=body.tags,
+    )
     return [{"item": it.model_dump(), "score": round(score, 4)} for it, score in res]
 
 
+@memory_router.post("/consolidate")
+def consolidate_memory(request: Request) -> dict[str, int]:
+    m: MemoryComponent = request.state.injector.get(MemoryComponent)
+    return m.consolidate()
+
+
 @memory_router.post("/clear")
 def clear_memory(request: Request) -> dict:
     m = request.state.injector.get(MemoryComponent)
@@ -1,7 +1,11 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends, Query, Request
+from datetime import datetime
+from typing import Any
+
+from fastapi import APIRouter, Depends, Query, Request, Response
 from private_gpt.server.utils.auth import authenticated
+from private_gpt.server.utils.paging import paged
 
 from private_gpt.components.reflection.reflection_component import ReflectionRecord
 from private_gpt.server.reflection.reflection_service import ReflectionService
@@ -16,9 +20,32 @@ def get_latest(request: Request) -> ReflectionRecord | None:
 
 
 @reflection_router.get("/history", response_model=list[ReflectionRecord])
-def get_history(request: Request, limit: int = Query(50, ge=1, le=1000)) -> list[ReflectionRecord]:
+def get_history(
+    request: Request,
+    response: Response,
+    limit: int = Query(50, ge=1, le=1000),
+    cursor: str | None = Query(None, description="`X-Next-Cursor` header of the previous page"),
+    since: datetime | None = Query(None),
+    until: datetime | None = Query(None),
+    max_confidence: float | None = Query(None, ge=0.0, le=1.0),
+) -> list[ReflectionRecord] | Response:
     service = request.state.injector.get(ReflectionService)
-    return service.history(limit=limit)
+    return paged(
+        request,
+        response,
+        scope="reflection",
+        version=service.version(),
+        cursor=cursor,
+        fetch=lambda before: service.page(
+            limit, before=before, since=since, until=until, max_confidence=max_confidence
+        ),
+    )
+
+
+@reflection_router.get("/stats")
+def get_stats(request: Request) -> dict[str, Any]:
+    service: ReflectionService = request.state.injector.get(ReflectionService)
+    return service.stats()
 
 
 @reflection_router.post("/clear")
@@ -1,15 +1,27 @@
 from __future__ import annotations
 
+from datetime import datetime
+from typing import Any
+
 from injector import inject, singleton
 
+from private_gpt.components.introspection.introspection_queue import IntrospectionQueue
+from private_gpt.components.introspection.reflection_scheduler import ReflectionScheduler
 from private_gpt.components.reflection.reflection_component import ReflectionComponent, ReflectionRecord
 
 
 @singleton
 class ReflectionService:
     @inject
-    def __init__(self, reflection: ReflectionComponent) -> None:
+    def __init__(
+        self,
+        reflection: ReflectionComponent,
+        scheduler: ReflectionScheduler,
+        queue: IntrospectionQueue,
+    ) -> None:
         self._reflection = reflection
+        self._scheduler = scheduler
+        self._queue = queue
 
     def latest(self) -> ReflectionRecord | None:
         return self._reflection.latest()
@@ -17,5 +29,28 @@ class ReflectionService:
     def history(self, limit: int = 50) -> list[ReflectionRecord]:
         return self._reflection.history(limit=limit)
 
+    def page(
+        self,
+        limit: int = 50,
+        *,
+        before: int | None = None,
+        since: datetime | None = None,
+        until: datetime | None = None,
+        max_confidence: float | None = None,
+    ) -> tuple[list[ReflectionRecord], int | None]:
+        return self._reflection.page(
+            limit, before=before, since=since, until=until, max_confidence=max_confidence
+        )
+
+    def version(self) -> tuple[int, int]:
+        return self._reflection.version()
+
     def clear(self) -> None:
         self._reflection.clear()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "scheduler": self._scheduler.stats(),
+            "queue": self._queue.stats(),
+            "cache": self._reflection.cache_stats(),
+        }
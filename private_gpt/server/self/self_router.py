@@ -1,11 +1,14 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends, Request, Query
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, Request, Query, Response
 from pydantic import BaseModel
 
 from private_gpt.components.self_model.self_model_component import SelfState
 from private_gpt.server.self.self_service import SelfService
 from private_gpt.server.utils.auth import authenticated
+from private_gpt.server.utils.paging import paged
 
 self_router = APIRouter(prefix="/v1/self", tags=["SelfModel"], dependencies=[Depends(authenticated)])
 
@@ -24,9 +27,24 @@ def get_current(request: Request) -> SelfState | None:
 
 
 @self_router.get("/history", response_model=list[SelfState])
-def get_history(request: Request, limit: int = Query(50, ge=1, le=1000)) -> list[SelfState]:
+def get_history(
+    request: Request,
+    response: Response,
+    limit: int = Query(50, ge=1, le=1000),
+    cursor: str | None = Query(None, description="`X-Next-Cursor` header of the previous page"),
+    since: datetime | None = Query(None),
+    until: datetime | None = Query(None),
+    tags: list[str] | None = Query(None),
+) -> list[SelfState] | Response:
     service = request.state.injector.get(SelfService)
-    return service.history(limit=limit)
+    return paged(
+        request,
+        response,
+        scope="self",
+        version=service.version(),
+        cursor=cursor,
+        fetch=lambda before: service.page(limit, before=before, since=since, until=until, tags=tags),
+    )
 
 
 @self_router.post("/record", response_model=SelfState)
@@ -1,6 +1,8 @@
 from __future__ import annotations
 
 import logging
+from datetime import datetime
+
 from injector import inject, singleton
 
 from private_gpt.components.self_model.self_model_component import (
@@ -28,5 +30,19 @@ class SelfService:
     def history(self, limit: int = 50) -> list[SelfState]:
         return self._self_model.history(limit=limit)
 
+    def page(
+        self,
+        limit: int = 50,
+        *,
+        before: int | None = None,
+        since: datetime | None = None,
+        until: datetime | None = None,
+        tags: list[str] | None = None,
+    ) -> tuple[list[SelfState], int | None]:
+        return self._self_model.page(limit, before=before, since=since, until=until, tags=tags)
+
+    def version(self) -> tuple[int, int]:
+        return self._self_model.version()
+
     def clear(self) -> None:
         self._self_model.clear()
@@ -0,0 +1,54 @@
+"""Cursor pagination and conditional GET for the introspection list routes.
+
+The page travels in the body as before (a plain JSON list); the cursor of the
+next, older page is returned in the `X-Next-Cursor` header and passed back as
+the `cursor` query parameter. Every response carries an `ETag` derived from
+the store version and the query, so a poll with a matching `If-None-Match`
+gets `304 Not Modified` before the store is read.
+"""
+
+from collections.abc import Callable
+from typing import Any, TypeVar
+
+from fastapi import HTTPException, Request, Response
+
+from private_gpt.utils.pagination import (
+    CursorError,
+    decode_cursor,
+    encode_cursor,
+    etag_matches,
+    make_etag,
+)
+
+T = TypeVar("T")
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def paged(
+    request: Request,
+    response: Response,
+    *,
+    scope: str,
+    version: tuple[Any, Any],
+    cursor: str | None,
+    fetch: Callable[[int | None], tuple[list[T], int | None]],
+) -> list[T] | Response:
+    """Answer a list route: 304 if unchanged, otherwise `fetch(before)` with paging headers.
+
+    `version` is `(generation, revision)` of the store: cursors are bound to
+    the generation, the ETag to both.
+    """
+    generation = version[0]
+    etag = make_etag(scope, version, sorted(request.query_params.multi_items()))
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    try:
+        before = decode_cursor(cursor, scope, generation) if cursor else None
+    except CursorError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    items, next_position = fetch(before)
+    response.headers["ETag"] = etag
+    if next_position is not None:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(scope, generation, next_position)
+    return items
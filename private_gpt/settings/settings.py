@@ -240,6 +240,17 @@ class EmbeddingSettings(BaseModel):
         384,
         description="The dimension of the embeddings stored in the Postgres database",
     )
+    cache_max_mb: int = Field(
+        64,
+        description=(
+            "Size in MB of the process-wide LRU cache of query and text embeddings, "
+            "shared by memory search, chunk retrieval and chat. 0 disables the cache."
+        ),
+    )
+    cache_persist: bool = Field(
+        False,
+        description="If set to True, the embedding cache is saved to `local_data` on exit and reloaded on start.",
+    )
 
 
 class SagemakerSettings(BaseModel):
@@ -418,6 +429,337 @@ class SummarizeSettings(BaseModel):
     )
 
 
+class MemorySettings(BaseModel):
+    search_mode: Literal["exact", "ann"] = Field(
+        "exact",
+        description=(
+            "How agent memory search finds candidates:\n"
+            "If `exact` - score every stored memory (brute force, exact results).\n"
+            "If `ann` - use an IVF index to pick candidate memories, then re-score them "
+            "exactly with importance and decay. Faster for large memories, "
+            "may miss some results."
+        ),
+    )
+    ann_min_items: int = Field(
+        5000,
+        description="Below this number of memories the IVF index is not built and exact search is used.",
+    )
+    ann_nlist: int = Field(
+        0,
+        description="Number of IVF clusters. If 0, it is derived from the memory size (~sqrt(N)).",
+    )
+    ann_nprobe: int = Field(
+        8,
+        description=(
+            "Number of IVF clusters probed per query. "
+            "This is the recall/latency knob: higher means better recall and slower search."
+        ),
+    )
+    embed_async: bool = Field(
+        True,
+        description=(
+            "If set to True, memory embeddings are computed by a background queue and "
+            "`add` returns immediately. Items not embedded yet are found lexically by search."
+        ),
+    )
+    embed_batch_size: int = Field(
+        32,
+        description="Maximum number of memory texts sent in one `get_text_embedding_batch` call.",
+    )
+    embed_max_latency_ms: int = Field(
+        50,
+        description="Maximum time a queued memory waits for its batch to fill before being embedded.",
+    )
+    lexical_weight: float = Field(
+        0.3,
+        ge=0.0,
+        le=1.0,
+        description=(
+            "Weight of the BM25 (keyword) score in hybrid memory search; "
+            "the vector similarity gets the rest. 0 disables the lexical part "
+            "for embedded memories."
+        ),
+    )
+    lexical_only_max_terms: int = Field(
+        2,
+        description=(
+            "Queries with at most this many words are first answered by BM25 alone, "
+            "skipping the query embedding when that yields `top_k` results. 0 disables it."
+        ),
+    )
+    consolidate_interval_s: int = Field(
+        600,
+        description=(
+            "How often (seconds) the background consolidation job runs: it merges "
+            "near-duplicate new memories and archives memories whose decayed score "
+            "fell below `evict_below`. 0 disables the background job."
+        ),
+    )
+    consolidate_threshold: float = Field(
+        0.95,
+        description="Cosine similarity at or above which two memories of the same kind are merged.",
+    )
+    consolidate_kinds: list[str] = Field(
+        default_factory=list,
+        description="Memory kinds that may be merged. Empty means all kinds.",
+    )
+    evict_below: float = Field(
+        0.01,
+        description=(
+            "Memories whose `(0.2 + 0.8 * importance) * decay` drops below this value are "
+            "moved to `memory.archive.jsonl`. 0 disables eviction."
+        ),
+    )
+    evict_half_life_days: float = Field(
+        30.0,
+        description="Decay half-life used to compute the eviction score.",
+    )
+    tier_hot_max_items: int = Field(
+        0,
+        description=(
+            "Maximum number of memory vectors kept in RAM. Above it, the least relevant "
+            "memories (by decayed importance and search hits) are moved to int8 "
+            "memory-mapped segments on disk. 0 keeps everything in RAM. "
+            "Ignored when `search_mode` is `ann`."
+        ),
+    )
+    tier_cold_score_floor: float = Field(
+        0.25,
+        description=(
+            "Cold (on-disk) memories are scanned only when the k-th best in-RAM score "
+            "is below this value, and only those that could still beat it."
+        ),
+    )
+    tier_promote_hits: int = Field(
+        3,
+        description="A cold memory returned this many times by search is moved back to RAM.",
+    )
+    tier_codec: Literal["int8", "pq"] = Field(
+        "int8",
+        description=(
+            "How cold memory vectors are compressed:\n"
+            "If `int8` - per-row scalar quantization (dim bytes per memory).\n"
+            "If `pq` - product quantization with `pq_bytes` bytes per memory, trained once "
+            "from the stored embeddings; similarity is computed with asymmetric distance "
+            "(ADC) against the codes."
+        ),
+    )
+    pq_bytes: int = Field(
+        16,
+        ge=8,
+        le=32,
+        description="Bytes per memory for `pq` codes (number of sub-quantizers).",
+    )
+    tier_rerank: int = Field(
+        0,
+        description=(
+            "Number of best cold candidates re-scored with their exact float32 vectors "
+            "read from disk. 0 ranks cold memories by their compressed codes only."
+        ),
+    )
+
+
+class HypothesisSettings(BaseModel):
+    auto_generate: bool = Field(
+        False,
+        description="Generate a hypothesis after a chat turn whose reflection has low confidence.",
+    )
+    auto_threshold: float = Field(
+        0.5,
+        description="Reflection confidence below which a hypothesis is auto-generated.",
+    )
+    cache_ttl_s: float = Field(
+        86400.0,
+        description=(
+            "How long (seconds) a generated hypothesis is reused for an identical turn, "
+            "reflection and memory context instead of calling the LLM again. 0 disables the cache."
+        ),
+    )
+    cache_max_items: int = Field(
+        1024,
+        description="Maximum number of cached hypothesis results (least recently used are evicted).",
+    )
+    context_tokens: int = Field(
+        600,
+        description=(
+            "Token budget (estimated) of the memories given to the hypothesis prompt. Memories "
+            "are ranked by relevance to the chat turn, importance and recency."
+        ),
+    )
+    dedupe_threshold: float = Field(
+        0.9,
+        description=(
+            "Cosine similarity of the user message to the one an open (pending or in_progress) "
+            "hypothesis was derived from, above which that hypothesis is returned again instead "
+            "of calling the LLM. Also used to merge a freshly generated hypothesis into an open "
+            "one with a near-identical title and rationale. 0 disables deduplication."
+        ),
+    )
+
+
+class ReflectionSettings(BaseModel):
+    triggers: list[Literal["long_answer", "no_sources", "correction"]] = Field(
+        ["long_answer", "no_sources", "correction"],
+        description=(
+            "Chat turns that are always reflected on (within the budgets):\n"
+            "`long_answer` - the answer is longer than `long_answer_chars`.\n"
+            "`no_sources` - a RAG turn (`use_context`) that retrieved no sources.\n"
+            "`correction` - the user message looks like a correction of the previous answer."
+        ),
+    )
+    sample_rate: float = Field(
+        1.0,
+        ge=0.0,
+        le=1.0,
+        description="Probability of reflecting on a turn that matched no trigger. 1 reflects on every turn.",
+    )
+    long_answer_chars: int = Field(
+        1500,
+        description="Answer length (characters) from which the `long_answer` trigger fires.",
+    )
+    calls_per_minute: int = Field(
+        0,
+        description="Maximum reflection LLM calls per minute; turns over budget are skipped. 0 is unlimited.",
+    )
+    tokens_per_minute: int = Field(
+        0,
+        description=(
+            "Maximum estimated reflection tokens (prompt + answer) per minute; turns over "
+            "budget are skipped. 0 is unlimited."
+        ),
+    )
+    cache_ttl_s: float = Field(
+        86400.0,
+        description=(
+            "How long (seconds) a reflection is reused for an identical chat turn instead of "
+            "calling the LLM again. 0 disables the cache."
+        ),
+    )
+    cache_max_items: int = Field(
+        1024,
+        description="Maximum number of cached reflection results (least recently used are evicted).",
+    )
+
+
+class IntrospectionSettings(BaseModel):
+    background: bool = Field(
+        True,
+        description=(
+            "If set to True, reflection and auto-hypothesis for a chat turn run in a "
+            "background job queue after the response is returned. If False, they run "
+            "inline and delay the response."
+        ),
+    )
+    workers: int = Field(
+        1,
+        description="Number of background introspection workers (parallel LLM calls).",
+    )
+    max_pending: int = Field(
+        64,
+        description="Maximum number of chat turns waiting for introspection.",
+    )
+    overflow: Literal["drop", "coalesce", "sample"] = Field(
+        "coalesce",
+        description=(
+            "What to do with new turns when the queue is under pressure:\n"
+            "If `drop` - reject new turns while the queue is full.\n"
+            "If `coalesce` - while the queue is full, a new turn replaces the pending turn of "
+            "the same conversation, or else the oldest pending turn is dropped.\n"
+            "If `sample` - once the queue is half full, accept new turns with a probability "
+            "that falls linearly to 0 at `max_pending`."
+        ),
+    )
+    batch_size: int = Field(
+        4,
+        description=(
+            "Maximum number of pending turns a worker reflects in one LLM call. Only turns "
+            "already waiting are batched, an idle queue never delays a turn. 1 disables batching."
+        ),
+    )
+
+
+class MonologueSettings(BaseModel):
+    enabled: bool = Field(
+        False,
+        description="If set to True, a background inner monologue periodically writes short notes to memory.",
+    )
+    interval_minutes: float = Field(
+        10,
+        description="Base interval between monologue ticks.",
+    )
+    min_interval_minutes: float = Field(
+        2,
+        description="Interval used right after a burst of new memories (see `burst_memories`).",
+    )
+    max_interval_minutes: float = Field(
+        60,
+        description=(
+            "Upper bound of the interval. Every tick that finds nothing new since the previous "
+            "one doubles the interval up to this value and skips the LLM call."
+        ),
+    )
+    burst_memories: int = Field(
+        5,
+        description="Number of new memories since the previous tick that switches to `min_interval_minutes`.",
+    )
+    top_k_memories: int = Field(
+        5,
+        description=(
+            "Maximum number of memories given to the monologue prompt, ranked by relevance to "
+            "the current goals and notes of the self-model, importance and recency."
+        ),
+    )
+    context_tokens: int = Field(
+        800,
+        description="Token budget (estimated) of the memories given to the monologue prompt.",
+    )
+    system_prompt: str | None = Field(
+        None,
+        description="System prompt of the monologue. If empty, a built-in prompt is used.",
+    )
+    quiet_s: float = Field(
+        30,
+        description=(
+            "A tick only starts when no chat request is in flight and none finished in the "
+            "last `quiet_s` seconds; until then it is deferred."
+        ),
+    )
+    max_defer_minutes: float = Field(
+        10,
+        description="A tick deferred by chat traffic for longer than this is skipped.",
+    )
+    max_llm_share: float = Field(
+        0.1,
+        gt=0.0,
+        le=1.0,
+        description=(
+            "Maximum fraction of wall time the monologue may keep the LLM busy. After a tick "
+            "of `t` seconds the next one waits at least `t * (1 / max_llm_share - 1)`."
+        ),
+    )
+
+
+class SelfModelSettings(BaseModel):
+    max_goals: int = Field(
+        8,
+        description=(
+            "Maximum number of goals kept in the self-model. Lower-scored goals are moved to "
+            "`self_model/goals.archive.jsonl`. 0 keeps every goal."
+        ),
+    )
+    goal_half_life_days: float = Field(
+        7.0,
+        description="Half-life (days) of the recency part of a goal score, counted from its last mention.",
+    )
+    goal_dedupe_threshold: float = Field(
+        0.9,
+        description=(
+            "Cosine similarity of goal embeddings from which a new goal is treated as a "
+            "repeated mention of a known one."
+        ),
+    )
+
+
 class ClickHouseSettings(BaseModel):
     host: str = Field(
         "localhost",
@@ -608,6 +950,24 @@ class Settings(BaseModel):
     nodestore: NodeStoreSettings
     rag: RagSettings
     summarize: SummarizeSettings
+    memory: MemorySettings = Field(
+        default_factory=lambda: MemorySettings.model_validate({})
+    )
+    hypothesis: HypothesisSettings = Field(
+        default_factory=lambda: HypothesisSettings.model_validate({})
+    )
+    reflection: ReflectionSettings = Field(
+        default_factory=lambda: ReflectionSettings.model_validate({})
+    )
+    introspection: IntrospectionSettings = Field(
+        default_factory=lambda: IntrospectionSettings.model_validate({})
+    )
+    monologue: MonologueSettings = Field(
+        default_factory=lambda: MonologueSettings.model_validate({})
+    )
+    self_model: SelfModelSettings = Field(
+        default_factory=lambda: SelfModelSettings.model_validate({})
+    )
     qdrant: QdrantSettings | None = None
     postgres: PostgresSettings | None = None
     clickhouse: ClickHouseSettings | None = None
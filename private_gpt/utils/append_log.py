@@ -0,0 +1,244 @@
+"""Append-only JSONL log with an in-memory tail and a byte-offset index."""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+from array import array
+from collections import deque
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+    from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+_READ_CHUNK = 1 << 20
+
+
+class AppendLog:
+    """JSONL file that is only ever appended to (or atomically rewritten).
+
+    Keeps the byte offset of every record and a bounded ring of the most recent
+    parsed records. The file tail is followed incrementally: every read first
+    picks up lines appended since the last one (by this or another writer), so
+    `latest()` is O(1) and `last(n)` is O(n) regardless of the file size.
+    """
+
+    def __init__(self, path: Path, *, ring_size: int = 1024) -> None:
+        self.path = path
+        self._ring_size = ring_size
+        self._lock = threading.RLock()
+        self._generation = 0
+        self._reset()
+
+    def _reset(self) -> None:
+        self._generation += 1
+        self._offsets = array("q")
+        self._ring: deque[dict[str, Any]] = deque(maxlen=self._ring_size)
+        self._pos = 0
+        self._file_id: tuple[int, int] | None = None
+
+    # ---------- write ----------
+    def ensure(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if not self.path.exists():
+            self.path.touch()
+
+    def append(self, record: dict[str, Any]) -> int:
+        """Append one record and return its position in the log."""
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        with self._lock:
+            # one write() per line in O_APPEND mode keeps concurrent writers from interleaving
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT | getattr(os, "O_BINARY", 0))
+            try:
+                os.write(fd, line)
+            finally:
+                os.close(fd)
+            self._follow()
+            return len(self._offsets) - 1
+
+    def append_many(self, records: Iterable[dict[str, Any]]) -> None:
+        """Append several records with a single write."""
+        data = "".join(json.dumps(rec, ensure_ascii=False) + "\n" for rec in records).encode("utf-8")
+        if not data:
+            return
+        with self._lock:
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT | getattr(os, "O_BINARY", 0))
+            try:
+                os.write(fd, data)
+            finally:
+                os.close(fd)
+            self._follow()
+
+    def rewrite(self, records: Iterable[dict[str, Any]]) -> None:
+        """Atomically replace the whole log with `records`."""
+        with self._lock:
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            with tmp.open("w", encoding="utf-8") as f:
+                for rec in records:
+                    f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            os.replace(tmp, self.path)
+            self._reset()
+            self._follow()
+
+    def clear(self) -> None:
+        with self._lock:
+            self.path.unlink(missing_ok=True)
+            self.ensure()
+            self._reset()
+
+    # ---------- read ----------
+    @property
+    def generation(self) -> int:
+        """Bumped every time the log is rewritten, cleared or replaced on disk.
+
+        Positions returned earlier are only valid while it stays the same.
+        """
+        with self._lock:
+            self._follow()
+            return self._generation
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._follow()
+            return len(self._offsets)
+
+    def size_bytes(self) -> int:
+        with self._lock:
+            self._follow()
+            return self._pos
+
+    def latest(self) -> dict[str, Any] | None:
+        with self._lock:
+            self._follow()
+            if not self._offsets:
+                return None
+            if self._ring:
+                # a copy: callers must not be able to edit the cached record
+                return dict(self._ring[-1])
+            return self.read(len(self._offsets) - 1)
+
+    def last(self, n: int) -> list[dict[str, Any]]:
+        """The last `n` records, oldest first."""
+        with self._lock:
+            self._follow()
+            total = len(self._offsets)
+            n = max(0, min(n, total))
+            if n <= len(self._ring):
+                return [dict(rec) for rec in list(self._ring)[len(self._ring) - n :]]
+            return self.read_range(total - n, total)
+
+    def read(self, index: int) -> dict[str, Any]:
+        return self.read_range(index, index + 1)[0]
+
+    def read_range(self, start: int, stop: int) -> list[dict[str, Any]]:
+        """Records `[start, stop)` read by seeking to their byte offsets."""
+        return [rec for _, rec in self.scan(start, stop)]
+
+    def scan(self, start: int, stop: int) -> list[tuple[int, dict[str, Any]]]:
+        """Like `read_range`, but paired with positions (malformed lines are skipped)."""
+        with self._lock:
+            self._follow()
+            start, stop = max(0, start), min(stop, len(self._offsets))
+            if start >= stop:
+                return []
+            end = self._offsets[stop] if stop < len(self._offsets) else self._pos
+            with self.path.open("rb") as f:
+                f.seek(self._offsets[start])
+                data = f.read(end - self._offsets[start])
+        lines = [line for line in data.split(b"\n") if line.strip()]
+        out = [(i, self._parse(line)) for i, line in enumerate(lines, start)]
+        return [(i, rec) for i, rec in out if rec is not None]
+
+    def scan_back(self, stop: int | None = None, *, chunk: int = 256) -> Iterator[tuple[int, dict[str, Any]]]:
+        """`(position, record)` pairs before `stop` (default: the end), newest first, read in chunks."""
+        stop = len(self) if stop is None else min(stop, len(self))
+        while stop > 0:
+            start = max(0, stop - chunk)
+            yield from reversed(self.scan(start, stop))
+            stop = start
+
+    def read_many(self, positions: Iterable[int]) -> list[dict[str, Any]]:
+        """Records at arbitrary `positions`, in the given order, with one open()."""
+        out: list[dict[str, Any]] = []
+        with self._lock:
+            self._follow()
+            total = len(self._offsets)
+            with self.path.open("rb") as f:
+                for i in positions:
+                    if not 0 <= i < total:
+                        continue
+                    end = self._offsets[i + 1] if i + 1 < total else self._pos
+                    f.seek(self._offsets[i])
+                    rec = self._parse(f.read(end - self._offsets[i]))
+                    if rec is not None:
+                        out.append(rec)
+        return out
+
+    def iter_all(self) -> Iterator[dict[str, Any]]:
+        """Stream every record from the start of the file."""
+        if not self.path.exists():
+            return
+        with self.path.open("r", encoding="utf-8") as f:
+            for line in f:
+                rec = self._parse(line)
+                if rec is not None:
+                    yield rec
+
+    # ---------- tail follow ----------
+    def _follow(self) -> None:
+        try:
+            st = self.path.stat()
+        except FileNotFoundError:
+            if self._pos:
+                self._reset()
+            return
+        file_id = (st.st_dev, st.st_ino)
+        if self._file_id is not None and (file_id != self._file_id or st.st_size < self._pos):
+            # replaced or truncated by someone else — start over
+            self._reset()
+        self._file_id = file_id
+        if st.st_size == self._pos:
+            return
+
+        tail: deque[bytes] = deque(maxlen=self._ring_size)
+        with self.path.open("rb") as f:
+            f.seek(self._pos)
+            buf = b""
+            base = self._pos
+            while True:
+                chunk = f.read(_READ_CHUNK)
+                if not chunk:
+                    break
+                buf += chunk
+                start = 0
+                while True:
+                    nl = buf.find(b"\n", start)
+                    if nl == -1:
+                        break
+                    line = buf[start:nl]
+                    if line.strip():
+                        self._offsets.append(base + start)
+                        tail.append(line)
+                    start = nl + 1
+                base += start
+                buf = buf[start:]
+        # an incomplete last line (writer mid-append) is picked up next time
+        self._pos = base
+        for line in tail:
+            rec = self._parse(line)
+            if rec is not None:
+                self._ring.append(rec)
+
+    def _parse(self, line: bytes | str) -> dict[str, Any] | None:
+        if not line.strip():
+            return None
+        try:
+            return json.loads(line)  # type: ignore[no-any-return]
+        except json.JSONDecodeError as e:
+            logger.warning("Skipping malformed line in %s: %s", self.path, e)
+            return None
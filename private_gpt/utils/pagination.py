@@ -0,0 +1,106 @@
+"""Cursor pagination and ETags for listings backed by append-only logs.
+
+A listing is paged from the newest end: a page holds the last `limit`
+matching records before a position, oldest first (the order the list
+endpoints always used), and the cursor of the next page is the position of
+the oldest record returned. Cursors are opaque to clients and bound to the
+log *generation* (see `AppendLog.generation`): positions are only
+meaningful until the log is rewritten, so a stale cursor is rejected
+instead of silently skipping or repeating records.
+"""
+
+from __future__ import annotations
+
+import base64
+import binascii
+import json
+import secrets
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Any, TypeVar
+
+from private_gpt.utils.result_cache import fingerprint
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable
+
+T = TypeVar("T")
+
+# generations are per-process counters: tie cursors and ETags to this process
+_BOOT = secrets.token_hex(4)
+
+
+class CursorError(ValueError):
+    """Malformed cursor, a cursor of another listing, or one older than a rewrite of the store."""
+
+
+def encode_cursor(scope: str, generation: Any, position: int) -> str:
+    raw = json.dumps([_BOOT, scope, generation, position], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, scope: str, generation: Any) -> int:
+    """Position encoded in `cursor`; raises `CursorError` if it does not apply to this listing."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        boot, cursor_scope, cursor_generation, position = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError) as e:
+        raise CursorError("malformed cursor") from e
+    if cursor_scope != scope or not isinstance(position, int):
+        raise CursorError("cursor does not belong to this listing")
+    # compare in JSON form: tuples come back as lists
+    if boot != _BOOT or cursor_generation != json.loads(json.dumps(generation)):
+        raise CursorError("cursor expired, the store was rewritten; start from the first page")
+    return position
+
+
+def make_etag(*parts: Any) -> str:
+    """Weak ETag of a listing state (store version, query parameters...)."""
+    return f'W/"{fingerprint(_BOOT, *parts)[:20]}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    # weak comparison: W/"x" and "x" are the same
+    return "*" in tags or etag.removeprefix("W/") in {t.removeprefix("W/") for t in tags}
+
+
+def take_page(
+    candidates: Iterable[tuple[int, T]],
+    limit: int,
+    match: Callable[[T], bool] | None = None,
+) -> tuple[list[T], int | None]:
+    """Pick the first `limit` matching `(position, item)` pairs from newest-first `candidates`.
+
+    Returns the items oldest first and the position for the next (older)
+    page, or None when no older candidate matches. Once the page is full,
+    iteration goes on only until one more match is found (an empty next
+    page is never announced); with `match=None` that is a single candidate.
+    """
+    items: list[T] = []
+    oldest: int | None = None
+    for position, item in candidates:
+        if match is not None and not match(item):
+            continue
+        if len(items) >= limit:
+            # an older match exists: there is a non-empty next page
+            return items[::-1], oldest
+        items.append(item)
+        oldest = position
+    return items[::-1], None
+
+
+def in_window(timestamp: str | None, since: datetime | None, until: datetime | None) -> bool:
+    """`since <= timestamp <= until` for ISO 8601 timestamps (naive ones are UTC)."""
+    if since is None and until is None:
+        return True
+    try:
+        ts = _aware(datetime.fromisoformat(timestamp or ""))
+    except ValueError:
+        return False
+    return (since is None or ts >= _aware(since)) and (until is None or ts <= _aware(until))
+
+
+def _aware(value: datetime) -> datetime:
+    return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
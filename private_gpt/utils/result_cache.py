@@ -0,0 +1,108 @@
+"""Content-addressed cache of LLM results persisted as a JSONL log."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any
+
+from private_gpt.utils.append_log import AppendLog
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+def fingerprint(*parts: Any) -> str:
+    """Stable hash of JSON-serializable parts (dict key order does not matter)."""
+    raw = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """Bounded LRU cache `fingerprint -> result dict` with a TTL.
+
+    Every `put` is one appended line; on start the log is replayed, skipping
+    expired entries (recency after a restart is the write order, reads are
+    not persisted). When the log holds about twice as many lines as live
+    entries it is rewritten with the live ones only. `max_items <= 0` or
+    `ttl_s <= 0` disables the cache.
+    """
+
+    def __init__(self, path: Path, *, ttl_s: float, max_items: int) -> None:
+        self.ttl_s = ttl_s
+        self.max_items = max_items
+        self._log = AppendLog(path, ring_size=0)
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, tuple[float, dict[str, Any]]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if self.enabled:
+            self._load()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_items > 0 and self.ttl_s > 0
+
+    def get(self, key: str, now: float | None = None) -> dict[str, Any] | None:
+        if not self.enabled:
+            return None
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or now - entry[0] >= self.ttl_s:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry[1])
+
+    def put(self, key: str, value: dict[str, Any], now: float | None = None) -> None:
+        if not self.enabled:
+            return
+        now = time.time() if now is None else now
+        with self._lock:
+            self._log.append({"k": key, "ts": now, "v": value})
+            self._entries[key] = (now, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+            if len(self._log) > 2 * self.max_items + 64:
+                self._compact()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._log.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def _load(self) -> None:
+        self._log.ensure()
+        now = time.time()
+        for ev in self._log.iter_all():
+            key, ts, value = ev.get("k"), ev.get("ts"), ev.get("v")
+            if not isinstance(key, str) or not isinstance(ts, (int, float)) or not isinstance(value, dict):
+                continue
+            if now - ts >= self.ttl_s:
+                self._entries.pop(key, None)
+                continue
+            self._entries[key] = (float(ts), value)
+            self._entries.move_to_end(key)
+        while len(self._entries) > self.max_items:
+            self._entries.popitem(last=False)
+        if len(self._log) > len(self._entries):
+            self._compact()
+        logger.debug("Result cache %s: %d entries", self._log.path, len(self._entries))
+
+    def _compact(self) -> None:
+        self._log.rewrite({"k": k, "ts": ts, "v": v} for k, (ts, v) in self._entries.items())
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""Recall@k and latency of the IVF memory index against exact search.
+
+Runs on synthetic clustered vectors by default, or on the vectors of the
+current agent memory with `--memory`:
+
+    python -m scripts.benchmark_memory_ann --n 100000 --nprobe 4 8 16
+"""
+
+import argparse
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import numpy as np
+
+from private_gpt.components.memory.memory_ann import IVFIndex
+from private_gpt.components.memory.memory_index import MemoryIndex
+
+
+def _synthetic(n: int, dim: int, clusters: int, seed: int) -> tuple[list[dict], np.ndarray]:
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, n)
+    vectors = centers[labels] + 0.35 * rng.normal(size=(n, dim)).astype(np.float32)
+    now = datetime.now(timezone.utc)
+    records = [
+        {
+            "id": str(i),
+            "timestamp": (now - timedelta(hours=float(h))).isoformat(),
+            "importance": float(imp),
+            "emb_row": i,
+        }
+        for i, (h, imp) in enumerate(zip(rng.uniform(0, 24 * 90, n), rng.random(n), strict=True))
+    ]
+    return records, vectors
+
+
+def _from_memory() -> tuple[list[dict], np.ndarray]:
+    from private_gpt.components.memory.memory_component import _MemStorage
+
+    store = _MemStorage()
+    vectors = store.vectors.open()
+    if vectors is None:
+        raise SystemExit("Agent memory has no embeddings to benchmark")
+    return list(store.iter_all()), np.asarray(vectors)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="benchmark_memory_ann.py")
+    parser.add_argument("--memory", action="store_true", help="Use the stored agent memory vectors")
+    parser.add_argument("--n", type=int, default=100_000, help="Synthetic memory size")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=200, help="Synthetic topic clusters")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=0)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--half-life", type=float, default=30.0)
+    args = parser.parse_args()
+
+    records, vectors = _from_memory() if args.memory else _synthetic(args.n, args.dim, args.clusters, 0)
+    index = MemoryIndex()
+    index.load(records, vectors)
+    print(f"Memory: {len(index)} items, dim={index.dim}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ivf = IVFIndex(Path(tmp) / "memory.ivf.npz", nlist=args.nlist, min_items=1)
+        t0 = time.perf_counter()
+        ivf.sync(*index.vectors())
+        print(f"IVF build: {time.perf_counter() - t0:.2f}s")
+
+        rng = np.random.default_rng(1)
+        picks = rng.integers(0, vectors.shape[0], args.queries)
+        queries = vectors[picks] + 0.1 * rng.normal(size=(args.queries, vectors.shape[1]))
+        now = time.time()
+
+        def run(candidates_for: object) -> tuple[list[set[int]], float]:
+            results, t0 = [], time.perf_counter()
+            for q in queries:
+                cands = candidates_for(q) if callable(candidates_for) else None
+                hits = index.search(
+                    q.tolist(),
+                    top_k=args.k,
+                    decay_half_life_days=args.half_life,
+                    now=now,
+                    candidates=cands,
+                )
+                results.append({row for row, _ in hits})
+            return results, (time.perf_counter() - t0) / len(queries) * 1000
+
+        exact, exact_ms = run(None)
+        print(f"{'mode':>12} {'recall@' + str(args.k):>10} {'ms/query':>10}")
+        print(f"{'exact':>12} {1.0:>10.3f} {exact_ms:>10.2f}")
+        for nprobe in args.nprobe:
+
+            def cands(q: np.ndarray, nprobe: int = nprobe) -> np.ndarray:
+                qv = index.query_vector(q.tolist())
+                assert qv is not None
+                return ivf.candidates(qv, nprobe)
+
+            approx, ann_ms = run(cands)
+            recall = np.mean([len(a & e) / max(1, len(e)) for a, e in zip(approx, exact, strict=True)])
+            print(f"{'nprobe=' + str(nprobe):>12} {recall:>10.3f} {ann_ms:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
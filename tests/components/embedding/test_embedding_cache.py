@@ -0,0 +1,54 @@
+from llama_index.core.embeddings import BaseEmbedding
+
+from private_gpt.components.embedding.embedding_cache import (
+    CachedEmbedding,
+    EmbeddingLRUCache,
+)
+
+
+class _CountingEmbedding(BaseEmbedding):
+    calls: int = 0
+
+    def _get_query_embedding(self, query: str) -> list[float]:
+        self.calls += 1
+        return [1.0, float(len(query))]
+
+    def _get_text_embedding(self, text: str) -> list[float]:
+        self.calls += 1
+        return [0.0, float(len(text))]
+
+    async def _aget_query_embedding(self, query: str) -> list[float]:
+        return self._get_query_embedding(query)
+
+
+def test_repeated_texts_hit_the_cache() -> None:
+    inner = _CountingEmbedding(model_name="m")
+    emb = CachedEmbedding(inner, EmbeddingLRUCache(1 << 20))
+
+    assert emb.get_query_embedding("hello  world") == [1.0, 12.0]
+    assert emb.get_query_embedding(" hello world ") == [1.0, 12.0]
+    # query and text embeddings are cached separately
+    assert emb.get_text_embedding("hello world") == [0.0, 11.0]
+    assert emb.get_text_embedding_batch(["hello world", "new", "new"]) == [
+        [0.0, 11.0],
+        [0.0, 3.0],
+        [0.0, 3.0],
+    ]
+
+    assert inner.calls == 3
+    stats = emb.cache.stats()
+    assert (stats["hits"], stats["misses"]) == (2, 4)
+
+
+def test_lru_is_bounded_by_bytes(tmp_path) -> None:
+    cache = EmbeddingLRUCache(max_bytes=3 * (4 * 4 + 160))
+    for i in range(5):
+        cache.put(str(i), [float(i)] * 4)
+    assert cache.get("0") is None
+    assert cache.get("4") == [4.0] * 4
+    assert cache.stats()["evictions"] == 2
+
+    cache.save(tmp_path / "c.npz")
+    restored = EmbeddingLRUCache(1 << 20)
+    restored.load(tmp_path / "c.npz")
+    assert restored.get("3") == [3.0] * 4
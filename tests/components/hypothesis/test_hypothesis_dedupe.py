@@ -0,0 +1,97 @@
+import json
+import zlib
+from unittest.mock import MagicMock
+
+import pytest
+
+from private_gpt.components.hypothesis.hypothesis_component import HypothesisComponent
+
+
+def _vec(text: str) -> list[float]:
+    # одинаковый текст (без регистра и пробелов по краям) — один и тот же вектор
+    v = [0.0] * 64
+    v[zlib.crc32(text.strip().lower().encode()) % 64] = 1.0
+    return v
+
+
+def _answer(title: str) -> MagicMock:
+    resp = MagicMock()
+    resp.message.content = json.dumps(
+        {"title": title, "rationale": "r", "steps": ["s"], "expected_signal": [], "risks": [],
+         "confidence": 0.5, "priority": 2, "tags": ["t"]}
+    )
+    return resp
+
+
+@pytest.fixture
+def make(injector):
+    settings = injector.bind_settings({"hypothesis": {"cache_ttl_s": 0, "dedupe_threshold": 0.9}})
+    llm_component = MagicMock()
+    llm_component.llm.chat.side_effect = [_answer("A"), _answer("B"), _answer("A")]
+    memory = MagicMock()
+    memory.context.return_value = []
+    embedding = MagicMock()
+    embedding.embedding_model.get_text_embedding.side_effect = _vec
+    embedding.embedding_model.get_text_embedding_batch.side_effect = lambda ts: [_vec(t) for t in ts]
+
+    def _make() -> HypothesisComponent:
+        return HypothesisComponent(llm_component, memory, settings, embedding)
+
+    _make().clear()
+    return _make, llm_component.llm
+
+
+def _gen(h: HypothesisComponent, msg: str, tags: list[str] | None = None):
+    return h.generate(last_user_message=msg, assistant_response="ok", reflection=None, tags=tags)
+
+
+def test_similar_message_reuses_open_hypothesis(make) -> None:
+    factory, llm = make
+    h = factory()
+
+    first = _gen(h, "Как ускорить сборку?")
+    again = _gen(h, "  как ускорить сборку?", tags=["build"])
+
+    assert llm.chat.call_count == 1
+    assert again.id == first.id
+    assert again.derived_from["repeats"] == 1
+    assert "build" in again.tags
+    assert len(h.list()) == 1
+    assert h.stats()["saved_llm_calls"] == 1
+
+    # закрытая гипотеза больше не переиспользуется
+    h.update_status(first.id, "done")
+    other = _gen(h, "Как ускорить сборку?")
+    assert llm.chat.call_count == 2
+    assert other.id != first.id
+
+
+def test_near_identical_answer_is_merged(make) -> None:
+    factory, llm = make
+    h = factory()
+    first = _gen(h, "вопрос один")
+    _gen(h, "вопрос два")  # LLM: "B"
+    merged = _gen(h, "вопрос три")  # LLM снова выдаёт "A"
+
+    assert llm.chat.call_count == 3
+    assert merged.id == first.id
+    assert [x.title for x in h.list()] == ["A", "B"]
+    stats = h.stats()
+    assert stats["merged"] == 1 and stats["generated"] == 2 and stats["saved_llm_calls"] == 0
+
+
+def test_index_is_rebuilt_on_start(make) -> None:
+    factory, llm = make
+    h = factory()
+    first = _gen(h, "про индекс")
+    h._index.path.unlink()
+
+    restarted = factory()
+    assert restarted.stats()["indexed"] == 1
+    assert restarted._index.path.exists()
+    assert _gen(restarted, "Про индекс").id == first.id
+    assert llm.chat.call_count == 1
+
+    restarted.clear()
+    assert restarted.stats()["indexed"] == 0
+    assert restarted.list() == []
@@ -0,0 +1,91 @@
+import json
+import time
+
+import pytest
+
+from private_gpt.components.hypothesis.hypothesis_component import Hypothesis, _HStorage
+
+
+@pytest.fixture
+def store(tmp_path):
+    s = _HStorage(file_path=tmp_path / "hypotheses.jsonl", compact_min_events=8)
+    s.ensure()
+    return s
+
+
+def _lines(store) -> list[dict]:
+    text = store.file_path.read_text(encoding="utf-8")
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def test_status_update_is_one_append(store) -> None:
+    hyps = [Hypothesis(title=f"h{i}", rationale="") for i in range(3)]
+    for h in hyps:
+        store.create(h.model_dump())
+    before = store.file_path.read_bytes()
+
+    rec = store.update(hyps[1].id, {"status": "done"})
+
+    assert rec is not None and rec["status"] == "done"
+    assert "op" not in rec
+    assert store.file_path.read_bytes().startswith(before)
+    events = _lines(store)
+    assert len(events) == 4
+    assert events[-1]["op"] == "update"
+    assert [r["status"] for r in store.last(10)] == ["pending", "done", "pending"]
+    assert store.update("missing", {"status": "done"}) is None
+
+
+def test_legacy_records_and_external_writers(store) -> None:
+    legacy = Hypothesis(title="old", rationale="").model_dump()
+    with store.file_path.open("a", encoding="utf-8") as f:
+        f.write(json.dumps(legacy) + "\n")
+    assert [r["title"] for r in store.last(5)] == ["old"]
+
+    other = _HStorage(file_path=store.file_path)
+    other.update(legacy["id"], {"status": "in_progress"})
+    other.create(Hypothesis(title="new", rationale="").model_dump())
+
+    assert [(r["title"], r["status"]) for r in store.last(5)] == [
+        ("old", "in_progress"),
+        ("new", "pending"),
+    ]
+
+
+def test_background_compaction(store) -> None:
+    h = Hypothesis(title="h", rationale="")
+    store.create(h.model_dump())
+    for i in range(10):
+        store.update(h.id, {"status": f"s{i}"})
+
+    # compaction starts once 8 events are garbage; updates made while it runs
+    # (or after it) stay as events on top of the compacted record
+    deadline = time.monotonic() + 5
+    while (len(_lines(store)) == 11 or store._compacting) and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    events = _lines(store)
+    assert 1 <= len(events) <= 3
+    assert events[0]["op"] == "create"
+    assert all(e["op"] == "update" for e in events[1:])
+    assert store.get(h.id)["status"] == "s9"
+    store.update(h.id, {"status": "done"})
+    assert store.last(1)[0]["status"] == "done"
+
+
+def test_page_filters_by_status_and_walks_back(store) -> None:
+    hyps = [Hypothesis(title=f"h{i}", rationale="", tags=["a"] if i % 2 else []) for i in range(6)]
+    for h in hyps:
+        store.create(h.model_dump())
+    store.update(hyps[5].id, {"status": "done"})
+
+    recs, before = store.page(2, match=lambda r: r["status"] == "pending")
+    assert [r["title"] for r in recs] == ["h3", "h4"]
+    recs, before = store.page(2, before, match=lambda r: r["status"] == "pending")
+    assert [r["title"] for r in recs] == ["h1", "h2"]
+    recs, before = store.page(2, before, match=lambda r: r["status"] == "pending")
+    assert [r["title"] for r in recs] == ["h0"] and before is None
+
+    generation, revision = store.version()
+    store.update(hyps[0].id, {"status": "done"})
+    assert store.version() == (generation, revision + 1)
@@ -0,0 +1,130 @@
+import threading
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+from private_gpt.components.hypothesis.hypothesis_component import HypothesisComponent
+from private_gpt.components.introspection.introspection_queue import IntrospectionQueue, Turn
+from private_gpt.components.introspection.reflection_scheduler import ReflectionScheduler
+from private_gpt.components.reflection.reflection_component import ReflectionComponent, ReflectionRecord
+from tests.fixtures.mock_injector import MockInjector
+
+
+def _record(turn_msg: str, confidence: float = 0.9) -> ReflectionRecord:
+    return ReflectionRecord(
+        last_user_message=turn_msg, assistant_response="", why="", confidence=confidence
+    )
+
+
+@pytest.fixture
+def gate() -> threading.Event:
+    return threading.Event()
+
+
+def _make(injector: MockInjector, gate: threading.Event, **cfg) -> tuple:
+    reflection = MagicMock(spec=ReflectionComponent)
+    hypothesis = MagicMock(spec=HypothesisComponent)
+    started = threading.Event()
+
+    def reflect(**kw):
+        started.set()
+        gate.wait(5)
+        return _record(kw["last_user_message"], confidence=0.1)
+
+    reflection.reflect.side_effect = reflect
+    reflection.reflect_batch.side_effect = lambda turns: [reflection.reflect(**t) for t in turns]
+    settings = injector.bind_settings(
+        {
+            "introspection": {"workers": 1, "max_pending": 2, **cfg},
+            "hypothesis": {"auto_generate": True, "auto_threshold": 0.5},
+        }
+    )
+    queue = IntrospectionQueue(settings, reflection, hypothesis, ReflectionScheduler(settings))
+    return queue, reflection, hypothesis, started
+
+
+def _turn(user: str, first: str | None = None) -> Turn:
+    history = [{"role": "user", "content": first}] if first else []
+    return Turn(last_user_message=user, chat_history=history)
+
+
+def test_submit_does_not_wait_for_llm(injector, gate) -> None:
+    queue, reflection, hypothesis, started = _make(injector, gate)
+    try:
+        assert queue.submit(_turn("a"))
+        assert started.wait(5)  # воркер занят, submit уже вернулся
+        assert queue.stats()["running"] == 1
+        gate.set()
+        assert queue.flush(5)
+        assert reflection.reflect.call_count == 1
+        # низкая уверенность рефлексии — авто-гипотеза по той же записи
+        assert hypothesis.generate.call_args.kwargs["reflection"].last_user_message == "a"
+        assert queue.stats()["processed"] == 1
+    finally:
+        gate.set()
+        queue.stop()
+
+
+def test_coalesce_replaces_turn_of_same_conversation(injector, gate) -> None:
+    queue, reflection, _, started = _make(injector, gate, overflow="coalesce")
+    try:
+        queue.submit(_turn("busy"))
+        assert started.wait(5)
+        queue.submit(_turn("q2", first="hello"))
+        queue.submit(_turn("x"))
+        queue.submit(_turn("q3", first="hello"))  # очередь полна, тот же диалог — заменяет q2
+        queue.submit(_turn("y"))  # полна, своего хода нет — вытесняется самый старый (x)
+        stats = queue.stats()
+        assert (stats["coalesced"], stats["dropped"], stats["pending"]) == (1, 1, 2)
+        gate.set()
+        assert queue.flush(5)
+        done = [c.kwargs["last_user_message"] for c in reflection.reflect.call_args_list]
+        assert done == ["busy", "q3", "y"]
+        # ожидавшие "q3" и "y" ушли одной пачкой
+        batched = reflection.reflect_batch.call_args.args[0]
+        assert [t["last_user_message"] for t in batched] == ["q3", "y"]
+        assert queue.stats()["batches"] == 1
+    finally:
+        gate.set()
+        queue.stop()
+
+
+def test_coalesce_keeps_every_turn_without_pressure(injector, gate) -> None:
+    queue, reflection, _, started = _make(injector, gate, overflow="coalesce", max_pending=8)
+    try:
+        queue.submit(_turn("busy"))
+        assert started.wait(5)
+        for user in ("q1", "q2", "q3"):
+            queue.submit(_turn(user, first="hello"))
+        assert (queue.stats()["coalesced"], queue.stats()["pending"]) == (0, 3)
+        gate.set()
+        assert queue.flush(5)
+        done = [c.kwargs["last_user_message"] for c in reflection.reflect.call_args_list]
+        assert done == ["busy", "q1", "q2", "q3"]
+    finally:
+        gate.set()
+        queue.stop()
+
+
+def test_drop_policy_and_restore_after_restart(injector, gate) -> None:
+    queue, _, _, started = _make(injector, gate, overflow="drop")
+    queue.submit(_turn("busy"))
+    assert started.wait(5)
+    assert queue.submit(_turn("a"))
+    assert queue.submit(_turn("b"))
+    assert not queue.submit(_turn("c"))
+    queue.stop()
+    gate.set()  # "busy" дорабатывается, "a" и "b" остаются в журнале
+    deadline = time.monotonic() + 5
+    while queue.stats()["running"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    # необработанные ходы переживают перезапуск
+    restarted, reflection, _, _ = _make(injector, gate)
+    try:
+        assert restarted.flush(5)
+        done = [c.kwargs["last_user_message"] for c in reflection.reflect.call_args_list]
+        assert done == ["a", "b"]
+    finally:
+        restarted.stop()
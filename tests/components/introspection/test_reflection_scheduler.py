@@ -0,0 +1,44 @@
+from private_gpt.components.introspection.introspection_queue import Turn
+from private_gpt.components.introspection.reflection_scheduler import ReflectionScheduler, estimate_tokens
+from tests.fixtures.mock_injector import MockInjector
+
+
+def _scheduler(injector: MockInjector, **cfg) -> ReflectionScheduler:
+    settings = injector.bind_settings({"reflection": {"sample_rate": 0.0, "long_answer_chars": 50, **cfg}})
+    return ReflectionScheduler(settings)
+
+
+def test_triggers_and_sampling(injector) -> None:
+    sched = _scheduler(injector)
+    answered = [{"role": "user", "content": "what is 2+2"}, {"role": "assistant", "content": "5"}]
+
+    assert sched.select(Turn(last_user_message="No, that's wrong", chat_history=answered)) == "correction"
+    # без предыдущего ответа ассистента возражать не на что
+    assert sched.select(Turn(last_user_message="No, that's wrong")) is None
+    assert sched.select(Turn(last_user_message="q", use_context=True, sources=[])) == "no_sources"
+    assert sched.select(Turn(last_user_message="q", use_context=False)) is None
+    assert sched.select(Turn(last_user_message="q", assistant_response="x" * 60)) == "long_answer"
+
+    stats = sched.stats()
+    assert stats["turns"] == 5
+    assert stats["skipped.not_sampled"] == 2
+    assert (stats["trigger.correction"], stats["trigger.no_sources"], stats["trigger.long_answer"]) == (1, 1, 1)
+
+    always = _scheduler(injector, sample_rate=1.0, triggers=[])
+    assert always.select(Turn(last_user_message="q", assistant_response="x" * 60)) == "sampled"
+
+
+def test_budgets_use_a_sliding_minute(injector) -> None:
+    turn = Turn(last_user_message="q" * 400)
+    tokens = estimate_tokens(turn)
+
+    calls = _scheduler(injector, calls_per_minute=2)
+    assert calls.acquire(turn, now=0.0) and calls.acquire(turn, now=10.0)
+    assert not calls.acquire(turn, now=59.0)
+    assert calls.acquire(turn, now=60.5)  # первый вызов вышел из окна
+    assert calls.stats()["skipped.budget"] == 1
+
+    budget = _scheduler(injector, tokens_per_minute=tokens * 2 - 1)
+    assert budget.acquire(turn, now=0.0)
+    assert not budget.acquire(turn, now=1.0)
+    assert budget.stats()["window_tokens"] == tokens
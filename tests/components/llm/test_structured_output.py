@@ -0,0 +1,87 @@
+from llama_index.core.llms import ChatMessage, ChatResponse, MessageRole
+
+from private_gpt.components.hypothesis.hypothesis_component import Hypothesis
+from private_gpt.components.llm.structured_output import array_schema, chat_json, llm_schema
+
+_MESSAGES = [ChatMessage(role=MessageRole.USER, content="hi")]
+
+
+class _FakeLLM:
+    def __init__(self, reject: bool = False, fail: Exception | None = None) -> None:
+        self.calls: list[dict] = []
+        self.reject = reject
+        self.fail = fail
+
+    def chat(self, messages, **kwargs) -> ChatResponse:
+        self.calls.append(kwargs)
+        if kwargs and self.reject:
+            raise ValueError("unsupported parameter")
+        if kwargs and self.fail is not None:
+            error, self.fail = self.fail, None
+            raise error
+        return ChatResponse(message=ChatMessage(role=MessageRole.ASSISTANT, content="{}"))
+
+
+class Ollama(_FakeLLM):
+    pass
+
+
+class OpenAILike(_FakeLLM):
+    pass
+
+
+class LlamaCPP(_FakeLLM):
+    pass
+
+
+def test_schema_from_model_fields() -> None:
+    schema = llm_schema(Hypothesis, ("title", "steps", "priority"))
+    assert schema["required"] == ["title", "steps", "priority"]
+    assert schema["properties"]["steps"]["items"] == {"type": "string"}
+    assert schema["properties"]["priority"]["type"] == "integer"
+    assert schema["additionalProperties"] is False
+
+    batch = array_schema(schema, 3)["properties"]["items"]
+    assert (batch["minItems"], batch["maxItems"]) == (3, 3)
+
+
+def test_backend_specific_constraint() -> None:
+    schema = llm_schema(Hypothesis, ("title",))
+
+    ollama = Ollama()
+    chat_json(ollama, _MESSAGES, schema, name="h")
+    assert ollama.calls == [{"format": schema}]
+
+    openai = OpenAILike()
+    chat_json(openai, _MESSAGES, schema, name="h")
+    fmt = openai.calls[0]["response_format"]
+    assert fmt["type"] == "json_schema" and fmt["json_schema"]["schema"] == schema
+
+    plain = _FakeLLM()
+    chat_json(plain, _MESSAGES, schema, name="h")
+    assert plain.calls == [{}]
+
+
+def test_rejected_schema_falls_back_once() -> None:
+    llm = OpenAILike(reject=True)
+    schema = llm_schema(Hypothesis, ("title",))
+    assert chat_json(llm, _MESSAGES, schema, name="h").message.content == "{}"
+    chat_json(llm, _MESSAGES, schema, name="h")
+    # отвергнутая схема, повтор без неё, дальше — сразу без схемы
+    assert [bool(c) for c in llm.calls] == [True, False, False]
+
+
+def test_transient_error_does_not_disable_schema() -> None:
+    llm = OpenAILike(fail=TimeoutError("read timed out"))
+    schema = llm_schema(Hypothesis, ("title",))
+    assert chat_json(llm, _MESSAGES, schema, name="h").message.content == "{}"
+    chat_json(llm, _MESSAGES, schema, name="h")
+    # сбой без схемы повторён, но следующий вызов снова со схемой
+    assert [bool(c) for c in llm.calls] == [True, False, True]
+
+
+def test_llamacpp_without_model_handle_uses_plain_chat() -> None:
+    llm = LlamaCPP()
+    schema = llm_schema(Hypothesis, ("title",))
+    assert chat_json(llm, _MESSAGES, schema, name="h").message.content == "{}"
+    assert llm.calls == [{}]
@@ -0,0 +1,116 @@
+import threading
+
+from private_gpt.components.memory.embedding_queue import EmbeddingQueue
+from private_gpt.components.memory.memory_component import MemoryItem
+
+
+class _Recorder:
+    def __init__(self, fail_batch: bool = False) -> None:
+        self.batches: list[list[str]] = []
+        self.committed: list[tuple[MemoryItem, list[float] | None]] = []
+        self.fail_batch = fail_batch
+        self.gate = threading.Event()
+
+    def embed_batch(self, texts: list[str]) -> list[list[float]]:
+        self.gate.wait(5)
+        self.batches.append(texts)
+        if self.fail_batch:
+            raise RuntimeError("batch endpoint down")
+        return [[float(len(t))] for t in texts]
+
+    def embed_one(self, text: str) -> list[float]:
+        if text == "bad":
+            raise RuntimeError("boom")
+        return [1.0]
+
+    def commit(self, batch) -> None:
+        self.committed.extend(batch)
+
+
+def test_items_are_coalesced_into_batches() -> None:
+    rec = _Recorder()
+    q = EmbeddingQueue(
+        embed_batch=rec.embed_batch, embed_one=rec.embed_one, commit=rec.commit,
+        max_batch=4, max_latency_ms=10_000,
+    )
+    items = [MemoryItem(text=f"t{i}") for i in range(10)]
+    q.submit(items)
+    assert {it.id for it in q.pending()} == {it.id for it in items}
+
+    rec.gate.set()
+    assert q.flush(timeout=5)
+    assert [len(b) for b in rec.batches] == [4, 4, 2]
+    assert [it.id for it, _ in rec.committed] == [it.id for it in items]
+    assert q.pending() == []
+
+
+def test_batch_failure_falls_back_per_item() -> None:
+    rec = _Recorder(fail_batch=True)
+    rec.gate.set()
+    q = EmbeddingQueue(embed_batch=rec.embed_batch, embed_one=rec.embed_one, commit=rec.commit)
+    q.submit([MemoryItem(text="ok"), MemoryItem(text="bad")])
+    assert q.flush(timeout=5)
+    assert [emb for _, emb in rec.committed] == [[1.0], None]
+
+
+def _async_memory(injector, gate: threading.Event):
+    from private_gpt.components.embedding.embedding_component import EmbeddingComponent
+    from private_gpt.components.memory.memory_component import MemoryComponent
+
+    def embed_batch(texts: list[str]) -> list[list[float]]:
+        gate.wait(5)
+        return [[1.0, 0.0]] * len(texts)
+
+    emb = injector.bind_mock(EmbeddingComponent)
+    emb.embedding_model.get_text_embedding_batch.side_effect = embed_batch
+    emb.embedding_model.get_query_embedding.return_value = [1.0, 0.0]
+    settings = injector.bind_settings(
+        {"memory": {"embed_async": True, "consolidate_interval_s": 0, "embed_max_latency_ms": 0}}
+    )
+    memory = MemoryComponent(settings, emb)
+    memory.clear()
+    return memory
+
+
+def test_search_does_not_return_item_committed_mid_search(injector) -> None:
+    gate = threading.Event()
+    memory = _async_memory(injector, gate)
+    item = memory.add(text="dog barked")
+    assert memory._queue.is_pending(item.id)
+
+    original = memory._vector_search
+
+    def commit_then_search(query, params):
+        # снимок очереди уже взят — теперь элемент попадает в индекс
+        gate.set()
+        assert memory.flush(timeout=5)
+        return original(query, params)
+
+    memory._vector_search = commit_then_search
+    hits = memory.search("dog barked", top_k=5)
+    assert [it.id for it, _ in hits] == [item.id]
+    memory.clear()
+
+
+def test_readers_never_see_item_in_index_and_queue(injector) -> None:
+    gate = threading.Event()
+    memory = _async_memory(injector, gate)
+    seen: list[tuple[int, int]] = []
+    readers: list[threading.Thread] = []
+    original = memory._commit
+
+    def commit_and_race(batch) -> None:
+        original(batch)
+        # запись в индексе уже есть, элемент ещё не снят с ожидания
+        reader = threading.Thread(target=lambda: seen.append((memory.count(), len(memory.list()))))
+        readers.append(reader)
+        reader.start()
+        reader.join(0.2)
+
+    memory._commit = commit_and_race
+    memory.add(text="cat")
+    gate.set()
+    assert memory.flush(timeout=5)
+    readers[0].join(5)
+    assert seen == [(1, 1)]
+    memory.clear()
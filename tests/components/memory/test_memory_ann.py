@@ -0,0 +1,48 @@
+import numpy as np
+
+from private_gpt.components.memory.memory_ann import IVFIndex
+from private_gpt.components.memory.memory_index import MemoryIndex
+
+
+def _index(n: int = 2000, dim: int = 32) -> MemoryIndex:
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(20, dim))
+    vectors = centers[rng.integers(0, 20, n)] + 0.3 * rng.normal(size=(n, dim))
+    records = [
+        {"id": str(i), "timestamp": "2025-01-01T00:00:00+00:00", "importance": 0.5, "emb_row": i}
+        for i in range(n)
+    ]
+    index = MemoryIndex()
+    index.load(records, vectors.astype(np.float32))
+    return index
+
+
+def test_ivf_candidates_recall(tmp_path) -> None:
+    index = _index()
+    ivf = IVFIndex(tmp_path / "memory.ivf.npz", min_items=100)
+    ivf.sync(*index.vectors())
+    assert ivf.ready
+
+    vecs, _ = index.vectors()
+    hits = 0
+    for row in range(0, 2000, 100):
+        q = vecs[row].tolist()
+        exact = {r for r, _ in index.search(q, top_k=10, decay_half_life_days=30.0)}
+        cands = ivf.candidates(index.query_vector(q), nprobe=8)
+        approx = {r for r, _ in index.search(q, top_k=10, decay_half_life_days=30.0, candidates=cands)}
+        hits += len(exact & approx)
+    assert hits / (20 * 10) > 0.9
+
+
+def test_ivf_persists_and_catches_up(tmp_path) -> None:
+    index = _index()
+    path = tmp_path / "memory.ivf.npz"
+    ivf = IVFIndex(path, min_items=100)
+    vecs, has = index.vectors()
+    ivf.sync(vecs[:1500], has[:1500])
+    assert path.exists()
+
+    reloaded = IVFIndex(path, min_items=100)
+    reloaded.sync(vecs, has)
+    q = index.query_vector(vecs[1999].tolist())
+    assert 1999 in reloaded.candidates(q, nprobe=4)
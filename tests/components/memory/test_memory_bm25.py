@@ -0,0 +1,78 @@
+import math
+
+import numpy as np
+import pytest
+
+from private_gpt.components.memory.memory_bm25 import BM25Index, tokenize
+from private_gpt.components.memory.memory_index import MemoryIndex
+
+DOCS = [
+    "the cat sat on the mat",
+    "dogs and cats are pets",
+    "the quick brown fox",
+    "cat cat cat",
+    "",
+]
+
+
+def _reference_bm25(docs, query, k1=1.2, b=0.75):
+    toks = [tokenize(d) for d in docs]
+    n = len(docs)
+    avgdl = sum(map(len, toks)) / n
+    out = {}
+    for i, doc in enumerate(toks):
+        score = 0.0
+        for term in set(tokenize(query)):
+            df = sum(term in d for d in toks)
+            tf = doc.count(term)
+            if tf == 0:
+                continue
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(doc) / avgdl))
+        if score > 0:
+            out[i] = score
+    return out
+
+
+@pytest.mark.parametrize("query", ["cat", "the cat", "brown fox pets", "nothing here"])
+def test_scores_match_reference(query) -> None:
+    bm25 = BM25Index()
+    for row, doc in enumerate(DOCS):
+        bm25.add(row, doc)
+
+    rows, scores = bm25.scores(tokenize(query))
+    ref = _reference_bm25(DOCS, query)
+    assert rows.tolist() == sorted(ref)
+    np.testing.assert_allclose(scores, [ref[r] for r in rows.tolist()], rtol=1e-6)
+
+
+def test_rows_must_be_added_in_order() -> None:
+    bm25 = BM25Index()
+    bm25.add(0, "a")
+    with pytest.raises(ValueError):
+        bm25.add(2, "b")
+
+
+def test_hybrid_search_finds_memories_without_embeddings() -> None:
+    index = MemoryIndex()
+    index.add({"id": "vec", "text": "weather report", "ts": 1_000.0}, [1.0, 0.0])
+    index.add({"id": "plain", "text": "deploy project x tonight", "ts": 1_000.0}, None)
+    kw = {"top_k": 5, "decay_half_life_days": 30.0, "now": 1_000.0}
+
+    # чисто векторный поиск: запись без эмбеддинга получает 0
+    got = index.search([1.0, 0.0], **kw)
+    assert [index.record(r)["id"] for r, _ in got] == ["vec", "plain"]
+    assert got[1][1] == 0.0
+
+    got = index.search([1.0, 0.0], **kw, query_text="deploy project", lexical_weight=0.3)
+    scores = {index.record(r)["id"]: s for r, s in got}
+    assert scores["plain"] == pytest.approx(0.3 * 0.6)
+    assert scores["vec"] == pytest.approx(0.7 * 0.6)
+
+    got = index.search(None, **kw, query_text="deploy")
+    assert [index.record(r)["id"] for r, _ in got] == ["plain"]
+    # IVF-кандидаты без лексических совпадений их не отрезают
+    hybrid = {"query_text": "deploy", "lexical_weight": 0.3}
+    got = index.search([1.0, 0.0], **kw, **hybrid, candidates=np.array([0]))
+    assert {index.record(r)["id"] for r, _ in got} == {"vec", "plain"}
+    assert index.search(None, **kw, query_text="deploy", kinds=["todo"]) == []
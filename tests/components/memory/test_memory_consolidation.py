@@ -0,0 +1,115 @@
+import numpy as np
+import pytest
+
+from private_gpt.components.embedding.embedding_component import EmbeddingComponent
+from private_gpt.components.memory.memory_component import MemoryComponent, MemoryItem
+from private_gpt.components.memory.memory_consolidation import (
+    merge_records,
+    near_duplicate_clusters,
+)
+from private_gpt.settings.settings import Settings
+from tests.fixtures.mock_injector import MockInjector
+
+# текст → вектор: тексты с общим первым словом почти совпадают
+_TOPICS = {"rain": [1.0, 0.0, 0.0], "sun": [0.0, 1.0, 0.0], "code": [0.0, 0.0, 1.0]}
+
+
+def _embed(text: str) -> list[float]:
+    base = np.array(_TOPICS[text.split()[0]])
+    return (base + 0.01 * len(text) * np.array([0.1, 0.1, 0.1])).tolist()
+
+
+def _unit(rows: list[list[float]]) -> np.ndarray:
+    v = np.asarray(rows, dtype=np.float32)
+    return v / np.linalg.norm(v, axis=1, keepdims=True)
+
+
+def test_clusters_only_touch_new_rows_and_same_kind() -> None:
+    vecs = _unit([[1, 0], [1, 0.01], [0, 1], [1, 0.02], [0, 1.0]])
+    kinds = np.array([0, 0, 0, 1, 0])
+    eligible = np.ones(5, dtype=bool)
+
+    assert near_duplicate_clusters(vecs, eligible, kinds, np.arange(0, 5), 0.99) == [[0, 1], [2, 4]]
+    # старые строки 0 и 1 между собой не сравниваются
+    assert near_duplicate_clusters(vecs, eligible, kinds, np.arange(2, 5), 0.99) == [[2, 4]]
+    eligible[4] = False
+    assert near_duplicate_clusters(vecs, eligible, kinds, np.arange(2, 5), 0.99) == []
+
+
+def test_merge_records() -> None:
+    records = [
+        {"id": "a", "kind": "monologue", "text": "x", "importance": 0.5, "ts": 10.0, "tags": ["t1"]},
+        {"id": "b", "kind": "monologue", "text": "y", "importance": 0.5, "ts": 30.0, "tags": ["t2"]},
+        {"id": "c", "kind": "monologue", "text": "z", "importance": 0.0, "ts": 20.0, "tags": []},
+    ]
+    vecs = _unit([[1, 0.1], [1, 0], [1, -0.1]])
+    merged, emb = merge_records(records, vecs)
+    assert merged["text"] == "y"  # медоид
+    assert merged["importance"] == pytest.approx(0.75)
+    assert merged["ts"] == 30.0
+    assert merged["tags"] == ["t1", "t2"]
+    assert merged["merged_from"] == ["a", "b", "c"]
+    assert np.linalg.norm(emb) == pytest.approx(1.0)
+
+
+@pytest.fixture
+def memory(injector: MockInjector) -> MemoryComponent:
+    emb = injector.bind_mock(EmbeddingComponent)
+    emb.embedding_model.get_text_embedding_batch.side_effect = lambda texts: [_embed(t) for t in texts]
+    emb.embedding_model.get_query_embedding.side_effect = _embed
+    injector.bind_settings(
+        {"memory": {"embed_async": False, "consolidate_interval_s": 0, "evict_below": 0.0}}
+    )
+    m = injector.get(MemoryComponent)
+    m.clear()
+    yield m
+    m.clear()
+
+
+def test_consolidate_merges_duplicates_incrementally(memory) -> None:
+    memory.add_many(
+        [
+            MemoryItem(kind="monologue", text="rain again", importance=0.5),
+            MemoryItem(kind="monologue", text="rain again!", importance=0.5),
+            MemoryItem(kind="monologue", text="sun today", importance=0.5),
+            MemoryItem(kind="insight", text="rain again", importance=0.5),
+        ]
+    )
+    stats = memory.consolidate()
+    assert stats["merged"] == 2
+
+    items = memory.list(limit=10)
+    texts = sorted((it.kind, it.text) for it in items)
+    assert len(items) == 3
+    assert ("insight", "rain again") in texts and ("monologue", "sun today") in texts
+    merged = next(it for it in items if it.merged_from)
+    assert merged.importance == pytest.approx(0.75)
+    assert len(memory._store.archive) == 2
+
+    # уже обработанные записи второй раз не сливаются; новая — сливается с ними
+    assert memory.consolidate()["merged"] == 0
+    memory.add(kind="monologue", text="rain again!!", importance=0.5)
+    assert memory.consolidate()["merged"] == 2
+    hits = memory.search("rain again", top_k=10, kinds=["monologue"])
+    assert [it.text.split()[0] for it, _ in hits] == ["rain", "sun"]
+    assert len(hits[0][0].merged_from) == 2
+
+
+def test_tombstones_survive_restart_and_compaction(memory, injector, monkeypatch) -> None:
+    memory._cfg.consolidate_threshold = 0.9
+    memory.add_many([MemoryItem(kind="monologue", text=f"code {'x' * i}") for i in range(3)])
+    memory.consolidate()
+    assert len(memory.list()) == 1
+
+    # перезапуск: надгробия применяются при загрузке
+    restarted = MemoryComponent(injector.get(Settings), injector.get(EmbeddingComponent))
+    assert [it.text for it in restarted.list()] == [it.text for it in memory.list()]
+
+    monkeypatch.setattr("private_gpt.components.memory.memory_component._COMPACT_MIN_DEAD", 1)
+    memory.add(kind="monologue", text="sun")
+    assert memory.consolidate()["compacted"] == 1
+    lines = memory._store.file_path.read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 2
+    assert len(memory._store.tombstones) == 0
+    assert sorted(it.text for it in memory.list()) == ["code x", "sun"]
+    assert memory.consolidate()["merged"] == 0
@@ -0,0 +1,57 @@
+import time
+
+import numpy as np
+import pytest
+
+from private_gpt.components.embedding.embedding_component import EmbeddingComponent
+from private_gpt.components.memory.memory_component import MemoryComponent, MemoryItem
+from tests.fixtures.mock_injector import MockInjector
+
+_VOCAB = ["cat", "dog", "car", "sun"]
+
+
+def _embed(text: str) -> list[float]:
+    v = np.array([text.count(w) for w in _VOCAB], dtype=np.float32) + 0.01
+    return (v / np.linalg.norm(v)).tolist()
+
+
+@pytest.fixture
+def memory(injector: MockInjector) -> MemoryComponent:
+    emb = injector.bind_mock(EmbeddingComponent)
+    emb.embedding_model.get_text_embedding_batch.side_effect = lambda texts: [_embed(t) for t in texts]
+    emb.embedding_model.get_query_embedding.side_effect = _embed
+    injector.bind_settings(
+        {"memory": {"embed_async": False, "consolidate_interval_s": 0, "lexical_only_max_terms": 0}}
+    )
+    m = injector.get(MemoryComponent)
+    m.clear()
+    yield m
+    m.clear()
+
+
+def test_context_ranks_by_relevance_within_token_budget(memory) -> None:
+    memory.add_many(
+        [
+            MemoryItem(text="the dog barked"),
+            MemoryItem(text="a red car"),
+            MemoryItem(text="dog " * 200),  # ~200 токенов — не влезает в бюджет
+            MemoryItem(text="dog and cat"),
+            MemoryItem(text="sunny day"),
+        ]
+    )
+    texts = [m.text for m in memory.context("dog", max_tokens=40, max_items=5)]
+    assert texts == ["the dog barked", "dog and cat"]
+
+    # пустой запрос — самые свежие
+    assert [m.text for m in memory.context("", max_tokens=60, max_items=2)] == ["sunny day", "dog and cat"]
+
+
+def test_count_since_and_by_kind(memory) -> None:
+    memory.add(text="old", kind="observation")
+    since = time.time()
+    time.sleep(0.01)
+    memory.add(text="new", kind="observation")
+    memory.add(text="thought", kind="monologue")
+    assert memory.count() == 3
+    assert memory.count(since=since) == 2
+    assert memory.count(since=since, kinds=["monologue"]) == 1
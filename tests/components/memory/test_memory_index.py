@@ -0,0 +1,128 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from private_gpt.components.memory.memory_component import cosine
+from private_gpt.components.memory.memory_index import MemoryIndex
+
+
+def _reference_search(records, query, top_k, half_life, now):
+    results = []
+    for rec in records:
+        sim = cosine(query, rec["embedding"]) if rec["embedding"] else 0.0
+        age_days = max(
+            0.0, (now - datetime.fromisoformat(rec["timestamp"])).total_seconds() / 86400.0
+        )
+        decay = 0.5 ** (age_days / max(half_life, 0.1))
+        results.append((rec["id"], sim * (0.2 + 0.8 * rec["importance"]) * decay))
+    results.sort(key=lambda x: x[1], reverse=True)
+    return results[:top_k]
+
+
+@pytest.fixture
+def records():
+    rnd = random.Random(7)
+    now = datetime.now(timezone.utc)
+    out = []
+    for i in range(300):
+        out.append(
+            {
+                "id": str(i),
+                "timestamp": (now - timedelta(hours=rnd.uniform(0, 2000))).isoformat(),
+                "importance": rnd.random(),
+                # каждая десятая запись — без эмбеддинга
+                "embedding": None if i % 10 == 0 else [rnd.gauss(0, 1) for _ in range(16)],
+            }
+        )
+    return out
+
+
+@pytest.mark.parametrize("top_k", [1, 5, 50, 1000])
+def test_search_matches_linear_scan(records, top_k) -> None:
+    index = MemoryIndex(capacity=8)
+    for rec in records:
+        meta = {k: v for k, v in rec.items() if k != "embedding"}
+        index.add(meta, rec["embedding"])
+
+    query = [random.Random(1).gauss(0, 1) for _ in range(16)]
+    now = datetime.now(timezone.utc)
+    expected = _reference_search(records, query, top_k, 30.0, now)
+    got = index.search(query, top_k=top_k, decay_half_life_days=30.0, now=now.timestamp())
+
+    assert [index.record(row)["id"] for row, _ in got] == [rid for rid, _ in expected]
+    for (_, score), (_, ref) in zip(got, expected, strict=True):
+        assert score == pytest.approx(ref, rel=1e-4, abs=1e-6)
+
+
+def test_record_restores_embedding() -> None:
+    index = MemoryIndex()
+    row = index.add({"id": "a", "timestamp": datetime.now(timezone.utc).isoformat()}, [3.0, 4.0])
+    assert index.record(row)["embedding"] == pytest.approx([3.0, 4.0])
+    assert "embedding" not in index._records[row]
+
+
+@pytest.mark.parametrize("shuffled", [False, True])
+def test_time_window_prunes_before_scoring(shuffled) -> None:
+    base = 1_700_000_000.0
+    order = [3, 0, 4, 1, 2] if shuffled else list(range(5))
+    index = MemoryIndex()
+    for i in order:
+        index.add({"id": str(i), "ts": base + i * 3600, "importance": 0.5}, [1.0, 0.0])
+
+    now = base + 5 * 3600
+    kw = {"top_k": 10, "decay_half_life_days": 1.0, "now": now}
+    got = index.search([1.0, 0.0], **kw, since=base + 3600, until=base + 3 * 3600)
+    assert sorted(index.record(r)["id"] for r, _ in got) == ["1", "2", "3"]
+    # свежее — выше
+    assert [index.record(r)["id"] for r, _ in got] == ["3", "2", "1"]
+    assert index.search([1.0, 0.0], **kw, since=now) == []
+
+    cands = np.array([0, 1, 2], dtype=np.int64)
+    got = index.search([1.0, 0.0], **kw, candidates=cands, since=base + 3600)
+    expected = {int(r) for r in cands if index.record(int(r))["ts"] >= base + 3600}
+    assert {r for r, _ in got} == expected
+
+
+def test_decay_is_cached_per_minute_bucket() -> None:
+    index = MemoryIndex()
+    index.add({"id": "a", "ts": 1_000.0}, [1.0])
+    d1 = index._decay(30.0, 120_010.0)
+    assert index._decay(30.0, 120_050.0) is d1
+    assert index._decay(30.0, 120_070.0) is not d1
+
+    index.add({"id": "b", "ts": 2_000.0}, [1.0])
+    d2 = index._decay(30.0, 120_010.0)
+    assert d2.shape == (2,)
+    assert d2[0] == d1[0]
+
+
+def test_kind_and_tag_filters_restrict_candidates() -> None:
+    index = MemoryIndex()
+    specs = [
+        ("observation", ["a"]),
+        ("insight", ["a", "b"]),
+        ("insight", []),
+        ("todo", ["b"]),
+        ("insight", ["b", "a"]),
+    ]
+    for i, (kind, tags) in enumerate(specs):
+        index.add({"id": str(i), "kind": kind, "tags": tags, "ts": 1_000.0 + i}, [1.0, float(i)])
+
+    assert index.rows(kinds=["insight"]).tolist() == [1, 2, 4]
+    assert index.rows(kinds=["insight", "todo"]).tolist() == [1, 2, 3, 4]
+    assert index.rows(tags=["a", "b"]).tolist() == [1, 4]
+    assert index.rows(kinds=["todo"], tags=["a"]).tolist() == []
+    assert index.rows(tags=["missing"]).tolist() == []
+    assert index.rows(kinds=["insight"], since=1_002.0).tolist() == [2, 4]
+
+    kw = {"top_k": 10, "decay_half_life_days": 30.0, "now": 2_000.0}
+    got = index.search([1.0, 1.0], **kw, tags=["b"])
+    assert sorted(r for r, _ in got) == [1, 3, 4]
+    # фильтр уже отобрал меньше строк, чем кандидаты — кандидаты не урезают результат
+    got = index.search([1.0, 1.0], **kw, kinds=["insight"], candidates=np.array([0, 1, 2, 3]))
+    assert sorted(r for r, _ in got) == [1, 2, 4]
+
+    index.add({"id": "5", "kind": "insight", "tags": ["b"], "ts": 1_005.0}, None)
+    assert index.rows(kinds=["insight"], tags=["b"]).tolist() == [1, 4, 5]
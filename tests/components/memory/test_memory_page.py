@@ -0,0 +1,40 @@
+import pytest
+
+from private_gpt.components.embedding.embedding_component import EmbeddingComponent
+from private_gpt.components.memory.memory_component import MemoryComponent, MemoryItem
+from tests.fixtures.mock_injector import MockInjector
+
+
+@pytest.fixture
+def memory(injector: MockInjector) -> MemoryComponent:
+    emb = injector.bind_mock(EmbeddingComponent)
+    emb.embedding_model.get_text_embedding_batch.side_effect = lambda texts: [[1.0, 0.0]] * len(texts)
+    injector.bind_settings({"memory": {"embed_async": False, "consolidate_interval_s": 0}})
+    m = injector.get(MemoryComponent)
+    m.clear()
+    yield m
+    m.clear()
+
+
+def test_page_filters_and_cursor(memory) -> None:
+    memory.add_many(
+        [MemoryItem(text=f"m{i}", kind="note" if i % 2 else "fact", ts=1000.0 + i) for i in range(7)]
+    )
+
+    items, before = memory.page(2, kinds=["note"])
+    assert [it.text for it in items] == ["m3", "m5"]
+    items, before = memory.page(2, before=before, kinds=["note"])
+    assert [it.text for it in items] == ["m1"]
+    assert before is None
+
+    items, _ = memory.page(10, since=1002.0, until=1004.0)
+    assert [it.text for it in items] == ["m2", "m3", "m4"]
+
+
+def test_version_tracks_writes_and_clear(memory) -> None:
+    v0 = memory.version()
+    memory.add(text="x", embed=False)
+    v1 = memory.version()
+    assert v1[0] == v0[0] and v1[1] != v0[1]
+    memory.clear()
+    assert memory.version()[0] != v1[0]
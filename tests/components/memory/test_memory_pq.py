@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from private_gpt.components.memory.memory_index import MemoryIndex
+from private_gpt.components.memory.memory_pq import ProductQuantizer
+from private_gpt.components.memory.memory_tiers import ColdStore
+
+
+def _unit(n: int, dim: int, seed: int = 0) -> np.ndarray:
+    v = np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+    return v / np.linalg.norm(v, axis=1, keepdims=True)
+
+
+def test_adc_matches_decoded_dot_product(tmp_path) -> None:
+    vecs = _unit(600, 30)  # 30 не делится на 8 — подпространства дополняются нулями
+    pq = ProductQuantizer.train(vecs, 8)
+    codes = pq.encode(vecs)
+    assert codes.shape == (600, 8) and codes.dtype == np.uint8
+
+    q = _unit(1, 30, seed=1)[0]
+    np.testing.assert_allclose(
+        pq.similarities(codes, pq.adc_table(q)), pq.decode(codes) @ q, rtol=1e-4, atol=1e-5
+    )
+    # реконструкция заметно лучше случайной (у случайных единичных векторов ошибка ~1.4)
+    assert np.linalg.norm(pq.decode(codes) - vecs, axis=1).mean() < 0.9
+
+    pq.save(tmp_path / "pq.npz")
+    loaded = ProductQuantizer.load(tmp_path / "pq.npz")
+    assert loaded is not None
+    np.testing.assert_array_equal(loaded.encode(vecs), codes)
+
+
+def test_cold_store_keeps_int8_segments_readable_after_pq(tmp_path) -> None:
+    vecs = _unit(300, 16)
+    store = ColdStore(tmp_path / "cold")
+    store.add(np.array([0, 1]), vecs[:2], np.ones(2))
+    store.set_codec(ProductQuantizer.train(vecs, 8))
+    store.add(np.arange(2, 300), vecs[2:], np.ones(298))
+    with pytest.raises(ValueError):
+        store.set_codec(ProductQuantizer.train(vecs, 8))
+
+    reopened = ColdStore(tmp_path / "cold")
+    reopened.load()
+    assert reopened.codec is not None
+    sims = reopened.similarities(np.array([0, 5]), vecs[0])
+    assert sims[0] == pytest.approx(1.0, abs=0.01)  # int8
+    assert reopened.vectors(np.array([5])).shape == (1, 16)  # PQ
+
+
+def test_exact_rerank_restores_ranking(tmp_path) -> None:
+    vecs = _unit(300, 16, seed=3)
+    store = ColdStore(tmp_path / "cold")
+    store.set_codec(ProductQuantizer.train(vecs, 8))
+    index = MemoryIndex()
+    index.attach_cold(store, score_floor=1.0, exact=lambda rows: vecs[rows], rerank=20)
+    for i, v in enumerate(vecs):
+        index.add({"id": str(i), "text": "", "importance": 0.5, "ts": 1000.0}, v.tolist())
+    q = _unit(1, 16, seed=4)[0]
+    exact = index.search(q, top_k=5, decay_half_life_days=30.0, now=1000.0)
+
+    index.demote(np.arange(300))
+    reranked = index.search(q, top_k=5, decay_half_life_days=30.0, now=1000.0)
+    assert [r for r, _ in reranked] == [r for r, _ in exact]
+    np.testing.assert_allclose([s for _, s in reranked], [s for _, s in exact], atol=1e-5)
@@ -0,0 +1,92 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from private_gpt.components.memory.memory_component import MemoryItem, _MemStorage
+from private_gpt.components.memory.memory_index import MemoryIndex
+
+
+@pytest.fixture
+def store(tmp_path):
+    s = _MemStorage(file_path=tmp_path / "memory.jsonl", vec_path=tmp_path / "memory.f32")
+    s.ensure()
+    return s
+
+
+def test_embeddings_go_to_sidecar(store) -> None:
+    item = MemoryItem(text="hello", embedding=[1.0, 2.0, 3.0])
+    rec = store.append(item.model_dump(), item.embedding)
+
+    line = store.file_path.read_text(encoding="utf-8").strip()
+    assert "embedding" not in json.loads(line)
+    assert rec["emb_row"] == 0
+    np.testing.assert_allclose(store.vectors.open()[0], [1.0, 2.0, 3.0])
+
+
+def test_migrate_legacy_jsonl(store) -> None:
+    legacy = [
+        MemoryItem(text="a", embedding=[1.0, 0.0]).model_dump(),
+        MemoryItem(text="b", embedding=None).model_dump(),
+        MemoryItem(text="c", embedding=[0.0, 2.0]).model_dump(),
+    ]
+    with store.file_path.open("w", encoding="utf-8") as f:
+        for rec in legacy:
+            f.write(json.dumps(rec) + "\n")
+
+    assert store.needs_migration()
+    assert store.migrate() == 2
+    assert not store.needs_migration()
+
+    records = list(store.iter_all())
+    assert [r["text"] for r in records] == ["a", "b", "c"]
+    assert [r.get("emb_row") for r in records] == [0, None, 1]
+
+    index = MemoryIndex()
+    index.load(records, store.vectors.open())
+    assert index.record(2)["embedding"] == pytest.approx([0.0, 2.0])
+    assert index.record(1)["embedding"] is None
+
+
+def test_dangling_tail_is_truncated(store) -> None:
+    store.append(MemoryItem(text="a").model_dump(), [1.0, 2.0])
+    with store.vectors.path.open("ab") as f:
+        f.write(b"\x00\x01")
+    store.ensure()
+    assert store.append(MemoryItem(text="b").model_dump(), [3.0, 4.0])["emb_row"] == 1
+
+
+@pytest.mark.parametrize("crash_at", [1, 2])
+def test_interrupted_compaction_keeps_rows_consistent(
+    store, tmp_path, monkeypatch, crash_at
+) -> None:
+    texts = ["a", "b", "c"]
+    for i, text in enumerate(texts):
+        store.append(MemoryItem(text=text).model_dump(), [float(i), 1.0])
+
+    real_replace = os.replace
+    calls = []
+
+    def crashing_replace(src, dst):
+        calls.append(dst)
+        if len(calls) == crash_at:
+            raise OSError("power lost")
+        real_replace(src, dst)
+
+    monkeypatch.setattr(os, "replace", crashing_replace)
+    with pytest.raises(OSError):
+        store.compact([0])
+    monkeypatch.setattr(os, "replace", real_replace)
+
+    # 1 — сбой до замены JSONL (откат), 2 — после неё (доводится до конца)
+    reopened = _MemStorage(file_path=store.file_path, vec_path=store.vec_path)
+    reopened.ensure()
+    records = list(reopened.iter_all())
+    index = MemoryIndex()
+    index.load(records, reopened.vectors.open())
+    expected = texts if crash_at == 1 else texts[1:]
+    assert [r["text"] for r in records] == expected
+    for row, text in enumerate(expected):
+        assert index.record(row)["embedding"] == pytest.approx([float(texts.index(text)), 1.0])
+    assert not list(tmp_path.glob("*.migrating"))
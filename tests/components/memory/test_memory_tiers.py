@@ -0,0 +1,146 @@
+import numpy as np
+import pytest
+
+from private_gpt.components.embedding.embedding_component import EmbeddingComponent
+from private_gpt.components.memory.memory_component import MemoryComponent, MemoryItem
+from private_gpt.components.memory.memory_index import MemoryIndex
+from private_gpt.components.memory.memory_tiers import ColdStore
+from private_gpt.settings.settings import Settings
+from tests.fixtures.mock_injector import MockInjector
+
+
+def _unit(n: int, dim: int, seed: int = 0) -> np.ndarray:
+    v = np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+    return v / np.linalg.norm(v, axis=1, keepdims=True)
+
+
+def test_cold_store_roundtrip_discard_and_remap(tmp_path) -> None:
+    store = ColdStore(tmp_path / "cold")
+    vecs = _unit(6, 16)
+    store.add(np.array([1, 3, 5]), vecs[[1, 3, 5]], np.array([2.0, 3.0, 4.0]))
+
+    assert len(store) == 3
+    assert store.mask(7).tolist() == [False, True, False, True, False, True, False]
+    # int8 с масштабом по строке: ошибка порядка 1/127
+    np.testing.assert_allclose(store.vectors(np.array([3, 1])), vecs[[3, 1]], atol=0.01)
+    np.testing.assert_allclose(store.similarities(np.array([5]), vecs[5]), [1.0], atol=0.01)
+
+    store.discard(np.array([3]))
+    # строки 0 и 1 удалены, остальные сдвигаются на две
+    store.remap(np.array([-1, -1, 0, 1, 2, 3]))
+    reopened = ColdStore(tmp_path / "cold")
+    reopened.load()
+    assert reopened.mask(4).tolist() == [False, False, False, True]
+    assert reopened.norms(np.array([3])).tolist() == [4.0]
+
+
+@pytest.fixture
+def index(tmp_path) -> MemoryIndex:
+    idx = MemoryIndex()
+    idx.attach_cold(ColdStore(tmp_path / "cold"), score_floor=1.0)
+    vecs = _unit(40, 16, seed=1)
+    for i, v in enumerate(vecs):
+        idx.add({"id": str(i), "text": f"item {i}", "importance": 0.5, "ts": 1000.0}, v.tolist())
+    return idx
+
+
+def test_search_with_demoted_rows_matches_all_hot(index: MemoryIndex) -> None:
+    q = _unit(1, 16, seed=2)[0]
+    before = index.search(q, top_k=5, decay_half_life_days=30.0, now=1000.0)
+
+    assert index.demote(np.arange(0, 40, 2)) == 20
+    assert index.hot_count() == 20
+    assert index.hot_mask().sum() == 20
+    after = index.search(q, top_k=5, decay_half_life_days=30.0, now=1000.0)
+
+    assert [r for r, _ in after] == [r for r, _ in before]
+    np.testing.assert_allclose([s for _, s in after], [s for _, s in before], atol=0.01)
+    # новые строки идут в горячий ярус
+    row = index.add({"id": "new", "text": "new", "importance": 0.5, "ts": 1000.0}, q.tolist())
+    assert index.search(q, top_k=1, decay_half_life_days=30.0, now=1000.0)[0][0] == row
+
+
+def test_cold_rows_scored_alike_without_keyword_hits(index: MemoryIndex) -> None:
+    q = _unit(1, 16, seed=2)[0]
+    kwargs = {
+        "top_k": 5,
+        "decay_half_life_days": 30.0,
+        "now": 1000.0,
+        "query_text": "zebra",
+        "lexical_weight": 0.3,
+    }
+    before = index.search(q, **kwargs)
+
+    index.demote(np.arange(0, 40, 2))
+    after = index.search(q, **kwargs)
+
+    # ни одного совпадения по словам — холодные строки не штрафуются долей BM25
+    assert [r for r, _ in after] == [r for r, _ in before]
+    np.testing.assert_allclose([s for _, s in after], [s for _, s in before], atol=0.01)
+
+
+def test_promote_restores_exact_vectors(index: MemoryIndex) -> None:
+    vecs = _unit(40, 16, seed=1)
+    index.demote(np.array([4]))
+    cold, hits = index.cold_hits()
+    assert cold.tolist() == [4] and hits.tolist() == [0.0]
+
+    index.search(vecs[4], top_k=1, decay_half_life_days=30.0, now=1000.0)
+    assert index.cold_hits()[1].tolist() == [1.0]
+
+    index.promote(np.array([4]), vecs[[4]])
+    assert index.hot_mask().all()
+    np.testing.assert_allclose(index.row_vectors(np.array([4]))[0], vecs[4], atol=1e-6)
+
+
+def _embed(text: str) -> list[float]:
+    return _unit(1, 16, seed=int(text.split()[-1]))[0].tolist()
+
+
+@pytest.fixture
+def memory(injector: MockInjector) -> MemoryComponent:
+    emb = injector.bind_mock(EmbeddingComponent)
+    emb.embedding_model.get_text_embedding_batch.side_effect = lambda texts: [_embed(t) for t in texts]
+    emb.embedding_model.get_query_embedding.side_effect = _embed
+    injector.bind_settings(
+        {
+            "memory": {
+                "embed_async": False,
+                "consolidate_interval_s": 0,
+                "lexical_only_max_terms": 0,
+                "tier_hot_max_items": 10,
+                "tier_promote_hits": 2,
+                "tier_cold_score_floor": 1.0,
+            }
+        }
+    )
+    m = injector.get(MemoryComponent)
+    m.clear()
+    yield m
+    m.clear()
+
+
+def test_component_demotes_searches_and_promotes(memory, injector) -> None:
+    # важность растёт с номером: первыми в холодный ярус уходят ранние записи
+    memory.add_many([MemoryItem(text=f"item {i}", importance=0.5 + i / 100) for i in range(40)])
+    assert memory._index.hot_count() <= 11
+    assert not memory._index.hot_mask()[0]
+
+    for _ in range(2):
+        assert memory.search("item 0", top_k=1)[0][0].text == "item 0"
+    memory.consolidate()
+    assert memory._index.hot_mask()[0]
+
+    # после перезапуска холодные строки не читаются в RAM
+    restarted = MemoryComponent(injector.get(Settings), injector.get(EmbeddingComponent))
+    assert restarted._index.hot_count() == memory._index.hot_count()
+    assert restarted.search("item 3", top_k=1)[0][0].text == "item 3"
+
+
+def test_component_pq_codec_with_rerank(memory) -> None:
+    memory._cfg.tier_codec = "pq"
+    memory._cfg.pq_bytes = 8
+    memory._index._rerank = 10
+    memory.add_many([MemoryItem(text=f"item {i}", importance=0.5 + i / 1000) for i in range(300)])
+    assert memory._cold.codec is not None
+    assert memory.search("item 7", top_k=1)[0][0].text == "item 7"
@@ -0,0 +1,146 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+from private_gpt.components.llm.llm_gate import LLMGate
+from private_gpt.components.memory.memory_component import MemoryItem
+from private_gpt.components.monologue.monologue_component import MonologueRunner
+from tests.fixtures.mock_injector import MockInjector
+
+
+def test_gate_admits_background_only_when_chat_is_idle() -> None:
+    gate = LLMGate()
+    release = gate.enter_user()
+    assert not gate.try_background(now=0.0)
+    release()
+    assert not gate.try_background(quiet_s=60)  # пользователь только что ушёл
+    assert gate.try_background()
+    assert not gate.try_background()  # слот один
+    gate.release_background(started=0.0, now=360.0)
+    assert gate.background_share(now=360.0) == 0.1
+
+
+def _runner(injector: MockInjector) -> tuple[MonologueRunner, MagicMock, list[MemoryItem], LLMGate]:
+    settings = injector.bind_settings(
+        {
+            "monologue": {
+                "interval_minutes": 10,
+                "min_interval_minutes": 2,
+                "max_interval_minutes": 30,
+                "burst_memories": 3,
+                "quiet_s": 0,
+                "max_defer_minutes": 0,
+            }
+        }
+    )
+    memories = [MemoryItem(text="old", ts=1.0)]
+    memory = MagicMock()
+    memory.count.side_effect = lambda since=None, kinds=None: sum(
+        1 for m in memories if (since is None or m.ts >= since) and (not kinds or m.kind in kinds)
+    )
+    memory.context.side_effect = lambda query, max_tokens, max_items: memories[-max_items:]
+    self_model = MagicMock()
+    self_model.get_current_state.return_value = None
+    llm_component = MagicMock()
+    llm_component.llm.chat.return_value = SimpleNamespace(message=SimpleNamespace(content='{"note": "hm"}'))
+    gate = LLMGate()
+    runner = MonologueRunner(settings, llm_component, memory, self_model, gate, MagicMock())
+    return runner, llm_component.llm, memories, gate
+
+
+async def test_interval_adapts_to_activity_and_load(injector) -> None:
+    runner, llm, memories, gate = _runner(injector)
+
+    assert await runner._step() == 600  # первый тик — базовый интервал
+    assert llm.chat.call_count == 1
+
+    # ничего нового — без LLM, интервал удваивается до потолка
+    assert await runner._step() == 1200
+    assert await runner._step() == 1800
+    assert await runner._step() == 1800
+    assert llm.chat.call_count == 1
+
+    # всплеск новых воспоминаний — минимальный интервал
+    memories.extend(MemoryItem(text=f"new {i}", ts=time.time()) for i in range(3))
+    assert await runner._step() == 120
+    assert llm.chat.call_count == 2
+
+    # идёт запрос чата — тик пропускается
+    memories.append(MemoryItem(text="more", ts=time.time()))
+    release = gate.enter_user()
+    assert await runner._step() == 120
+    release()
+    assert llm.chat.call_count == 2
+    stats = runner.stats()
+    assert (stats["ticks"], stats["skipped.unchanged"], stats["skipped.busy"]) == (2, 3, 1)
+
+
+async def _max_loop_lag(stop: asyncio.Event, period: float = 0.01) -> float:
+    lag = 0.0
+    while not stop.is_set():
+        t = time.perf_counter()
+        await asyncio.sleep(period)
+        lag = max(lag, time.perf_counter() - t - period)
+    return lag
+
+
+async def test_tick_does_not_block_event_loop(injector) -> None:
+    runner, llm, _, _ = _runner(injector)
+    reply = llm.chat.return_value
+    llm.chat.side_effect = lambda *a, **kw: time.sleep(0.3) or reply
+
+    stop = asyncio.Event()
+    probe = asyncio.create_task(_max_loop_lag(stop))
+    await asyncio.sleep(0.02)
+    await runner._step()
+    stop.set()
+    # блокирующий вызов LLM (0.3 с) идёт в потоке монолога, не в event loop
+    assert await probe < 0.1
+    assert llm.chat.call_count == 1
+    await runner.stop()
+
+
+async def test_stop_cancels_running_tick(injector) -> None:
+    runner, llm, _, gate = _runner(injector)
+    entered, release = threading.Event(), threading.Event()
+    reply = llm.chat.return_value
+
+    def slow_chat(*a, **kw):
+        entered.set()
+        release.wait(5)
+        return reply
+
+    llm.chat.side_effect = slow_chat
+    runner._task = asyncio.create_task(runner._loop())
+    assert await asyncio.to_thread(entered.wait, 5)
+    await asyncio.wait_for(runner.stop(), 1)
+    assert runner._task.cancelled()
+    release.set()
+    await asyncio.sleep(0.05)
+    # ответ, пришедший после остановки, не записывается
+    runner._memory.add.assert_not_called()
+    assert gate.try_background()
+
+
+async def test_loop_survives_errors_outside_tick(injector) -> None:
+    runner, llm, _, _ = _runner(injector)
+    failures = iter([RuntimeError("self model unavailable")])
+
+    def state():
+        for error in failures:
+            raise error
+
+    runner._self.get_current_state.side_effect = state
+    runner._interval_s = 0
+    runner._task = asyncio.create_task(runner._loop())
+    for _ in range(500):
+        if llm.chat.call_count:
+            break
+        await asyncio.sleep(0.01)
+    # снимок упал — цикл жив, следующий шаг дошёл до LLM
+    assert not runner._task.done()
+    assert llm.chat.call_count == 1
+    assert runner.stats()["errors"] == 1
+    await runner.stop()
@@ -0,0 +1,82 @@
+import json
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+from private_gpt.components.reflection.reflection_component import ReflectionComponent
+from tests.fixtures.mock_injector import MockInjector
+
+
+def _reply(text: str) -> SimpleNamespace:
+    return SimpleNamespace(message=SimpleNamespace(content=text))
+
+
+def _turn(user: str) -> dict:
+    return {
+        "system_prompt": None,
+        "last_user_message": user,
+        "chat_history": [],
+        "assistant_response": f"answer to {user}",
+        "sources": None,
+    }
+
+
+def _component(injector: MockInjector, *replies: str) -> tuple[ReflectionComponent, MagicMock]:
+    llm_component = MagicMock()
+    llm_component.llm.chat.side_effect = [_reply(r) for r in replies]
+    component = ReflectionComponent(llm_component, injector.bind_settings({}))
+    component.clear()
+    return component, llm_component.llm
+
+
+def test_batch_uses_one_call_and_keeps_order(injector) -> None:
+    answer = json.dumps(
+        [
+            {"index": 2, "why": "c", "confidence": 0.3},
+            {"index": 0, "why": "a", "alternatives": ["x"], "confidence": 0.9},
+            {"index": 1, "why": "b", "confidence": 0.6},
+        ]
+    )
+    component, llm = _component(injector, "```json\n" + answer + "\n```")
+    records = component.reflect_batch([_turn("q0"), _turn("q1"), _turn("q2")])
+
+    assert llm.chat.call_count == 1
+    payload = json.loads(llm.chat.call_args.args[0][1].content)
+    assert [p["index"] for p in payload] == [0, 1, 2]
+    assert [(r.last_user_message, r.why, r.confidence) for r in records] == [
+        ("q0", "a", 0.9),
+        ("q1", "b", 0.6),
+        ("q2", "c", 0.3),
+    ]
+    assert records[0].alternatives == ["x"]
+    assert len(component.history(10)) == 3
+
+
+def test_unparsed_items_fall_back_to_single_calls(injector) -> None:
+    batch = json.dumps([{"index": 0, "why": "a", "confidence": 0.8}, {"index": 1, "oops": True}])
+    component, llm = _component(injector, batch, '{"why": "b alone", "confidence": 0.4}')
+    records = component.reflect_batch([_turn("q0"), _turn("q1")])
+
+    assert llm.chat.call_count == 2
+    assert [(r.why, r.confidence) for r in records] == [("a", 0.8), ("b alone", 0.4)]
+    assert len(component.history(10)) == 2
+
+
+def test_identical_turn_is_served_from_cache(injector) -> None:
+    component, llm = _component(injector, '{"why": "a", "confidence": 0.7}', '{"why": "b", "confidence": 0.2}')
+    first = component.reflect(**_turn("q0"))
+    version = component.version()
+    again = component.reflect(**_turn("q0"))
+    assert llm.chat.call_count == 1
+    assert again.model_dump(exclude={"timestamp"}) == first.model_dump(exclude={"timestamp"})
+
+    # повтор из кэша — всё равно новый ход: он в журнале, и версия сменилась
+    assert component.version() != version
+    assert component.latest() == again
+    assert len(component.history(10)) == 2
+
+    # в пачке закэшированный ход не уходит в LLM, оставшийся — одиночным вызовом
+    records = component.reflect_batch([_turn("q0"), _turn("q1")])
+    assert llm.chat.call_count == 2
+    assert [r.why for r in records] == ["a", "b"]
+    assert component.cache_stats()["hits"] == 2
+    assert [r.last_user_message for r in component.history(10)] == ["q0", "q0", "q0", "q1"]
@@ -0,0 +1,96 @@
+import json
+import zlib
+from unittest.mock import MagicMock
+
+import pytest
+
+from private_gpt.components.self_model.self_model_component import SelfModelComponent, SelfState
+from tests.fixtures.mock_injector import MockInjector
+
+
+def _make(injector: MockInjector, **cfg) -> SelfModelComponent:
+    emb = MagicMock()
+    emb.embedding_model.get_text_embedding_batch.side_effect = lambda texts: [_embed(t) for t in texts]
+    return SelfModelComponent(injector.bind_settings({"self_model": cfg}), emb)
+
+
+def _embed(text: str) -> list[float]:
+    # «уборка» и «убрать» — почти одно и то же, прочее ортогонально
+    vec = [0.0] * 256
+    vec[0 if ("убор" in text.lower() or "убрать" in text.lower()) else 1 + zlib.crc32(text.encode()) % 255] = 1.0
+    return vec
+
+
+@pytest.fixture
+def component(injector: MockInjector) -> SelfModelComponent:
+    c = _make(injector, max_goals=0)
+    c.clear()
+    c._storage.snapshot_every = 4
+    yield c
+    c.clear()
+
+
+def _states(n: int) -> list[SelfState]:
+    out = []
+    for i in range(n):
+        out.append(
+            SelfState(
+                goals=[f"goal {j}" for j in range(i + 1)] if i != 5 else ["reordered", "goal 0"],
+                emotions={"calm": i / 10, **({"joy": 0.5} if i % 3 else {})},
+                self_notes=f"note {i // 2}",
+                tags=["a"] if i % 2 else ["a", "b"],
+            )
+        )
+    return out
+
+
+def test_deltas_replay_to_the_recorded_states(component: SelfModelComponent, injector) -> None:
+    states = _states(11)
+    for st in states:
+        component.record_state(st)
+        assert component.get_current_state() == st
+
+    assert component.history(limit=100) == states
+    assert component.history(limit=3) == states[-3:]
+
+    lines = [json.loads(line) for line in component._storage.file_path.read_text().splitlines()]
+    assert [ln["op"] for ln in lines].count("snapshot") == 3  # 0, 4, 8
+    # дельта хранит только прирост целей, а не весь список
+    assert lines[3]["goals+"] == ["goal 3"] and "goals" not in lines[3]
+
+    restarted = _make(injector, max_goals=0)
+    assert restarted.get_current_state() == states[-1]
+    assert restarted.history(limit=5) == states[-5:]
+
+
+def test_reads_legacy_full_records(component: SelfModelComponent) -> None:
+    legacy = SelfState(goals=["old"], self_notes="legacy")
+    component._storage.log.append(legacy.model_dump())
+    assert component.get_current_state() == legacy
+    nxt = SelfState(goals=["old", "new"])
+    component.record_state(nxt)
+    assert component.history(limit=2) == [legacy, nxt]
+
+
+def test_goals_are_bounded_deduplicated_and_resolved(injector) -> None:
+    c = _make(injector, max_goals=3, goal_half_life_days=1.0)
+    c.clear()
+    try:
+        assert c.merge_goals(["сделать уборку"]) == ["сделать уборку"]
+        c.merge_goals(["Убрать в комнате", "выучить X"])  # почти дубль — повторное упоминание
+        goals = c.merge_goals(["купить Y", "позвонить Z"])
+        assert len(goals) == 3
+        assert goals[0] == "сделать уборку"  # два упоминания — выше всех
+        assert "Убрать в комнате" not in goals
+
+        # гипотеза с тем же заголовком выполнена — цель закрывается
+        goals = c.merge_goals([], {"Сделать  уборку": "done"})
+        assert "сделать уборку" not in goals
+
+        # состояние не хранит больше целей, чем набор
+        state = c.record_state(SelfState(goals=[*goals, "a", "b", "c"]))
+        assert len(state.goals) <= 3
+        archived = c._goals._archive.iter_all()
+        assert {r["archived_reason"] for r in archived} >= {"evicted", "resolved"}
+    finally:
+        c.clear()
@@ -0,0 +1,43 @@
+import gc
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+from llama_index.core.llms import ChatMessage, MessageRole
+
+from private_gpt.components.llm.llm_gate import LLMGate
+from private_gpt.server.chat.chat_service import ChatService
+
+
+def _service(gate: LLMGate) -> ChatService:
+    service = ChatService.__new__(ChatService)
+    service.llm_gate = gate
+    service.introspection = MagicMock()
+    engine = MagicMock()
+    engine.stream_chat.return_value = SimpleNamespace(
+        source_nodes=[], response_gen=iter(["a", "b"])
+    )
+    service._chat_engine = MagicMock(return_value=engine)  # type: ignore[method-assign]
+    return service
+
+
+def test_stream_releases_gate_when_consumed() -> None:
+    gate = LLMGate()
+    completion = _service(gate).stream_chat(
+        [ChatMessage(role=MessageRole.USER, content="hi")]
+    )
+    assert gate.users_in_flight() == 1
+    assert list(completion.response) == ["a", "b"]
+    assert gate.users_in_flight() == 0
+
+
+def test_unstarted_stream_does_not_hold_gate() -> None:
+    gate = LLMGate()
+    completion = _service(gate).stream_chat(
+        [ChatMessage(role=MessageRole.USER, content="hi")]
+    )
+    assert gate.users_in_flight() == 1
+    # the client went away before the first chunk: the stream is never read
+    del completion
+    gc.collect()
+    assert gate.users_in_flight() == 0
+    assert gate.try_background()
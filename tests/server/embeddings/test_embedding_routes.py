@@ -14,3 +14,14 @@ def test_embeddings_generation(test_client: TestClient) -> None:
     embedding_response = EmbeddingsResponse.model_validate(response.json())
     assert len(embedding_response.data) > 0
     assert len(embedding_response.data[0].embedding) > 0
+
+
+def test_embeddings_cache_counts_repeated_input(test_client: TestClient) -> None:
+    body = EmbeddingsBody(input="cached twice")
+    before = test_client.get("/v1/embeddings/cache").json()
+    test_client.post("/v1/embeddings", json=body.model_dump())
+    test_client.post("/v1/embeddings", json=body.model_dump())
+    after = test_client.get("/v1/embeddings/cache").json()
+
+    assert after["enabled"] is True
+    assert after["hits"] - before["hits"] >= 1
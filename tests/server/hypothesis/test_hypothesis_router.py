@@ -12,7 +12,8 @@ def mock_hypothesis_component():
     """Mock hypothesis component."""
     mock = Mock()
     mock.generate.return_value = Mock(id="test_id", status="pending")
-    mock.list.return_value = [Mock(id="test_id", status="pending")]
+    mock.page.return_value = ([], None)
+    mock.version.return_value = (1, 1)
     mock.update_status.return_value = Mock(id="test_id", status="done")
     mock.clear.return_value = None
     return mock
@@ -62,7 +63,8 @@ def test_list_hypotheses(test_client, mock_hypothesis_component):
     """Test hypothesis listing endpoint."""
     response = test_client.get("/v1/hypothesis/list?limit=10")
     assert response.status_code == 200
-    mock_hypothesis_component.list.assert_called_once_with(limit=10)
+    mock_hypothesis_component.page.assert_called_once()
+    assert mock_hypothesis_component.page.call_args.args == (10,)
 
 
 def test_update_status(test_client, mock_hypothesis_component):
@@ -0,0 +1,61 @@
+from fastapi import FastAPI, Query, Request, Response
+from fastapi.testclient import TestClient
+
+from private_gpt.server.utils.paging import NEXT_CURSOR_HEADER, paged
+
+
+def _client(store: list[int]) -> tuple[TestClient, list[int | None]]:
+    app = FastAPI()
+    fetched: list[int | None] = []
+
+    def fetch(before: int | None, limit: int) -> tuple[list[int], int | None]:
+        fetched.append(before)
+        stop = len(store) if before is None else before
+        start = max(0, stop - limit)
+        return store[start:stop], (start if start > 0 else None)
+
+    @app.get("/items", response_model=list[int])
+    def items(
+        request: Request,
+        response: Response,
+        limit: int = Query(2),
+        cursor: str | None = Query(None),
+    ) -> list[int] | Response:
+        return paged(
+            request,
+            response,
+            scope="items",
+            version=(1, len(store)),
+            cursor=cursor,
+            fetch=lambda before: fetch(before, limit),
+        )
+
+    return TestClient(app), fetched
+
+
+def test_cursor_pages_back_and_etag_short_circuits() -> None:
+    store = [0, 1, 2, 3, 4]
+    client, fetched = _client(store)
+
+    first = client.get("/items")
+    assert first.json() == [3, 4]
+    second = client.get("/items", params={"cursor": first.headers[NEXT_CURSOR_HEADER]})
+    assert second.json() == [1, 2]
+    third = client.get("/items", params={"cursor": second.headers[NEXT_CURSOR_HEADER]})
+    assert third.json() == [0]
+    assert NEXT_CURSOR_HEADER not in third.headers
+
+    fetched.clear()
+    again = client.get("/items", headers={"If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304
+    assert fetched == []
+
+    store.append(5)
+    changed = client.get("/items", headers={"If-None-Match": first.headers["ETag"]})
+    assert changed.status_code == 200
+    assert changed.json() == [4, 5]
+
+
+def test_bad_cursor_is_rejected() -> None:
+    client, _ = _client([0, 1])
+    assert client.get("/items", params={"cursor": "garbage"}).status_code == 400
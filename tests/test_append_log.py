@@ -0,0 +1,72 @@
+import json
+
+import pytest
+
+from private_gpt.utils.append_log import AppendLog
+
+
+@pytest.fixture
+def log(tmp_path):
+    lg = AppendLog(tmp_path / "log.jsonl", ring_size=4)
+    lg.ensure()
+    return lg
+
+
+def test_latest_and_last(log) -> None:
+    assert log.latest() is None
+    assert log.last(3) == []
+    for i in range(10):
+        assert log.append({"i": i}) == i
+
+    assert len(log) == 10
+    assert log.latest() == {"i": 9}
+    assert [r["i"] for r in log.last(3)] == [7, 8, 9]
+    # deeper than the ring — served from byte offsets
+    assert [r["i"] for r in log.last(6)] == [4, 5, 6, 7, 8, 9]
+    assert log.read(0) == {"i": 0}
+    assert [r["i"] for r in log.read_range(2, 5)] == [2, 3, 4]
+
+
+def test_ring_records_are_not_shared(log) -> None:
+    log.append({"i": 0})
+    log.latest()["i"] = 99
+    log.last(1)[0]["i"] = 98
+    assert log.latest() == {"i": 0}
+    assert log.last(1) == [{"i": 0}]
+
+
+def test_follows_external_appends(log) -> None:
+    log.append({"i": 0})
+    with log.path.open("a", encoding="utf-8") as f:
+        f.write(json.dumps({"i": 1}) + "\n")
+        f.write('{"i": 2')  # writer still mid-line
+
+    assert log.latest() == {"i": 1}
+    assert len(log) == 2
+
+    with log.path.open("a", encoding="utf-8") as f:
+        f.write("}\n")
+    assert log.latest() == {"i": 2}
+    assert [r["i"] for r in log.iter_all()] == [0, 1, 2]
+
+
+def test_rewrite_clear_and_external_replace(log, tmp_path) -> None:
+    for i in range(5):
+        log.append({"i": i})
+    log.rewrite([{"i": 1}, {"i": 3}])
+    assert [r["i"] for r in log.last(10)] == [1, 3]
+
+    other = tmp_path / "other.jsonl"
+    other.write_text(json.dumps({"i": 42}) + "\n", encoding="utf-8")
+    other.replace(log.path)
+    assert log.latest() == {"i": 42}
+    assert len(log) == 1
+
+    log.clear()
+    assert log.latest() is None
+    assert len(log) == 0
+
+
+def test_skips_malformed_lines(log) -> None:
+    log.path.write_text('{"i": 0}\nnot json\n\n{"i": 1}\n', encoding="utf-8")
+    assert [r["i"] for r in log.last(10)] == [0, 1]
@@ -0,0 +1,66 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from private_gpt.utils.append_log import AppendLog
+from private_gpt.utils.pagination import (
+    CursorError,
+    decode_cursor,
+    encode_cursor,
+    etag_matches,
+    in_window,
+    make_etag,
+    take_page,
+)
+
+
+def test_cursor_round_trip_and_expiry() -> None:
+    cursor = encode_cursor("memory", (0, 3), 42)
+    assert decode_cursor(cursor, "memory", (0, 3)) == 42
+    with pytest.raises(CursorError, match="expired"):
+        decode_cursor(cursor, "memory", (0, 4))
+    with pytest.raises(CursorError):
+        decode_cursor(cursor, "hypothesis", (0, 3))
+    with pytest.raises(CursorError, match="malformed"):
+        decode_cursor("not-a-cursor", "memory", (0, 3))
+
+
+def test_take_page_walks_back_and_stops_early() -> None:
+    read: list[int] = []
+
+    def candidates():
+        for pos in range(9, -1, -1):
+            read.append(pos)
+            yield pos, pos
+
+    items, nxt = take_page(candidates(), 3, lambda x: x % 2 == 0)
+    assert items == [4, 6, 8]
+    assert nxt == 4
+    assert read == [9, 8, 7, 6, 5, 4, 3, 2]  # one extra match proves an older page exists
+
+    items, nxt = take_page(((p, p) for p in range(3, -1, -1)), 3, lambda x: x % 2 == 0)
+    assert (items, nxt) == ([0, 2], None)
+
+    # older candidates exist but none matches: no cursor to an empty page
+    items, nxt = take_page(((p, p) for p in range(9, -1, -1)), 2, lambda x: x >= 8)
+    assert (items, nxt) == ([8, 9], None)
+
+
+def test_scan_back_reads_from_the_end(tmp_path) -> None:
+    log = AppendLog(tmp_path / "log.jsonl")
+    log.append_many({"i": i} for i in range(10))
+    assert [p for p, _ in log.scan_back(chunk=3)] == list(range(9, -1, -1))
+    assert [r["i"] for _, r in log.scan_back(4, chunk=3)] == [3, 2, 1, 0]
+
+
+def test_etag_and_window() -> None:
+    tag = make_etag("memory", (1, 2))
+    assert tag != make_etag("memory", (1, 3))
+    assert etag_matches(tag, tag)
+    assert etag_matches(f'"other", {tag.removeprefix("W/")}', tag)
+    assert not etag_matches(None, tag)
+
+    since = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    assert in_window("2024-01-02T00:00:00+00:00", since, None)
+    assert in_window("2024-01-02T00:00:00", since, datetime(2024, 1, 3))  # naive means UTC
+    assert not in_window("2023-12-31T23:59:59+00:00", since, None)
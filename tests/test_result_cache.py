@@ -0,0 +1,32 @@
+from private_gpt.utils.result_cache import ResultCache, fingerprint
+
+
+def test_fingerprint_ignores_key_order() -> None:
+    assert fingerprint({"a": 1, "b": [1, 2]}) == fingerprint({"b": [1, 2], "a": 1})
+    assert fingerprint({"a": 1}) != fingerprint({"a": 2})
+
+
+def test_ttl_lru_and_reload(tmp_path) -> None:
+    path = tmp_path / "cache.jsonl"
+    cache = ResultCache(path, ttl_s=100, max_items=2)
+    cache.put("a", {"v": 1}, now=0)
+    cache.put("b", {"v": 2}, now=10)
+    assert cache.get("a", now=50) == {"v": 1}  # "a" becomes the most recent
+    cache.put("c", {"v": 3}, now=60)  # evicts "b"
+    assert cache.get("b", now=60) is None
+    assert cache.get("a", now=99) == {"v": 1}
+    assert cache.get("a", now=100) is None  # expired
+    assert (cache.hits, cache.misses) == (2, 2)
+
+    # after a restart the most recently written entries survive
+    reopened = ResultCache(path, ttl_s=1e12, max_items=2)
+    assert len(reopened) == 2
+    assert reopened.get("c") == {"v": 3}
+    assert reopened.get("a") is None
+
+
+def test_disabled_cache_stores_nothing(tmp_path) -> None:
+    cache = ResultCache(tmp_path / "cache.jsonl", ttl_s=0, max_items=10)
+    cache.put("a", {"v": 1})
+    assert cache.get("a") is None
+    assert not (tmp_path / "cache.jsonl").exists()